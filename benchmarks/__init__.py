@@ -0,0 +1,11 @@
+"""
+Offline benchmarks for the reply hot path.
+
+src.constants reads these at import time; benchmarks never talk to Discord
+or OpenAI, so placeholders are enough.
+"""
+import os
+
+for _var in ("OPENAI_API_KEY", "DISCORD_BOT_TOKEN", "DISCORD_CLIENT_ID"):
+    os.environ.setdefault(_var, "x")
+os.environ.setdefault("ALLOWED_SERVER_IDS", "0")
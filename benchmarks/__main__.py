@@ -0,0 +1,195 @@
+"""
+Benchmark suite for the prompt assembly hot path.
+
+    python -m benchmarks                  # run and compare against the baseline
+    python -m benchmarks --save           # run and write a new baseline
+    python -m benchmarks -k render -t 0.3 # only matching cases, 30% threshold
+
+Each case reports ns/op (best of several timing rounds) and the bytes
+allocated per op (peak traced by tracemalloc, measured in a separate run so
+tracing doesn't skew the timings).  A case regresses when its ns/op grows by
+more than the threshold over the stored baseline; the exit status is then 1.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Tuple
+
+from src.base import Conversation, Message, Prompt
+from src.utils import discord_message_to_message, split_into_shorter_messages
+
+from benchmarks.synthetic import (
+    BOT_NAME,
+    make_discord_messages,
+    make_examples,
+    make_reply,
+    make_thread,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+THREAD_SIZES = (10, 100, 1000)
+EXAMPLE_SIZES = (3, 50)
+MIN_ROUND_SECONDS = 0.05
+ROUNDS = 5
+
+
+def _prompt(messages: int, examples: int) -> Prompt:
+    return Prompt(
+        header=Message("system", f"Instructions for {BOT_NAME}: be smug"),
+        examples=make_examples(examples),
+        convo=Conversation(make_thread(messages)),
+    )
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    cases: Dict[str, Callable[[], object]] = {}
+    for n in THREAD_SIZES:
+        for k in EXAMPLE_SIZES:
+            prompt = _prompt(n, k)
+            cases[f"full_render/msgs={n}/examples={k}"] = (
+                lambda p=prompt: p.full_render(BOT_NAME)
+            )
+            # as the bot does it: the persona's system prompt is rendered once
+            system_prompt = prompt.render_system_prompt()
+            cases[f"full_render/msgs={n}/examples={k}/shared_prefix"] = (
+                lambda p=prompt, s=system_prompt: p.full_render(BOT_NAME, s)
+            )
+        prompt = _prompt(n, 3)
+        cases[f"render_messages/msgs={n}"] = (
+            lambda p=prompt: list(p.render_messages(BOT_NAME))
+        )
+        history = make_discord_messages(n)
+        cases[f"discord_message_to_message/msgs={n}"] = (
+            lambda h=history: [discord_message_to_message(m) for m in h]
+        )
+        thread = make_thread(n)
+        cases[f"build_prompt/msgs={n}"] = lambda t=thread: Prompt(
+            header=Message("system", f"Instructions for {BOT_NAME}: be smug"),
+            examples=[],
+            convo=Conversation(list(t)),
+        )
+    for k in EXAMPLE_SIZES:
+        prompt = _prompt(10, k)
+        cases[f"render_system_prompt/examples={k}"] = prompt.render_system_prompt
+    for chars in (1_500, 16_000):
+        reply = make_reply(chars)
+        cases[f"split_into_shorter_messages/chars={chars}"] = (
+            lambda r=reply: split_into_shorter_messages(r)
+        )
+    return cases
+
+
+def time_case(fn: Callable[[], object]) -> float:
+    """Best-of-ROUNDS ns/op, each round long enough to swamp timer noise."""
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= MIN_ROUND_SECONDS * 1e9:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def alloc_case(fn: Callable[[], object]) -> Tuple[int, int]:
+    """(peak bytes allocated during one op, allocated blocks still alive after)."""
+    fn()  # warm caches so we measure the steady state
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = sum(
+            stat.count_diff
+            for stat in tracemalloc.take_snapshot().compare_to(snapshot, "filename")
+        )
+        del result
+    finally:
+        tracemalloc.stop()
+    return peak - before, blocks
+
+
+def run(pattern: str) -> Dict[str, dict]:
+    results = {}
+    for name, fn in build_cases().items():
+        if pattern not in name:
+            continue
+        ns = time_case(fn)
+        alloc_bytes, alloc_blocks = alloc_case(fn)
+        results[name] = {
+            "ns_per_op": round(ns, 1),
+            "alloc_bytes_per_op": alloc_bytes,
+            "alloc_blocks_per_op": alloc_blocks,
+        }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", default="", help="only cases containing this")
+    parser.add_argument("-t", "--threshold", type=float, default=0.25,
+                        help="allowed ns/op slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.filter)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    regressions = []
+    print(f"{'case':<48} {'ns/op':>12} {'alloc B/op':>11} {'blocks':>7} {'vs base':>8}")
+    for name, r in results.items():
+        change = ""
+        if name in baseline:
+            ratio = r["ns_per_op"] / baseline[name]["ns_per_op"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio > args.threshold:
+                regressions.append(name)
+                change += " !"
+        print(
+            f"{name:<48} {r['ns_per_op']:>12,.0f} {r['alloc_bytes_per_op']:>11,} "
+            f"{r['alloc_blocks_per_op']:>7,} {change:>8}"
+        )
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+
+    if regressions and not args.save:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+Micro-benchmark: fence-aware split_into_shorter_messages vs. plain slicing.
+
+    python -m benchmarks.bench_split
+"""
+import timeit
+
+from src.constants import MAX_CHARS_PER_REPLY_MSG
+from src.utils import split_into_shorter_messages
+
+
+def slice_split(message: str):
+    return [
+        message[i : i + MAX_CHARS_PER_REPLY_MSG]
+        for i in range(0, len(message), MAX_CHARS_PER_REPLY_MSG)
+    ]
+
+
+PROSE = ("Behold, monkey. The LC3 codec runs at 48 kHz! Really? Yes. " * 12 + "\n\n") * 20
+CODE = (
+    "Here you go:\n```c\n"
+    + "\n".join(f"int reg_{i} = read_reg(0x{i:04x}); // latch" for i in range(400))
+    + "\n```\nDone, hominid."
+)
+STREAM_EDIT = PROSE[:1500]  # a typical in-progress streamed message
+
+CASES = {"prose": PROSE, "code": CODE, "stream_edit": STREAM_EDIT}
+
+
+def main(number: int = 2000):
+    print(f"{'case':<12} {'chars':>7} {'slice µs':>10} {'split µs':>10} {'ratio':>6}")
+    for name, text in CASES.items():
+        old = timeit.timeit(lambda: slice_split(text), number=number) / number
+        new = timeit.timeit(lambda: split_into_shorter_messages(text), number=number) / number
+        print(
+            f"{name:<12} {len(text):>7} {old * 1e6:>10.1f} {new * 1e6:>10.1f} "
+            f"{new / old:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+In-process stand-ins for the Discord objects src/main.py touches.
+
+FakeThread / FakeTextChannel subclass the real discord.py classes so the
+bot's isinstance checks pass, but keep messages in memory: `history()` pages
+through them 100 at a time like the REST endpoint, and `send` / `edit` /
+`delete` take a configurable round-trip.  Every message the "gateway" would
+deliver is handed to the harness through `FakeGuild.dispatch`.
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import discord
+
+HISTORY_PAGE_SIZE = 100
+
+_snowflakes = itertools.count(1_000_000)
+
+
+class FakeUser(SimpleNamespace):
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(
+        self,
+        guild_id: int,
+        bot_user: FakeUser,
+        dispatch: Callable[["FakeMessage"], None],
+        api_latency: float = 0.05,
+    ):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.bot_user = bot_user
+        self.dispatch = dispatch
+        self.api_latency = api_latency
+        self.api_calls = 0
+        self.threads: Dict[int, "FakeThread"] = {}
+
+    async def api(self):
+        """One simulated REST round-trip."""
+        self.api_calls += 1
+        await asyncio.sleep(self.api_latency)
+
+    async def fetch_channel(self, channel_id: int):
+        await self.api()
+        return None
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        channel,
+        author: FakeUser,
+        content: str = "",
+        embeds: Optional[List[discord.Embed]] = None,
+        type: discord.MessageType = discord.MessageType.default,
+        reference=None,
+    ):
+        self.id = next(_snowflakes)
+        self.channel = channel
+        self.guild: FakeGuild = channel.guild
+        self.author = author
+        self.content = content
+        self.embeds = embeds or []
+        self.type = type
+        self.reference = reference
+        self.deleted = False
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.guild.id}/{self.channel.id}/{self.id}"
+
+    async def edit(self, content: Optional[str] = None, embed=None, **_):
+        await self.guild.api()
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+    async def delete(self):
+        await self.guild.api()
+        self.deleted = True
+
+    async def create_thread(self, name: str, **_) -> "FakeThread":
+        await self.guild.api()
+        thread = FakeThread(self.guild, name, thread_id=self.id)
+        starter = FakeMessage(
+            thread,
+            self.author,
+            type=discord.MessageType.thread_starter_message,
+            reference=SimpleNamespace(cached_message=self),
+        )
+        thread.messages.append(starter)
+        self.guild.threads[thread.id] = thread
+        return thread
+
+
+class _NoTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeThread(discord.Thread):
+    def __init__(self, guild: FakeGuild, name: str, thread_id: Optional[int] = None):
+        # deliberately skips discord.Thread.__init__, which needs gateway state
+        self.id = thread_id or next(_snowflakes)
+        self.guild = guild
+        self.name = name
+        self.owner_id = guild.bot_user.id
+        self.archived = False
+        self.locked = False
+        self.message_count = 0
+        self.messages: List[FakeMessage] = []  # oldest first
+        self.deleted = False
+
+    def __repr__(self):
+        return f"<FakeThread id={self.id} name={self.name!r}>"
+
+    def typing(self):
+        return _NoTyping()
+
+    async def history(self, limit: Optional[int] = 100, **_):
+        """Newest first, one simulated request per page of 100."""
+        remaining = len(self.messages) if limit is None else min(limit, len(self.messages))
+        index = len(self.messages)
+        while remaining > 0:
+            await self.guild.api()
+            page = min(HISTORY_PAGE_SIZE, remaining)
+            for message in reversed(self.messages[index - page : index]):
+                yield message
+            index -= page
+            remaining -= page
+
+    def post(self, author: FakeUser, content: str) -> FakeMessage:
+        """A message arriving from the gateway (no REST round-trip)."""
+        message = FakeMessage(self, author, content)
+        self.messages.append(message)
+        self.message_count += 1
+        self.guild.dispatch(message)
+        return message
+
+    async def send(self, content: Optional[str] = None, embed=None, **_) -> FakeMessage:
+        await self.guild.api()
+        message = FakeMessage(
+            self, self.guild.bot_user, content or "", [embed] if embed else None
+        )
+        self.messages.append(message)
+        self.message_count += 1
+        self.guild.dispatch(message)
+        return message
+
+    async def edit(self, name: Optional[str] = None, archived=None, locked=None, **_):
+        await self.guild.api()
+        if name is not None:
+            self.name = name
+        if archived is not None:
+            self.archived = archived
+        if locked is not None:
+            self.locked = locked
+        return self
+
+    async def delete(self):
+        await self.guild.api()
+        self.deleted = True
+
+
+class FakeTextChannel(discord.TextChannel):
+    def __init__(self, guild: FakeGuild):
+        # deliberately skips discord.TextChannel.__init__, see FakeThread
+        self.id = next(_snowflakes)
+        self.guild = guild
+        self.name = "general"
+
+    def __repr__(self):
+        return f"<FakeTextChannel id={self.id}>"
+
+
+class _FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, embed=None, **_):
+        await self._interaction.guild.api()
+        self._done = True
+        self._interaction.message = FakeMessage(
+            self._interaction.channel,
+            self._interaction.guild.bot_user,
+            content or "",
+            [embed] if embed else None,
+        )
+
+
+class _FakeFollowup:
+    def __init__(self, guild: FakeGuild):
+        self._guild = guild
+
+    async def send(self, *_, **__):
+        await self._guild.api()
+
+
+class FakeInteraction:
+    """What a /chat invocation hands to chat_command."""
+
+    def __init__(self, channel: FakeTextChannel, user: FakeUser):
+        self.channel = channel
+        self.guild = channel.guild
+        self.user = user
+        self.message: Optional[FakeMessage] = None
+        self.response = _FakeResponse(self)
+        self.followup = _FakeFollowup(channel.guild)
+
+    async def original_response(self) -> FakeMessage:
+        await self.guild.api()
+        return self.message
+
+    async def delete_original_response(self):
+        await self.guild.api()
+        if self.message:
+            self.message.deleted = True
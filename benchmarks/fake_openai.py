@@ -0,0 +1,273 @@
+"""
+Local OpenAI-compatible endpoint for load tests.
+
+Serves /v1/chat/completions (plain and streamed), /v1/moderations and
+/v1/models with log-normal latency and a configurable share of 429 / 5xx
+answers, and counts every call it receives.  Like the real API's prompt
+caching, the longest previously seen message prefix of at least 1024 tokens
+is reported as cached, in 128-token steps.  It runs on its own thread and
+event loop so its work doesn't show up as lag in the bot's loop.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from benchmarks.synthetic import WORDS
+
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+
+MODERATION_CATEGORIES = (
+    "harassment",
+    "harassment/threatening",
+    "hate",
+    "hate/threatening",
+    "self-harm",
+    "self-harm/instructions",
+    "self-harm/intent",
+    "sexual",
+    "sexual/minors",
+    "violence",
+    "violence/graphic",
+)
+
+
+@dataclass
+class FakeOpenAIConfig:
+    latency_ms: float = 400.0  # median time to first token / full answer
+    model_latency_ms: Dict[str, float] = field(default_factory=dict)  # per-model override
+    latency_sigma: float = 0.5  # log-normal spread; p99 ≈ median·e^(2.33σ)
+    tokens_per_second: float = 80.0  # streamed output pace
+    reply_chars: int = 600  # mean reply length
+    rate_429: float = 0.0  # share of requests answered 429
+    rate_5xx: float = 0.0  # share of requests answered 503
+    retry_after_ms: int = 500
+    moderation_latency_ms: float = 80.0
+    seed: int = 0
+
+
+class FakeOpenAI:
+    def __init__(self, config: FakeOpenAIConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.calls: Counter = Counter()  # endpoint -> requests, incl. rejected ones
+        self.rejected: Counter = Counter()  # status -> count
+        self.tokens = Counter()  # prompt / completion / cached
+        self.abandoned = 0  # completions the client hung up on
+
+        self._rng = random.Random(config.seed)
+        self._prefixes: set = set()  # hashes of message prefixes seen so far
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._started = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    # ── lifecycle ──────────────────────────────────────────────
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name="fake-openai", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        app.router.add_post("/v1/moderations", self._moderations)
+        app.router.add_get("/v1/models", self._models)
+        # like the real API, stop generating when the client hangs up
+        self._runner = web.AppRunner(app, access_log=None, handler_cancellation=True)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+    # ── distributions ──────────────────────────────────────────
+    def _latency(self, median_ms: float) -> float:
+        return median_ms / 1000 * math.exp(self._rng.gauss(0, self.config.latency_sigma))
+
+    def _reject(self) -> Optional[web.Response]:
+        roll = self._rng.random()
+        if roll < self.config.rate_429:
+            self.rejected[429] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status=429,
+                headers={"retry-after-ms": str(self.config.retry_after_ms)},
+            )
+        if roll < self.config.rate_429 + self.config.rate_5xx:
+            self.rejected[503] += 1
+            return web.json_response(
+                {"error": {"message": "Service unavailable", "type": "server_error"}},
+                status=503,
+            )
+        return None
+
+    def _cached_tokens(self, messages: list) -> int:
+        """Tokens of the longest message prefix sent before (4 chars a token)."""
+        digest = hashlib.sha256()
+        tokens = cached = 0
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            tokens += len(message.get("content") or "") // 4
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                cached = tokens
+            self._prefixes.add(key)
+        if cached < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return cached // PROMPT_CACHE_STEP_TOKENS * PROMPT_CACHE_STEP_TOKENS
+
+    def _reply_text(self, max_tokens: int) -> str:
+        chars = min(
+            int(self._rng.expovariate(1 / self.config.reply_chars)) + 1, max_tokens * 4
+        )
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(self._rng.choice(WORDS))
+        return " ".join(words)
+
+    # ── endpoints ──────────────────────────────────────────────
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        self.calls["chat"] += 1
+        try:
+            return await self._complete(request, await request.json())
+        except (asyncio.CancelledError, ConnectionResetError):
+            self.abandoned += 1  # the bot cancelled a superseded reply
+            raise
+
+    async def _complete(self, request: web.Request, body: dict) -> web.StreamResponse:
+        rejected = self._reject()
+        if rejected is not None:
+            await asyncio.sleep(0.005)
+            return rejected
+
+        model = body.get("model", "gpt-4o-mini")
+        text = self._reply_text(body.get("max_tokens") or 512)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body["messages"]) // 4
+        completion_tokens = max(1, len(text) // 4)
+        cached_tokens = self._cached_tokens(body["messages"])
+        self.tokens["prompt"] += prompt_tokens
+        self.tokens["completion"] += completion_tokens
+        self.tokens["cached"] += cached_tokens
+        await asyncio.sleep(
+            self._latency(self.config.model_latency_ms.get(model, self.config.latency_ms))
+        )
+
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        response = web.StreamResponse(headers={"content-type": "text/event-stream"})
+        pieces = text.split(" ")
+        delay = 1 / self.config.tokens_per_second
+        await response.prepare(request)
+        for i, piece in enumerate(pieces):
+            delta = piece if i == 0 else " " + piece
+            await response.write(self._sse(created, model, {"content": delta}, None))
+            await asyncio.sleep(delay)
+        await response.write(self._sse(created, model, {}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(self._sse(created, model, None, None, usage))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def _sse(
+        created: int,
+        model: str,
+        delta: Optional[dict],
+        finish_reason: Optional[str],
+        usage: Optional[dict] = None,
+    ) -> bytes:
+        """One stream chunk; without a delta it's the trailing usage-only chunk."""
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": (
+                [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                if delta is not None
+                else []
+            ),
+        }
+        if usage is not None:
+            chunk["usage"] = usage
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    async def _models(self, request: web.Request) -> web.Response:
+        self.calls["models"] += 1  # connection warm-up
+        return web.json_response(
+            {
+                "object": "list",
+                "data": [
+                    {"id": m, "object": "model", "created": 0, "owned_by": "fake"}
+                    for m in ("gpt-4o", "gpt-4o-mini")
+                ],
+            }
+        )
+
+    async def _moderations(self, request: web.Request) -> web.Response:
+        self.calls["moderations"] += 1
+        body = await request.json()
+        rejected = self._reject()
+        if rejected is not None:
+            return rejected
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self._latency(self.config.moderation_latency_ms))
+        result = {
+            "flagged": False,
+            "categories": {c: False for c in MODERATION_CATEGORIES},
+            "category_scores": {c: 0.0001 for c in MODERATION_CATEGORIES},
+        }
+        return web.json_response(
+            {
+                "id": "modr-fake",
+                "model": body.get("model", "text-moderation-latest"),
+                "results": [result] * len(inputs),
+            }
+        )
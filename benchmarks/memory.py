@@ -0,0 +1,133 @@
+"""
+Resident memory of cached thread history.
+
+    python -m benchmarks.memory --threads 1000 --messages 200
+    python -m benchmarks.memory --layout dict    # the layout before MessageLog
+
+Fills a ThreadHistoryCache the way gateway events do (one converted message
+at a time, every string decoded afresh as from a JSON payload) and reports
+what tracemalloc sees: bytes per message in total and with the message text
+itself subtracted, i.e. the bookkeeping overhead.  Also times taking the
+prompt snapshot of one thread that every reply starts from.
+
+`--layout dict` measures the previous representation instead, kept here so
+the before / after numbers can be reproduced: a frozen dataclass per
+message, in an OrderedDict keyed by discord id, copied to a list per reply.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.history import ThreadHistoryCache, _ThreadHistory
+from src.utils import discord_message_to_message
+
+from benchmarks.synthetic import make_discord_messages
+
+DICT_MESSAGE_OVERHEAD_BYTES = 120  # what the old cache charged per message
+
+
+@dataclass(frozen=True)
+class _DictMessage:
+    user: str
+    text: Optional[str] = None
+
+
+@dataclass
+class _DictHistory:
+    messages: "OrderedDict[int, _DictMessage]" = field(default_factory=OrderedDict)
+    size: int = 0
+
+    def put(self, message_id: int, message: _DictMessage):
+        self.messages[message_id] = message
+        self.size += DICT_MESSAGE_OVERHEAD_BYTES + len(message.user) + len(message.text or "")
+
+    def snapshot(self):
+        return list(self.messages.values())
+
+
+def fill(cache: ThreadHistoryCache, threads: int, messages: int, layout: str = "log"):
+    template = make_discord_messages(messages)
+    next_id = 1
+    for thread_id in range(threads):
+        entry = _ThreadHistory() if layout == "log" else _DictHistory()
+        for m in template:
+            # new strs per message, like discord.py decoding each payload
+            m.author.name = json.loads(json.dumps(m.author.name))
+            m.content = json.loads(json.dumps(m.content))
+            m.id = json.loads(json.dumps(next_id))
+            if layout == "log":
+                entry.put(next_id, discord_message_to_message(m))
+            else:
+                entry.put(next_id, _DictMessage(m.author.name, m.content))
+            next_id += 1
+        cache._threads[thread_id] = entry
+        cache._size += entry.size
+
+
+def _messages(entry):
+    return entry.messages if isinstance(entry, _ThreadHistory) else entry.messages.values()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200, help="messages per thread")
+    parser.add_argument(
+        "--layout",
+        choices=("log", "dict"),
+        default="log",
+        help="history representation: current MessageLog, or the previous OrderedDict",
+    )
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args()
+
+    cache = ThreadHistoryCache(max_threads=args.threads, max_bytes=sys.maxsize)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    fill(cache, args.threads, args.messages, args.layout)
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    count = args.threads * args.messages
+    entry = next(iter(cache._threads.values()))
+    text_bytes = args.threads * sum(sys.getsizeof(m.text) for m in _messages(entry))
+    take_snapshot = entry.messages.view if args.layout == "log" else entry.snapshot
+    start = time.perf_counter_ns()
+    rounds = 1000
+    for _ in range(rounds):
+        snapshot = take_snapshot()
+    snapshot_ns = (time.perf_counter_ns() - start) / rounds
+    del snapshot
+
+    report = {
+        "layout": args.layout,
+        "threads": args.threads,
+        "messages": count,
+        "total_bytes": total,
+        "bytes_per_message": round(total / count, 1),
+        "overhead_bytes_per_message": round((total - text_bytes) / count, 1),
+        "accounted_bytes": cache._size,
+        "snapshot_ns": round(snapshot_ns, 1),
+    }
+    print(
+        f"{count} messages in {args.threads} threads ({args.layout}): "
+        f"{total / 2**20:.1f} MiB traced\n"
+        f"  per message  {report['bytes_per_message']:.0f} B total, "
+        f"{report['overhead_bytes_per_message']:.0f} B besides the text\n"
+        f"  accounted    {cache._size / 2**20:.1f} MiB by the cache's size estimate\n"
+        f"  snapshot     {snapshot_ns / 1000:.1f} µs per thread ({args.messages} messages)"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
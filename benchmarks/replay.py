@@ -0,0 +1,313 @@
+"""
+Load replay: drive src.main's /chat and on_message with fake Discord threads
+and a local fake OpenAI server, then report what users would have seen.
+
+    python -m benchmarks.replay --threads 50 --messages 6 --speed 20
+    python -m benchmarks.replay --trace traffic.jsonl --speed 60 --rate-429 0.05
+
+A trace is JSONL with one user message per line:
+
+    {"t": 12.5, "thread": "a", "author": "selasflower", "content": "..."}
+
+`t` is seconds since the start of the recording.  The first message of each
+`thread` opens it with /chat, later ones are posted into it.  Without --trace
+a synthetic trace is generated.  Gaps between messages are divided by
+--speed; the bot's own timers and the fake API latencies run in real time.
+
+Reply latency is measured from a user message to the next message the bot
+posts in that thread (for streamed replies, the first visible chunk), so a
+message folded into a later reply by the debounce counts until that reply.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.fake_discord import (
+    FakeGuild,
+    FakeInteraction,
+    FakeMessage,
+    FakeTextChannel,
+    FakeThread,
+    FakeUser,
+)
+from benchmarks.fake_openai import FakeOpenAI, FakeOpenAIConfig
+from benchmarks.synthetic import make_trace
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ReplyTracker:
+    """Pairs user messages with the bot's next post in the same thread."""
+
+    def __init__(self):
+        self.waiting: Dict[int, List[float]] = defaultdict(list)
+        self.latencies: List[float] = []
+        self.user_messages = 0
+        self.bot_messages = 0
+        self.last_reply_at = 0.0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def sent_by_user(self, thread_id: int, at: float):
+        self.user_messages += 1
+        self.waiting[thread_id].append(at)
+        self.idle.clear()
+
+    def sent_by_bot(self, thread_id: int):
+        self.bot_messages += 1
+        now = time.perf_counter()
+        for at in self.waiting.pop(thread_id, []):
+            self.latencies.append(now - at)
+            self.last_reply_at = now
+        if not self.waiting:
+            self.idle.set()
+
+    @property
+    def unanswered(self) -> int:
+        return sum(len(v) for v in self.waiting.values())
+
+
+async def replay(bot, events: List[dict], args) -> dict:
+    from src.constants import ALLOWED_SERVER_IDS, BOT_NAME
+    from src.history import history_cache
+    from src.offload import OFFLOADED
+    from src.watchdog import STALLS, watchdog
+    from src.outbound import outbox
+    from src.ratelimit import openai_scheduler
+    from src.response_cache import response_cache
+    from src.router import ROUTED
+    from src.summaries import SUMMARIES, thread_summaries
+    from src.thread_scheduler import reply_scheduler
+
+    tracker = ReplyTracker()
+    bot_user = FakeUser(id=1, name=BOT_NAME)
+    bot.client._connection.user = bot_user
+    watchdog.start()
+
+    def dispatch(message: FakeMessage):
+        if isinstance(message.channel, FakeThread) and message.author is bot_user:
+            tracker.sent_by_bot(message.channel.id)
+        bot.spawn(bot.on_message(message))
+
+    guild = FakeGuild(ALLOWED_SERVER_IDS[0], bot_user, dispatch, args.discord_latency_ms / 1000)
+    channel = FakeTextChannel(guild)
+    users = {}
+    threads: Dict[str, FakeThread] = {}
+    opened: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+    failed_opens = 0
+
+    def user(name: str) -> FakeUser:
+        if name not in users:
+            users[name] = FakeUser(id=len(users) + 100, name=name)
+        return users[name]
+
+    async def open_thread(key: str, event: dict):
+        nonlocal failed_opens
+        interaction = FakeInteraction(channel, user(event["author"]))
+        at = time.perf_counter()
+        await bot.chat_command.callback(interaction, event["content"], args.model)
+        thread = guild.threads.get(interaction.message.id) if interaction.message else None
+        if thread is None:
+            failed_opens += 1
+        else:
+            # the first reply is only scheduled, so it can't have been sent yet
+            tracker.sent_by_user(thread.id, at)
+            author = user(event["author"])
+            thread.messages[:0] = [
+                FakeMessage(thread, author, f"older message {i}") for i in range(args.history)
+            ]
+            threads[key] = thread
+        opened[key].set()
+
+    async def post(key: str, event: dict):
+        await opened[key].wait()
+        thread = threads.get(key)
+        if thread is not None:
+            tracker.sent_by_user(thread.id, time.perf_counter())
+            thread.post(user(event["author"]), event["content"])
+
+    start = time.perf_counter()
+    tasks = []
+    for event in events:
+        delay = start + event["t"] / args.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        key = event["thread"]
+        if key not in opened:
+            opened[key]  # later messages wait for this /chat to create the thread
+            tasks.append(asyncio.create_task(open_thread(key, event)))
+        else:
+            tasks.append(asyncio.create_task(post(key, event)))
+    await asyncio.gather(*tasks)
+    try:
+        await asyncio.wait_for(tracker.idle.wait(), args.drain_timeout)
+    except asyncio.TimeoutError:
+        pass
+    end = tracker.last_reply_at or time.perf_counter()
+
+    report = {
+        "user_messages": tracker.user_messages,
+        "replies": len(tracker.latencies),
+        "unanswered": tracker.unanswered,
+        "failed_opens": failed_opens,
+        "bot_messages": tracker.bot_messages,
+        "duration_s": round(end - start, 3),
+        "throughput_msgs_per_s": round(len(tracker.latencies) / (end - start), 3),
+        "latency_ms": {
+            q: round(percentile(tracker.latencies, p) * 1000, 1)
+            for q, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "discord_calls_per_msg": round(guild.api_calls / max(tracker.user_messages, 1), 2),
+        "outbox": outbox.stats(),
+        "offloaded": {key[0]: count for key, count in OFFLOADED.values().items()},
+        "loop_stalls": sum(STALLS.values().values()),
+        "openai_scheduler": openai_scheduler.stats(),
+        "reply_scheduler": reply_scheduler.stats(),
+        "history_cache": history_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "router": {"/".join(key): count for key, count in ROUTED.values().items()},
+        "summaries": {
+            **thread_summaries.stats(),
+            **{key[0]: count for key, count in SUMMARIES.values().items()},
+        },
+    }
+    if args.retrieval:
+        from src.retrieval import thread_index
+
+        report["retrieval"] = thread_index.stats()
+    return report
+
+
+def load_trace(path: str) -> List[dict]:
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(events, key=lambda e: e["t"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    traffic = parser.add_argument_group("traffic")
+    traffic.add_argument("--trace", help="JSONL trace to replay instead of synthetic traffic")
+    traffic.add_argument("--threads", type=int, default=20)
+    traffic.add_argument("--messages", type=int, default=5, help="user messages per thread")
+    traffic.add_argument("--think", type=float, default=20.0, help="mean seconds between turns")
+    traffic.add_argument("--ramp", type=float, default=60.0, help="seconds over which threads open")
+    traffic.add_argument("--speed", type=float, default=10.0, help="replay speed-up")
+    traffic.add_argument("--history", type=int, default=0,
+                         help="older messages seeded into each thread (exercises paging)")
+    traffic.add_argument("--model", default="gpt-4o-mini")
+    upstream = parser.add_argument_group("fake upstreams")
+    upstream.add_argument("--latency-ms", type=float, default=400.0)
+    upstream.add_argument("--model-latency-ms", action="append", default=[],
+                          metavar="MODEL=MS", help="per-model median latency")
+    upstream.add_argument("--latency-sigma", type=float, default=0.5)
+    upstream.add_argument("--tokens-per-second", type=float, default=80.0)
+    upstream.add_argument("--reply-chars", type=int, default=600)
+    upstream.add_argument("--rate-429", type=float, default=0.0)
+    upstream.add_argument("--rate-5xx", type=float, default=0.0)
+    upstream.add_argument("--retry-after-ms", type=int, default=500)
+    upstream.add_argument("--discord-latency-ms", type=float, default=50.0)
+    bot_opts = parser.add_argument_group("bot")
+    bot_opts.add_argument("--stream", action="store_true", help="STREAM_REPLIES=1")
+    bot_opts.add_argument("--moderation", action="store_true", help="MODERATION_ENABLED=1")
+    bot_opts.add_argument("--response-cache", action="store_true", help="RESPONSE_CACHE_ENABLED=1")
+    bot_opts.add_argument("--routing", action="store_true", help="MODEL_ROUTING=1")
+    bot_opts.add_argument("--retrieval", action="store_true",
+                          help="RETRIEVAL_ENABLED=1 with the local hashing embedder")
+    bot_opts.add_argument("--summary-tokens", type=int,
+                          help="SUMMARY_TRIGGER_TOKENS (0 disables summaries)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="also write the report here")
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the bot's INFO logs")
+    args = parser.parse_args()
+
+    events = (
+        load_trace(args.trace)
+        if args.trace
+        else make_trace(args.threads, args.messages, args.think, args.ramp)
+    )
+
+    fake = FakeOpenAI(
+        FakeOpenAIConfig(
+            latency_ms=args.latency_ms,
+            model_latency_ms={
+                model: float(ms)
+                for model, ms in (pair.split("=") for pair in args.model_latency_ms)
+            },
+            latency_sigma=args.latency_sigma,
+            tokens_per_second=args.tokens_per_second,
+            reply_chars=args.reply_chars,
+            rate_429=args.rate_429,
+            rate_5xx=args.rate_5xx,
+            retry_after_ms=args.retry_after_ms,
+        )
+    )
+    fake.start()
+    store_dir = tempfile.mkdtemp(prefix="skippy-replay-")
+
+    # src.constants reads these at import time, so set them before importing the bot
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+    os.environ["STORE_PATH"] = os.path.join(store_dir, "replay.sqlite3")
+    os.environ["STREAM_REPLIES"] = "1" if args.stream else "0"
+    os.environ["MODERATION_ENABLED"] = "1" if args.moderation else "0"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "1" if args.response_cache else "0"
+    os.environ["MODEL_ROUTING"] = "1" if args.routing else "0"
+    os.environ["RETRIEVAL_ENABLED"] = "1" if args.retrieval else "0"
+    os.environ["RETRIEVAL_EMBEDDER"] = "hashing"
+    if args.summary_tokens is not None:
+        os.environ["SUMMARY_TRIGGER_TOKENS"] = str(args.summary_tokens)
+    from src import main as bot
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        report = asyncio.run(replay(bot, events, args))
+    finally:
+        fake.stop()
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    messages = max(report["user_messages"], 1)
+    report["upstream"] = {
+        "calls": dict(fake.calls),
+        "rejected": {str(k): v for k, v in fake.rejected.items()},
+        "abandoned": fake.abandoned,
+        "calls_per_msg": round(sum(fake.calls.values()) / messages, 2),
+        "tokens": dict(fake.tokens),
+    }
+
+    lat = report["latency_ms"]
+    print(
+        f"{report['user_messages']} user messages in {len(set(e['thread'] for e in events))} "
+        f"threads, replayed at {args.speed:g}x in {report['duration_s']:.1f} s\n"
+        f"  replies      {report['replies']} answered, {report['unanswered']} unanswered, "
+        f"{report['failed_opens']} failed /chat\n"
+        f"  throughput   {report['throughput_msgs_per_s']:.2f} msgs/s\n"
+        f"  latency      p50 {lat['p50']:.0f} ms  p95 {lat['p95']:.0f} ms  p99 {lat['p99']:.0f} ms\n"
+        f"  upstream     {report['upstream']['calls_per_msg']:.2f} calls/msg "
+        f"{report['upstream']['calls']} rejected {report['upstream']['rejected']} "
+        f"abandoned {fake.abandoned}\n"
+        f"  discord      {report['discord_calls_per_msg']:.2f} calls/msg"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 0 if report["unanswered"] == 0 and report["failed_opens"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Deterministic synthetic threads and example conversations for benchmarks."""
+import random
+from types import SimpleNamespace
+from typing import List
+
+import discord
+
+from src.base import Conversation, Message
+
+BOT_NAME = "SkippyAI"
+USERS = ["darkwingofselasflower", "uncle_niantic", "selasflower", "monkey_42"]
+WORDS = (
+    "the controller sees no ACK and times out both CIS streams so switch to "
+    "dual ISO channels and set the sync interval to five milliseconds while "
+    "the radio draws six milliamps on the 2M PHY behold monkey"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_thread(n: int, seed: int = 0) -> List[Message]:
+    """`n` alternating user / bot messages of realistic, varied length."""
+    rng = random.Random(seed)
+    messages = []
+    for i in range(n):
+        if i % 2:
+            messages.append(Message(BOT_NAME, _text(rng, rng.randint(40, 250))))
+        else:
+            messages.append(Message(rng.choice(USERS), _text(rng, rng.randint(5, 60))))
+    return messages
+
+
+def make_examples(k: int, seed: int = 1) -> List[Conversation]:
+    rng = random.Random(seed)
+    return [
+        Conversation(
+            [
+                Message(rng.choice(USERS), _text(rng, 15)),
+                Message(BOT_NAME, _text(rng, 80)),
+            ]
+        )
+        for _ in range(k)
+    ]
+
+
+def make_discord_messages(n: int, seed: int = 2) -> list:
+    """Stand-ins with just the attributes discord_message_to_message reads."""
+    return [
+        SimpleNamespace(
+            id=i,
+            type=discord.MessageType.default,
+            content=m.text,
+            author=SimpleNamespace(name=m.user),
+            reference=None,
+        )
+        for i, m in enumerate(make_thread(n, seed), 1)
+    ]
+
+
+def make_reply(chars: int, seed: int = 3) -> str:
+    """A long markdown reply with prose paragraphs and a code block."""
+    rng = random.Random(seed)
+    parts = []
+    while sum(len(p) for p in parts) < chars:
+        parts.append(_text(rng, 60) + ".\n\n")
+        parts.append(
+            "```python\n"
+            + "\n".join(f"reg_{i} = read(0x{i:04x})  # latch" for i in range(20))
+            + "\n```\n\n"
+        )
+    return "".join(parts)[:chars]
+
+
+def make_trace(
+    threads: int,
+    messages: int,
+    think_seconds: float = 20.0,
+    ramp_seconds: float = 60.0,
+    seed: int = 4,
+) -> List[dict]:
+    """
+    Replay events (see benchmarks/replay.py): `threads` conversations opened
+    over `ramp_seconds`, each with `messages` user turns spaced by
+    exponentially distributed think time.
+    """
+    rng = random.Random(seed)
+    events = []
+    for t in range(threads):
+        at = rng.uniform(0, ramp_seconds)
+        for _ in range(messages):
+            events.append(
+                {
+                    "t": round(at, 3),
+                    "thread": f"t{t}",
+                    "author": rng.choice(USERS),
+                    "content": _text(rng, rng.randint(5, 40)),
+                }
+            )
+            at += rng.expovariate(1 / think_seconds)
+    events.sort(key=lambda e: e["t"])
+    return events
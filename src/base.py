@@ -1,13 +1,48 @@
-from dataclasses import dataclass
-from typing import Optional, List
+import itertools
+import sys
+from collections import abc
+from dataclasses import FrozenInstanceError, dataclass
+from typing import Iterable, List, Optional, Sequence
 
 SEPARATOR_TOKEN = "<|endoftext|>"
 
+_set = object.__setattr__
+
 
-@dataclass(frozen=True)
 class Message:
-    user: str
-    text: Optional[str] = None
+    """
+    One chat line.  Immutable and slotted (no per-instance __dict__), with the
+    author name interned so every message by the same user shares one string.
+    `id` is the Discord message it came from, if any; it isn't part of the
+    value – two messages with the same author and text are equal.
+    """
+
+    __slots__ = ("user", "text", "id")
+
+    def __init__(self, user: str, text: Optional[str] = None, id: Optional[int] = None):
+        _set(self, "user", sys.intern(user))
+        _set(self, "text", text)
+        _set(self, "id", id)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __eq__(self, other):
+        if other.__class__ is not Message:
+            return NotImplemented
+        return self.user == other.user and self.text == other.text
+
+    def __hash__(self):
+        return hash((self.user, self.text))
+
+    def __repr__(self):
+        return f"Message(user={self.user!r}, text={self.text!r}, id={self.id!r})"
+
+    def __reduce__(self):
+        return Message, (self.user, self.text, self.id)
 
     def render(self):
         result = self.user + ":"
@@ -16,12 +51,130 @@ class Message:
         return result
 
 
+class MessageView(abc.Sequence):
+    """
+    A read-only window onto a MessageLog's storage; taking or slicing one
+    copies no messages.  The log never rewrites slots a view can see, so a
+    view stays a stable snapshot while the log keeps changing.
+    """
+
+    __slots__ = ("_items", "_start", "_stop")
+
+    def __init__(self, items: List[Message], start: int, stop: int):
+        self._items = items
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return MessageView(self._items, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessageView index out of range")
+        return self._items[self._start + index]
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._start, self._stop)
+
+    def __repr__(self):
+        return f"MessageView({list(self)!r})"
+
+
+class MessageLog(abc.Sequence):
+    """
+    Compact, ordered message storage: one list of Message references with
+    spare room at the front, so append and prepend are both amortized O(1)
+    and dropping the oldest message is O(1).  `view()` hands out zero-copy
+    snapshots; anything that would change a slot already handed out
+    (replacing, removing or inserting in the middle) copies the storage
+    instead of writing into it.
+    """
+
+    __slots__ = ("_items", "_head", "_floor")
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._items: List[Message] = list(messages)
+        self._head = 0  # first live slot
+        self._floor = 0  # lowest slot ever live; free slots below it are reusable
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._head, None)
+
+    def view(self) -> MessageView:
+        return MessageView(self._items, self._head, len(self._items))
+
+    def append(self, message: Message):
+        self._items.append(message)
+
+    def prepend(self, message: Message):
+        if self._head == 0 or self._head > self._floor:
+            # no never-used slot in front: reallocate with room to grow
+            spare = max(len(self), 4)
+            self._items = [None] * spare + self._items[self._head :]
+            self._head = self._floor = spare
+        self._head -= 1
+        self._floor = self._head
+        self._items[self._head] = message
+
+    def popleft(self) -> Message:
+        if not len(self):
+            raise IndexError("pop from an empty MessageLog")
+        message = self._items[self._head]
+        self._head += 1
+        if self._head > len(self._items) // 2:
+            self._compact()
+        return message
+
+    def replace(self, index: int, message: Message):
+        items = self._items[self._head :]
+        items[index] = message
+        self._reset(items)
+
+    def insert(self, index: int, message: Message):
+        if index >= len(self):
+            self.append(message)
+            return
+        items = self._items[self._head :]
+        items.insert(index, message)
+        self._reset(items)
+
+    def remove_at(self, index: int):
+        items = self._items[self._head :]
+        del items[index]
+        self._reset(items)
+
+    def _compact(self):
+        self._reset(self._items[self._head :])
+
+    def _reset(self, items: List[Message]):
+        self._items = items
+        self._head = self._floor = 0
+
+    def __repr__(self):
+        return f"MessageLog({list(self)!r})"
+
+
 @dataclass
 class Conversation:
-    messages: List[Message]
+    messages: Sequence[Message]
 
     def prepend(self, message: Message):
-        self.messages.insert(0, message)
+        if not isinstance(self.messages, MessageLog):
+            self.messages = MessageLog(self.messages)
+        self.messages.prepend(message)
         return self
 
     def render(self):
@@ -44,17 +197,26 @@ class ThreadConfig:
     temperature: float
 
 
+@dataclass(frozen=True)
+class ThreadSummary:
+    """Rolling summary of a thread up to and including message `last_id`."""
+
+    text: str
+    last_id: int
+
+
 @dataclass(frozen=True)
 class Prompt:
     header: Message
     examples: List[Conversation]
     convo: Conversation
 
-    def full_render(self, bot_name):
+    def full_render(self, bot_name, system_prompt=None):
+        """`system_prompt` is a pre-rendered render_system_prompt(), if any."""
         messages = [
             {
                 "role": "system",
-                "content": self.render_system_prompt(),
+                "content": system_prompt or self.render_system_prompt(),
             }
         ]
         for message in self.render_messages(bot_name):
@@ -0,0 +1,177 @@
+# cluster.py  –  run the bot as several processes, each owning a range of shards
+#
+#     python -m src.cluster
+#
+# The parent splits SHARD_COUNT shards (default: Discord's recommendation,
+# at least one per process) into CLUSTER_PROCESSES contiguous ranges and
+# starts `python -m src.main` for each with SHARD_IDS / SHARD_COUNT set.
+# Crashed children are restarted with exponential backoff.  Only the first
+# launch of cluster 0 syncs the command tree.
+#
+# Thread state needs no routing: a thread's events only reach the process
+# owning its guild's shard, so thread_data, the history cache and pending
+# "continue" chunks live there.  The SQLite store is shared by all processes
+# (WAL), so a thread's rows survive a change of shard count.
+#
+# Sharing it is only safe because of that ownership.  Each process buffers its
+# writes for STORE_FLUSH_SECONDS and reads its own pending writes first, but
+# never sees another process's, and every process keeps its own in-memory
+# caches on top (summaries, response cache).  So a thread's rows must only be
+# written by one process at a time: when the shard count changes, stop the
+# old cluster (a clean exit flushes the store) before starting the new one.
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import aiohttp
+
+from src.constants import (
+    CLUSTER_PROCESSES,
+    CLUSTER_RESTART_MAX_SECONDS,
+    CLUSTER_RESTART_MIN_SECONDS,
+    CLUSTER_STABLE_SECONDS,
+    DISCORD_BOT_TOKEN,
+    METRICS_PORT,
+    SCRIPT_DIR,
+    SHARD_COUNT,
+)
+from src.utils import logger
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+POLL_SECONDS = 1.0
+SHUTDOWN_GRACE_SECONDS = 15.0
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shards into `processes` contiguous, near-equal ranges."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def recommended_shard_count() -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            GATEWAY_BOT_URL, headers={"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+class ShardProcess:
+    """One child bot process and its restart bookkeeping."""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restart_at: Optional[float] = None
+        self.backoff = CLUSTER_RESTART_MIN_SECONDS
+        self.restarts = 0
+
+    def start(self, sync_commands: bool):
+        env = dict(
+            os.environ,
+            CLUSTER_ID=str(self.cluster_id),
+            SHARD_IDS=",".join(map(str, self.shard_ids)),
+            SHARD_COUNT=str(self.shard_count),
+            SYNC_COMMANDS="1" if sync_commands else "0",
+        )
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + self.cluster_id)
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "src.main"],
+            cwd=os.path.dirname(SCRIPT_DIR),
+            env=env,
+        )
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info(
+            f"Cluster {self.cluster_id} started (pid {self.proc.pid}, "
+            f"shards {self.shard_ids[0]}–{self.shard_ids[-1]} of {self.shard_count})"
+        )
+
+    def check(self, now: float):
+        """Restart the child once it has exited and its backoff has passed."""
+        code = self.proc.poll()
+        if code is None:
+            if now - self.started_at > CLUSTER_STABLE_SECONDS:
+                self.backoff = CLUSTER_RESTART_MIN_SECONDS
+            return
+        if self.restart_at is None:
+            self.restart_at = now + self.backoff
+            logger.warning(
+                f"Cluster {self.cluster_id} exited with {code} after "
+                f"{now - self.started_at:.0f}s – restarting in {self.backoff:.0f}s"
+            )
+            self.backoff = min(self.backoff * 2, CLUSTER_RESTART_MAX_SECONDS)
+        elif now >= self.restart_at:
+            self.restarts += 1
+            self.start(sync_commands=False)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            # SIGINT lets client.run() return and the store flush
+            self.proc.send_signal(signal.SIGINT)
+
+
+def supervise(children: List[ShardProcess]):
+    stopping = False
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    for child in children:
+        child.start(sync_commands=child.cluster_id == 0)
+    while not stopping:
+        time.sleep(POLL_SECONDS)
+        now = time.monotonic()
+        for child in children:
+            if not stopping:
+                child.check(now)
+
+    logger.info("Stopping cluster")
+    for child in children:
+        child.stop()
+    deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+    for child in children:
+        try:
+            child.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            child.proc.kill()
+
+
+def main():
+    logging.basicConfig(
+        format="[%(asctime)s] [cluster] [%(filename)s:%(lineno)d] %(message)s",
+        level=logging.INFO,
+    )
+    shard_count = SHARD_COUNT or max(
+        asyncio.run(recommended_shard_count()), CLUSTER_PROCESSES
+    )
+    ranges = shard_ranges(shard_count, CLUSTER_PROCESSES)
+    logger.info(f"Running {shard_count} shards in {len(ranges)} processes")
+    supervise(
+        [ShardProcess(i, shard_ids, shard_count) for i, shard_ids in enumerate(ranges)]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,36 @@
-# completion.py  –  SkippyAI edition: no moderation, 1900‑char chunks, /continue
+# completion.py  –  SkippyAI edition: opt-in moderation, 1900‑char chunks, /continue
+import asyncio
+import time
+from collections import OrderedDict
 from enum import Enum
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Optional, List, Sequence
 
-import openai
-from openai import AsyncOpenAI
 import discord
 
-from src.constants import BOT_INSTRUCTIONS, BOT_NAME, EXAMPLE_CONVOS, MAX_CHARS_PER_REPLY_MSG
+from src.constants import (
+    MAX_CHARS_PER_REPLY_MSG,
+    OPENAI_RAW_MESSAGES,
+    OPENAI_REPLY_TIMEOUT_SECONDS,
+    OPENAI_TITLE_TIMEOUT_SECONDS,
+    RETRIEVAL_ENABLED,
+)
 from src.base import Message, Prompt, Conversation, ThreadConfig
-from src.utils import split_into_shorter_messages, close_thread, logger
-
-MY_BOT_NAME = BOT_NAME
-MY_BOT_EXAMPLE_CONVOS = EXAMPLE_CONVOS
+from src.persona import Persona, active_persona
+from src.utils import split_into_shorter_messages, logger
+from src.history import history_cache
+from src.metrics import STAGE_SECONDS, record_usage
+from src.offload import offload
+from src.openai_client import get_client, hedge_delay, hedged, reply_latency
+from src.outbound import outbox
+from src.response_cache import response_cache
+from src.router import model_router, run_with_fallback
+from src.summaries import thread_summaries
+from src.tokens import fit_to_context, rendered_prompt_tokens
+from src.thread_scheduler import ReplyTicket
+from src.ratelimit import Priority, openai_scheduler
+from src.continuation import CONTINUE_HINT, continuation_store
+from src.streaming import ReplyBlocked, StreamingReply
 
 # ───────────────────────────────────────────────────────────────
 class CompletionResult(Enum):
@@ -20,6 +38,7 @@ class CompletionResult(Enum):
     TOO_LONG = 1
     INVALID_REQUEST = 2
     OTHER_ERROR = 3
+    BLOCKED = 4  # dropped by moderation, nothing to send
 
 
 @dataclass
@@ -27,47 +46,317 @@ class CompletionData:
     status: CompletionResult
     reply_text: Optional[str]
     status_text: Optional[str]
+    streamed: bool = False
+    model: Optional[str] = None  # the model that answered
 
 
-client = AsyncOpenAI()
+TITLE_MODEL = "gpt-4o-mini"
+TITLE_MAX_TOKENS = 16  # ~48 characters max
+TITLE_CACHE_SIZE = 256
+TITLE_CACHE: "OrderedDict[str, str]" = OrderedDict()
 
-# ───────────────────────────────────────────────────────────────
-# Internal store for "continue" payloads keyed by (guild_id, thread_id)
-PENDING_REPLIES: Dict[tuple[int, int], List[str]] = {}
-CONTINUE_HINT = "\n\n*(type `continue` for more)*"
 
 # ───────────────────────────────────────────────────────────────
-async def generate_completion_response(
-    messages: List[Message],
+def render_prompt(
+    messages: Sequence[Message],
     thread_config: ThreadConfig,
-) -> CompletionData:
+    persona: Optional[Persona] = None,
+) -> Optional[List[dict]]:
+    """Render the chat payload, or None if not even the latest message fits."""
+    with STAGE_SECONDS.time(stage="prompt_render"):
+        return _render_prompt(messages, thread_config, persona or active_persona())
+
+
+def _render_prompt(
+    messages: Sequence[Message],
+    thread_config: ThreadConfig,
+    persona: Persona,
+) -> Optional[List[dict]]:
     prompt = Prompt(
-        header=Message("system", f"Instructions for {MY_BOT_NAME}: {BOT_INSTRUCTIONS}"),
-        examples=MY_BOT_EXAMPLE_CONVOS,
+        header=persona.header,
+        examples=list(persona.examples),
         convo=Conversation(messages),
     )
-    rendered = prompt.full_render(MY_BOT_NAME)
 
-    try:
-        response = await client.chat.completions.create(
-            model=thread_config.model,
-            messages=rendered,
+    # Drop the oldest messages that don't fit instead of paying for a 400
+    window = fit_to_context(
+        messages,
+        persona.system_prompt,
+        thread_config.model,
+        thread_config.max_tokens,
+    )
+    if not window:
+        return None
+    if len(window) < len(messages):
+        logger.info(
+            f"Context window – kept {len(window)}/{len(messages)} messages "
+            f"for {thread_config.model}"
+        )
+        prompt = Prompt(prompt.header, prompt.examples, Conversation(window))
+    # the shared system prompt keeps the payload prefix identical across threads
+    return prompt.full_render(persona.bot_name, persona.system_prompt)
+
+
+async def thread_context(
+    thread_id: Optional[int],
+    messages: Sequence[Message],
+    thread_config: ThreadConfig,
+    guild_id: Optional[int] = None,
+) -> Sequence[Message]:
+    """
+    What a reply sees of its thread: the summary in place of the messages it
+    covers, and with RETRIEVAL_ENABLED only the recent tail plus the older
+    messages relevant to the latest one.
+    """
+    messages = await thread_summaries.compact(thread_id, messages, thread_config, guild_id)
+    if RETRIEVAL_ENABLED and thread_id is not None:
+        from src.retrieval import thread_index  # needs numpy, loaded only when enabled
+
+        messages = await thread_index.select(thread_id, messages, thread_config.model)
+    return messages
+
+
+def _failed(e: Exception) -> CompletionData:
+    import openai  # usually loaded by now, by the client of the failed call
+
+    if isinstance(e, openai.BadRequestError):
+        if "maximum context length" in str(e):
+            return CompletionData(CompletionResult.TOO_LONG, None, str(e))
+        return CompletionData(CompletionResult.INVALID_REQUEST, None, str(e))
+    logger.exception(e)
+    return CompletionData(CompletionResult.OTHER_ERROR, None, str(e))
+
+
+def _too_long() -> CompletionData:
+    return CompletionData(
+        CompletionResult.TOO_LONG, None, "Latest message exceeds the context window"
+    )
+
+
+async def _timed_stream(stream, started: float, guild_id: Optional[int], model: str):
+    """Pass a completion stream through, recording model time and usage at the end."""
+    async for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            record_usage(usage, guild_id, model)
+        yield chunk
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed, stage="model")
+    reply_latency.record(model, elapsed)
+
+
+async def _create_completion(
+    rendered: List[dict],
+    thread_config: ThreadConfig,
+    ticket: Optional[ReplyTicket],
+    guild_id: Optional[int] = None,
+    retry_server_errors: bool = True,
+    hedge: bool = True,
+    **kwargs,
+):
+    """
+    Send a thread-reply completion through the shared request scheduler.
+    Without `hedge` (a routed reply with a fallback already has its second
+    request), a slow reply isn't duplicated.
+    """
+    model = thread_config.model
+    prompt_tokens = rendered_prompt_tokens(rendered, model)
+    messages = rendered
+    if OPENAI_RAW_MESSAGES:  # skip the SDK's per-message transform, see constants
+        kwargs["extra_body"] = {**kwargs.get("extra_body", {}), "messages": rendered}
+        messages = []
+
+    async def request():
+        if ticket:
+            ticket.mark_sent(prompt_tokens)
+        started = time.perf_counter()
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
             temperature=thread_config.temperature,
             top_p=1.0,
             max_tokens=thread_config.max_tokens,
             stop=["<|endoftext|>"],
+            timeout=OPENAI_REPLY_TIMEOUT_SECONDS,
+            **kwargs,
+        )
+        if kwargs.get("stream"):
+            return _timed_stream(response, started, guild_id, model)
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage="model")
+        reply_latency.record(model, elapsed)
+        record_usage(response.usage, guild_id, model)
+        return response
+
+    def attempt():
+        return openai_scheduler.run(
+            model,
+            prompt_tokens + thread_config.max_tokens,
+            Priority.INTERACTIVE,
+            request,
+            retry_server_errors,
+        )
+
+    if kwargs.get("stream") or not hedge:
+        return await attempt()
+    # a slow reply gets a duplicate request, unless others are already queueing
+    return await hedged(
+        model, attempt, hedge_delay(model), lambda: openai_scheduler.queue_depth == 0
+    )
+
+
+async def generate_completion_response(
+    messages: Sequence[Message],
+    thread_config: ThreadConfig,
+    ticket: Optional[ReplyTicket] = None,
+    guild_id: Optional[int] = None,
+    thread_id: Optional[int] = None,
+) -> CompletionData:
+    """
+    With MODEL_ROUTING the reply may come from another model than the
+    thread's (see src/router.py); `model` on the result says which.
+    With `thread_id`, the prompt is built from thread_context().
+    """
+    persona = active_persona()
+    try:
+        messages = await thread_context(thread_id, messages, thread_config, guild_id)
+        rendered = await offload(
+            len(messages), render_prompt, messages, thread_config, persona
+        )
+        if rendered is None:
+            return _too_long()
+
+        cache_key = response_cache.key_for(rendered, thread_config)
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                return CompletionData(CompletionResult.OK, cached, None)
+
+        plan = model_router.plan(messages, thread_config, rendered)
+        payloads = {thread_config.model: rendered}
+        for config in filter(None, (plan.primary, plan.fallback)):
+            if config.model not in payloads:
+                payloads[config.model] = await offload(
+                    len(messages), render_prompt, messages, config, persona
+                )
+        primary = plan.primary if payloads[plan.primary.model] else thread_config
+        fallback = plan.fallback if plan.fallback and payloads[plan.fallback.model] else None
+        if fallback is not None and fallback.model == primary.model:
+            fallback = None  # the routed model didn't fit; don't race a copy of the request
+
+        # with a fallback, a 5xx fails over instead of being retried, and a
+        # slow reply races the fallback instead of a hedge
+        def attempt(config: ThreadConfig, retry_server_errors: bool = True):
+            return lambda: _create_completion(
+                payloads[config.model],
+                config,
+                ticket,
+                guild_id,
+                retry_server_errors=retry_server_errors,
+                hedge=fallback is None,
+            )
+
+        response, outcome = await run_with_fallback(
+            attempt(primary, retry_server_errors=fallback is None),
+            attempt(fallback) if fallback else None,
+            plan.deadline,
+        )
+        answered = primary.model if outcome == "primary" else fallback.model
+        model_router.record(
+            thread_config.model, answered, plan.route if outcome == "primary" else outcome
         )
         reply = response.choices[0].message.content.strip()
-        return CompletionData(CompletionResult.OK, reply, None)
+        # the key is for the thread's model; another model's answer isn't kept
+        if cache_key and reply and answered == thread_config.model:
+            response_cache.put(cache_key, reply)
+        return CompletionData(CompletionResult.OK, reply, None, model=answered)
+
+    except Exception as e:
+        return _failed(e)
 
-    except openai.BadRequestError as e:
-        if "maximum context length" in str(e):
-            return CompletionData(CompletionResult.TOO_LONG, None, str(e))
-        return CompletionData(CompletionResult.INVALID_REQUEST, None, str(e))
+
+async def stream_completion_response(
+    thread: discord.Thread,
+    messages: Sequence[Message],
+    thread_config: ThreadConfig,
+    ticket: Optional[ReplyTicket] = None,
+    gate: Optional[asyncio.Future] = None,
+) -> CompletionData:
+    """
+    Like generate_completion_response, but posts the reply into `thread`
+    while it is generated.  On success the reply is already visible, so the
+    returned data is marked `streamed` and process_response won't resend it.
+    Nothing is posted until `gate` (the moderation verdict) resolves true.
+    A cached reply is returned unstreamed, for process_response to send.
+    With MODEL_ROUTING the model is routed, but there is no fallback: a
+    half-posted reply can't be swapped for another model's.
+    """
+    persona = active_persona()
+    reply = StreamingReply(thread, gate=gate)
+    try:
+        messages = await thread_context(thread.id, messages, thread_config, thread.guild.id)
+        rendered = await offload(
+            len(messages), render_prompt, messages, thread_config, persona
+        )
+        if rendered is None:
+            return _too_long()
+
+        cache_key = response_cache.key_for(rendered, thread_config)
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                if gate is not None and not await asyncio.shield(gate):
+                    return CompletionData(CompletionResult.BLOCKED, None, None)
+                return CompletionData(CompletionResult.OK, cached, None)
+
+        plan = model_router.plan(messages, thread_config, rendered)
+        config, route = plan.primary, plan.route
+        if config.model != thread_config.model:
+            routed = await offload(len(messages), render_prompt, messages, config, persona)
+            if routed:
+                rendered = routed
+            else:
+                config, route = thread_config, "direct"
+
+        start = time.perf_counter()
+        stream = await _create_completion(
+            rendered,
+            config,
+            ticket,
+            thread.guild.id,
+            stream=True,
+            # the last chunk then carries the usage
+            extra_body={"stream_options": {"include_usage": True}},
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                await reply.feed(chunk.choices[0].delta.content)
+        await reply.finish()
+
+    except asyncio.CancelledError:
+        await reply.abort()
+        raise
+
+    except ReplyBlocked:
+        return CompletionData(CompletionResult.BLOCKED, None, None)
 
     except Exception as e:
-        logger.exception(e)
-        return CompletionData(CompletionResult.OTHER_ERROR, None, str(e))
+        return _failed(e)
+
+    total_ms = (time.perf_counter() - start) * 1000
+    first_ms = (
+        (reply.first_visible_at - start) * 1000 if reply.first_visible_at else total_ms
+    )
+    if cache_key and reply.text and config.model == thread_config.model:
+        response_cache.put(cache_key, reply.text.strip())
+    model_router.record(thread_config.model, config.model, route)
+    logger.info(
+        f"Streamed reply – first visible token {first_ms:.0f} ms, "
+        f"total {total_ms:.0f} ms, {len(reply.sent)} message(s)"
+    )
+    return CompletionData(
+        CompletionResult.OK, reply.text, None, streamed=True, model=config.model
+    )
 
 # ───────────────────────────────────────────────────────────────
 async def process_response(
@@ -82,29 +371,37 @@ async def process_response(
 
     if status is CompletionResult.OK:
         if not reply_text:
-            await thread.send(
+            await outbox.send(
+                thread,
                 embed=discord.Embed(
                     description="**Invalid response** – empty text",
                     color=discord.Color.yellow(),
                 )
             )
             return
+        if response_data.streamed:
+            return  # already posted by stream_completion_response
 
         chunks = split_into_shorter_messages(reply_text)   # drop 2nd arg
+        # Keep the extra chunks aside (this also drops leftovers of an
+        # older reply) and hint the user
+        continuation_store.put((thread.guild.id, thread.id), chunks[1:])
         if len(chunks) > 1:
-            # Keep the extra chunks aside and hint user
-            key = (thread.guild.id, thread.id)
-            PENDING_REPLIES[key] = chunks[1:]
-            chunks[-1] += CONTINUE_HINT
+            chunks[0] += CONTINUE_HINT
 
-        for chunk in chunks[:1]:  # send only the first chunk now
-            await thread.send(chunk)
+        with STAGE_SECONDS.time(stage="thread_send"):
+            sent = await outbox.send(thread, chunks[0])  # only the first chunk now
+        history_cache.observe(sent)
 
     elif status is CompletionResult.TOO_LONG:
-        await close_thread(thread)
+        await outbox.close_thread(thread)
+
+    elif status is CompletionResult.BLOCKED:
+        return
 
     else:  # INVALID_REQUEST or OTHER_ERROR
-        await thread.send(
+        await outbox.send(
+            thread,
             embed=discord.Embed(
                 description=f"**Error** – {status_text}",
                 color=discord.Color.red(),
@@ -112,24 +409,35 @@ async def process_response(
         )
 
 # ───────────────────────────────────────────────────────────────
-async def maybe_continue(thread: discord.Thread):
-    """If the user types 'continue', send the next pending chunk."""
-    key = (thread.guild.id, thread.id)
-    if key in PENDING_REPLIES and PENDING_REPLIES[key]:
-        next_chunk = PENDING_REPLIES[key].pop(0)
-        if PENDING_REPLIES[key]:
-            next_chunk += CONTINUE_HINT
-        else:
-            # All chunks consumed
-            del PENDING_REPLIES[key]
-        await thread.send(next_chunk)
-
-async def generate_title(prompt: str) -> str:
+async def maybe_continue(thread: discord.Thread) -> bool:
+    """
+    If the user types 'continue', send the next pending chunk.
+    Returns False when nothing was pending, so the message gets a normal reply.
+    """
+    next_chunk = await continuation_store.pop((thread.guild.id, thread.id))
+    if next_chunk is None:
+        return False
+    with STAGE_SECONDS.time(stage="thread_send"):
+        sent = await outbox.send(thread, next_chunk)
+    history_cache.observe(sent)
+    return True
+
+def _title_key(prompt: str) -> str:
+    return " ".join(prompt.casefold().split())
+
+
+async def generate_title(prompt: str, guild_id: Optional[int] = None) -> str:
     """
     Create a Skippy‑style Discord thread title (<=40 chars).
+    Titles are cached per normalized prompt, so repeated /chat openers are free.
     """
+    key = _title_key(prompt)
+    if key in TITLE_CACHE:
+        TITLE_CACHE.move_to_end(key)
+        return TITLE_CACHE[key]
+
     # Use only the persona's first paragraph for flavour
-    persona = BOT_INSTRUCTIONS.split("\n\n", 1)[0]
+    persona = active_persona().instructions.split("\n\n", 1)[0]
 
     system_msg = (
         f"{persona}\n\n"
@@ -139,16 +447,29 @@ async def generate_title(prompt: str) -> str:
         "No hashtags, no quotes, no trailing punctuation."
     )
 
-    resp = await client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=16,      # ~48 characters max
-        temperature=0.7,
-        top_p=0.9,
+    messages = [
+        {"role": "system", "content": system_msg},
+        {"role": "user", "content": prompt},
+    ]
+    resp = await openai_scheduler.run(
+        TITLE_MODEL,
+        rendered_prompt_tokens(messages, TITLE_MODEL) + TITLE_MAX_TOKENS,
+        Priority.BACKGROUND,
+        lambda: get_client().chat.completions.create(
+            model=TITLE_MODEL,
+            messages=messages,
+            max_tokens=TITLE_MAX_TOKENS,
+            temperature=0.7,
+            top_p=0.9,
+            timeout=OPENAI_TITLE_TIMEOUT_SECONDS,
+        ),
     )
+    record_usage(resp.usage, guild_id, TITLE_MODEL)
     title = resp.choices[0].message.content.strip().replace("\n", " ")
-    return title[:40]  # hard cap
+    title = title[:40]  # hard cap
+
+    TITLE_CACHE[key] = title
+    if len(TITLE_CACHE) > TITLE_CACHE_SIZE:
+        TITLE_CACHE.popitem(last=False)
+    return title
 
@@ -0,0 +1,93 @@
+# config_snapshot.py  –  config.yaml parsed once, reused until the file changes
+import hashlib
+import json
+import logging
+import os
+from typing import Optional, Tuple
+
+from src.base import Config, Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# Bump when Config / Message change shape, so old snapshots are ignored
+SNAPSHOT_FORMAT = 2
+
+
+def config_version(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+
+def parse_config(raw: bytes) -> Config:
+    """Parse and type-check config.yaml; raises on anything invalid."""
+    import dacite  # deferred with yaml: only needed when the snapshot is stale
+    import yaml
+
+    config = dacite.from_dict(
+        Config,
+        yaml.safe_load(raw),
+        # Message is a slotted class, not a dataclass
+        config=dacite.Config(type_hooks={Message: lambda m: Message(**m)}),
+    )
+    if not config.name.strip() or not config.instructions.strip():
+        raise ValueError("config.yaml needs a name and instructions")
+    return config
+
+
+def _to_json(config: Config) -> dict:
+    return {
+        "name": config.name,
+        "instructions": config.instructions,
+        "example_conversations": [
+            {"messages": [{"user": m.user, "text": m.text} for m in convo.messages]}
+            for convo in config.example_conversations
+        ],
+    }
+
+
+def _from_json(data: dict) -> Config:
+    # built by hand: the snapshot was validated when written, and skipping
+    # dacite (and yaml) is what makes it fast
+    return Config(
+        name=data["name"],
+        instructions=data["instructions"],
+        example_conversations=[
+            Conversation([Message(**m) for m in convo["messages"]])
+            for convo in data["example_conversations"]
+        ],
+    )
+
+
+def load_config(path: str, snapshot_path: Optional[str]) -> Tuple[Config, str]:
+    """
+    Return (Config, version) for the file at `path`.  A validated snapshot
+    of the parsed Config is kept at `snapshot_path` as JSON, keyed by the
+    file's content hash, so a restart with an unchanged config.yaml skips
+    YAML parsing and validation entirely.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    version = config_version(raw)
+
+    if snapshot_path:
+        try:
+            with open(snapshot_path, "rb") as f:
+                saved = json.load(f)
+            if saved.get("format") == SNAPSHOT_FORMAT and saved.get("version") == version:
+                return _from_json(saved["config"]), version
+        except FileNotFoundError:
+            pass
+        except Exception as e:  # noqa: BLE001 – a bad snapshot is just rebuilt
+            logger.warning(f"Ignoring config snapshot {snapshot_path}: {e!r}")
+
+    config = parse_config(raw)
+    if snapshot_path:
+        try:
+            os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+            tmp = f"{snapshot_path}.{os.getpid()}.tmp"
+            snapshot = {"format": SNAPSHOT_FORMAT, "version": version, "config": _to_json(config)}
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write config snapshot {snapshot_path}: {e!r}")
+    return config, version
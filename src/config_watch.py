@@ -0,0 +1,70 @@
+# config_watch.py  –  pick up config.yaml changes without restarting the bot
+import asyncio
+import os
+from typing import Optional, Tuple
+
+from src.config_snapshot import load_config
+from src.constants import CONFIG_PATH, CONFIG_RELOAD_SECONDS, CONFIG_SNAPSHOT_PATH
+from src.metrics import Counter
+from src.persona import activate, active_version
+from src.utils import logger
+
+RELOADS = Counter(
+    "skippy_config_reloads_total",
+    "config.yaml changes seen at runtime, by result (applied / rejected / unchanged).",
+    ("result",),
+)
+
+FileStamp = Tuple[int, int]  # (mtime_ns, size)
+
+
+def _stamp(path: str) -> Optional[FileStamp]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+async def reload_config(
+    path: str = CONFIG_PATH, snapshot_path: Optional[str] = CONFIG_SNAPSHOT_PATH
+) -> bool:
+    """
+    Parse and validate the config at `path` and, if it differs from the one
+    in use, switch new requests to it (its system prompt is rendered once,
+    here).  A config that fails to load is rejected and the current one
+    stays.  Returns whether the persona changed.
+    """
+    try:
+        # off the event loop: YAML parsing and validation take a while
+        config, version = await asyncio.to_thread(load_config, path, snapshot_path)
+    except Exception as e:  # noqa: BLE001 – live traffic keeps the old config
+        RELOADS.inc(result="rejected")
+        logger.error(f"Config reload – rejected {path}, keeping {active_version()}: {e!r}")
+        return False
+    if version == active_version():
+        RELOADS.inc(result="unchanged")
+        return False
+    previous = active_version()
+    activate(config=config, version=version)
+    RELOADS.inc(result="applied")
+    logger.info(f"Config reload – {previous} → {version} ({config.name})")
+    return True
+
+
+async def watch_config(
+    path: str = CONFIG_PATH,
+    snapshot_path: Optional[str] = CONFIG_SNAPSHOT_PATH,
+    interval: float = CONFIG_RELOAD_SECONDS,
+):
+    """Check `path` every `interval` seconds and reload it when it changes."""
+    if interval <= 0:
+        return
+    stamp = _stamp(path)
+    while True:
+        await asyncio.sleep(interval)
+        current = _stamp(path)
+        if current is None or current == stamp:
+            continue  # unchanged, or mid-replace by an editor
+        stamp = current
+        await reload_config(path, snapshot_path)
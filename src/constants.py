@@ -1,13 +1,14 @@
 """
 constants.py  —  SkippyAI stripped‑down edition
-No moderation • zero extra delay • 1 900‑char chunks • GPT‑4o models allowed
+Opt-in moderation • 0.75 s reply debounce • 1 900‑char chunks • GPT‑4o models allowed
 """
 
 from dotenv import load_dotenv
-import os, yaml, dacite
-from typing import List, Dict, Literal
+import os
+from typing import List, Dict, Literal, Optional, Tuple
 
 from src.base import Config
+from src.config_snapshot import load_config
 
 load_dotenv()
 
@@ -15,10 +16,15 @@ load_dotenv()
 # Load persona from config.yaml
 # ───────────────────────────────────────────────────────────────
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
-CONFIG: Config = dacite.from_dict(
-    Config,
-    yaml.safe_load(open(os.path.join(SCRIPT_DIR, "config.yaml"), "r")),
+CONFIG_PATH = os.path.join(SCRIPT_DIR, "config.yaml")
+# Parsed config cached across restarts (see src/config_snapshot.py); "" disables it
+CONFIG_SNAPSHOT_PATH = os.getenv(
+    "CONFIG_SNAPSHOT_PATH", os.path.join(SCRIPT_DIR, "..", "data", "config.snapshot")
 )
+CONFIG: Config
+CONFIG, CONFIG_VERSION = load_config(CONFIG_PATH, CONFIG_SNAPSHOT_PATH)
+# How often config.yaml is checked for changes at runtime (see src/config_watch.py); 0 disables
+CONFIG_RELOAD_SECONDS = float(os.getenv("CONFIG_RELOAD_SECONDS", 5))
 
 BOT_NAME        = CONFIG.name
 BOT_INSTRUCTIONS = CONFIG.instructions
@@ -30,6 +36,8 @@ EXAMPLE_CONVOS   = CONFIG.example_conversations
 DISCORD_BOT_TOKEN = os.environ["DISCORD_BOT_TOKEN"]
 DISCORD_CLIENT_ID = os.environ["DISCORD_CLIENT_ID"]
 OPENAI_API_KEY    = os.environ["OPENAI_API_KEY"]
+# Point the OpenAI clients at a proxy or a local fake (see benchmarks/replay.py)
+OPENAI_BASE_URL   = os.getenv("OPENAI_BASE_URL") or None
 
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gpt-4o-mini")
 
@@ -37,8 +45,49 @@ ALLOWED_SERVER_IDS: List[int] = [
     int(s) for s in os.environ["ALLOWED_SERVER_IDS"].split(",")
 ]
 
-# Moderation mapping kept only for future use; not referenced now
-SERVER_TO_MOD_CHANNEL: Dict[int, int] = {}
+# ───────────────────────────────────────────────────────────────
+# Moderation (opt‑in, see src/moderation.py)
+# ───────────────────────────────────────────────────────────────
+MODERATION_ENABLED = os.getenv("MODERATION_ENABLED", "0") == "1"
+
+# "server_id:channel_id,server_id_2:channel_id_2"
+SERVER_TO_MODERATION_CHANNEL: Dict[int, int] = {}
+for _pair in filter(None, os.getenv("SERVER_TO_MODERATION_CHANNEL", "").split(",")):
+    _server, _channel = _pair.split(":")
+    SERVER_TO_MODERATION_CHANNEL[int(_server)] = int(_channel)
+
+# Keys are the openai CategoryScores field names.
+# A higher value means less chance of triggering, 1.0 disables the category.
+MODERATION_VALUES_FOR_BLOCKED = {
+    "harassment": 0.5,
+    "harassment_threatening": 0.1,
+    "hate": 0.5,
+    "hate_threatening": 0.1,
+    "self_minus_harm": 0.2,
+    "self_minus_harm_instructions": 0.5,
+    "self_minus_harm_intent": 0.7,
+    "sexual": 0.5,
+    "sexual_minors": 0.2,
+    "violence": 0.7,
+    "violence_graphic": 0.8,
+}
+MODERATION_VALUES_FOR_FLAGGED = {
+    "harassment": 0.5,
+    "harassment_threatening": 0.1,
+    "hate": 0.4,
+    "hate_threatening": 0.05,
+    "self_minus_harm": 0.1,
+    "self_minus_harm_instructions": 0.5,
+    "self_minus_harm_intent": 0.7,
+    "sexual": 0.3,
+    "sexual_minors": 0.1,
+    "violence": 0.1,
+    "violence_graphic": 0.1,
+}
+
+MODERATION_BATCH_WINDOW_SECONDS = 0.005  # group messages arriving this close
+MODERATION_BATCH_MAX            = 32
+MODERATION_CACHE_SIZE           = 4096
 
 # ───────────────────────────────────────────────────────────────
 # Allowed OpenAI models
@@ -57,6 +106,82 @@ AVAILABLE_MODELS = Literal[
     "gpt-3.5-turbo",
 ]
 
+# Per-model (requests/min, tokens/min) for the shared request scheduler.
+# Override with OPENAI_RATE_LIMITS="gpt-4o:500:30000,gpt-4o-mini:500:200000"
+MODEL_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gpt-4o": (500, 30_000),
+    "gpt-4o-mini": (500, 200_000),
+    "gpt-4": (500, 10_000),
+    "gpt-3.5-turbo": (3_500, 200_000),
+}
+for _limit in filter(None, os.getenv("OPENAI_RATE_LIMITS", "").split(",")):
+    _model, _rpm, _tpm = _limit.split(":")
+    MODEL_RATE_LIMITS[_model] = (int(_rpm), int(_tpm))
+DEFAULT_MODEL_RATE_LIMIT = (500, 30_000)
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_MAX_RETRIES     = int(os.getenv("OPENAI_MAX_RETRIES", 4))
+
+# Shared HTTP transport for every OpenAI call (see src/openai_client.py)
+OPENAI_MAX_CONNECTIONS            = int(os.getenv("OPENAI_MAX_CONNECTIONS", 48))
+OPENAI_MAX_KEEPALIVE              = int(os.getenv("OPENAI_MAX_KEEPALIVE", 24))
+OPENAI_KEEPALIVE_SECONDS          = 90.0
+OPENAI_HTTP2                      = os.getenv("OPENAI_HTTP2", "0") == "1"  # needs h2
+OPENAI_WARM_CONNECTIONS           = int(os.getenv("OPENAI_WARM_CONNECTIONS", 2))
+OPENAI_CONNECT_TIMEOUT_SECONDS    = 5.0
+OPENAI_REPLY_TIMEOUT_SECONDS      = float(os.getenv("OPENAI_REPLY_TIMEOUT_SECONDS", 60))
+OPENAI_TITLE_TIMEOUT_SECONDS      = 10.0
+OPENAI_MODERATION_TIMEOUT_SECONDS = 5.0
+
+# openai==1.2's create() type-checks every message on the event loop (about
+# 0.7 ms each).  With OPENAI_RAW_MESSAGES=1 thread replies pass their payload,
+# already in the API's shape, through extra_body instead.  Relies on that SDK
+# version's request building; re-check before upgrading openai.
+OPENAI_RAW_MESSAGES = os.getenv("OPENAI_RAW_MESSAGES", "0") == "1"
+
+# Hedge a thread reply that's slower than this latency percentile of its
+# model (e.g. 0.95) with a duplicate request; 0 disables hedging
+OPENAI_HEDGE_PERCENTILE  = float(os.getenv("OPENAI_HEDGE_PERCENTILE", 0))
+OPENAI_HEDGE_MIN_SAMPLES = 20
+
+# Model routing for thread replies (see src/router.py), off by default.
+# Short turns go to the currently fastest of ROUTER_FAST_MODELS; a reply that
+# misses its deadline or gets a 5xx falls back along ROUTER_FALLBACKS.
+MODEL_ROUTING               = os.getenv("MODEL_ROUTING", "0") == "1"
+ROUTER_FAST_MODELS          = [
+    m for m in os.getenv("ROUTER_FAST_MODELS", "gpt-4o-mini").split(",") if m in ALLOWED_MODELS
+]
+ROUTER_SHORT_PROMPT_TOKENS  = int(os.getenv("ROUTER_SHORT_PROMPT_TOKENS", 1_500))  # excl. system prompt
+ROUTER_SIMPLE_TURN_CHARS    = int(os.getenv("ROUTER_SIMPLE_TURN_CHARS", 400))
+ROUTER_DEADLINE_SECONDS     = float(os.getenv("ROUTER_DEADLINE_SECONDS", 30))
+ROUTER_MIN_DEADLINE_SECONDS = 5.0
+ROUTER_FALLBACKS: Dict[str, str] = {
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4o-mini": "gpt-4o",
+    "gpt-4": "gpt-4o",
+    "gpt-3.5-turbo": "gpt-4o-mini",
+}
+# Override with ROUTER_FALLBACKS="gpt-4o:gpt-4o-mini,gpt-4o-mini:gpt-4o"
+for _pair in filter(None, os.getenv("ROUTER_FALLBACKS", "").split(",")):
+    _model, _fallback = _pair.split(":")
+    ROUTER_FALLBACKS[_model] = _fallback
+
+# ───────────────────────────────────────────────────────────────
+# Sharding / cluster mode (see src/cluster.py)
+# Unset, one process runs every shard and discord.py picks the count.
+# ───────────────────────────────────────────────────────────────
+SHARD_COUNT: Optional[int] = int(os.environ["SHARD_COUNT"]) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS: Optional[List[int]] = (
+    [int(s) for s in os.environ["SHARD_IDS"].split(",")] if os.getenv("SHARD_IDS") else None
+)
+CLUSTER_ID        = os.getenv("CLUSTER_ID", "")
+CLUSTER_PROCESSES = int(os.getenv("CLUSTER_PROCESSES", 2))
+SYNC_COMMANDS     = os.getenv("SYNC_COMMANDS", "1") == "1"  # only one process per cluster
+
+CLUSTER_RESTART_MIN_SECONDS = 1.0
+CLUSTER_RESTART_MAX_SECONDS = 60.0
+CLUSTER_STABLE_SECONDS      = 300.0  # uptime after which a shard's backoff resets
+
 # ───────────────────────────────────────────────────────────────
 # Discord bot invite (Send Msgs • Threads • Slash Cmds)
 # ───────────────────────────────────────────────────────────────
@@ -69,9 +194,87 @@ BOT_INVITE_URL = (
 # ───────────────────────────────────────────────────────────────
 # Runtime / UX tuning
 # ───────────────────────────────────────────────────────────────
-SECONDS_DELAY_RECEIVING_MSG = 0        # respond immediately
+# wait this long after a thread message for follow-ups, so a burst of
+# messages gets one reply; each new message restarts the wait
+SECONDS_DELAY_RECEIVING_MSG = float(os.getenv("SECONDS_DELAY_RECEIVING_MSG", 0.75))
 MAX_THREAD_MESSAGES         = 1000     # auto‑close after this many
 MAX_CHARS_PER_REPLY_MSG     = 1900     # Discord hard limit is 2000
 
+# Streaming replies: post early, then edit at most once per interval
+STREAM_REPLIES                = os.getenv("STREAM_REPLIES", "0") == "1"
+STREAM_EDIT_INTERVAL_SECONDS  = float(os.getenv("STREAM_EDIT_INTERVAL_SECONDS", 1.2))
+STREAM_FIRST_CHUNK_CHARS      = 20     # don't post a message for a single token
+
+# Outbound Discord queue (see src/outbound.py), paced to Discord's buckets:
+# (requests, per seconds) globally, per channel for messages, and per thread
+# for renames
+DISCORD_GLOBAL_LIMIT         = (50, 1.0)
+DISCORD_CHANNEL_LIMIT        = (5, 5.0)
+DISCORD_RENAME_LIMIT         = (2, 600.0)
+DISCORD_OUTBOX_MAX_CHANNELS  = 10_000   # channels whose buckets are remembered
+
+# In-memory thread history cache (see src/history.py)
+HISTORY_CACHE_MAX_THREADS  = int(os.getenv("HISTORY_CACHE_MAX_THREADS", 500))
+HISTORY_CACHE_MAX_BYTES    = int(os.getenv("HISTORY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+HISTORY_CACHE_IDLE_SECONDS = int(os.getenv("HISTORY_CACHE_IDLE_SECONDS", 60 * 60))
+
+# Durable thread state (see src/store.py)
+STORE_PATH          = os.getenv("STORE_PATH", os.path.join(SCRIPT_DIR, "..", "data", "skippy.sqlite3"))
+STORE_FLUSH_SECONDS = float(os.getenv("STORE_FLUSH_SECONDS", 0.5))
+
+# Rolling thread summaries (see src/summaries.py), opt-in.  Once the part of a
+# thread not yet summarized passes SUMMARY_TRIGGER_TOKENS (0 disables), all but
+# the newest SUMMARY_KEEP_RECENT_TOKENS of it is folded into the summary.
+SUMMARY_MODEL              = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
+SUMMARY_TRIGGER_TOKENS     = int(os.getenv("SUMMARY_TRIGGER_TOKENS", 0))
+SUMMARY_KEEP_RECENT_TOKENS = int(os.getenv("SUMMARY_KEEP_RECENT_TOKENS", 3_000))
+SUMMARY_CHUNK_TOKENS       = 12_000  # new messages per summarization call
+SUMMARY_MAX_TOKENS         = 700
+SUMMARY_CACHE_SIZE         = 1_000   # threads kept in memory
+SUMMARY_RETRY_SECONDS      = 60      # after a failed summarization
+
+# Retrieval of relevant older messages (see src/retrieval.py), off by default;
+# needs `pip install numpy`.  A reply keeps the newest RETRIEVAL_TAIL_TOKENS of
+# the thread and adds the RETRIEVAL_TOP_K older messages most similar to the
+# latest one.  RETRIEVAL_EMBEDDER is "openai" or "hashing" (local, deterministic).
+RETRIEVAL_ENABLED       = os.getenv("RETRIEVAL_ENABLED", "0") == "1"
+RETRIEVAL_EMBEDDER      = os.getenv("RETRIEVAL_EMBEDDER", "openai")
+RETRIEVAL_EMBED_MODEL   = os.getenv("RETRIEVAL_EMBED_MODEL", "text-embedding-3-small")
+RETRIEVAL_TAIL_TOKENS   = int(os.getenv("RETRIEVAL_TAIL_TOKENS", 2_000))
+RETRIEVAL_TOP_K         = int(os.getenv("RETRIEVAL_TOP_K", 6))
+RETRIEVAL_MIN_SCORE     = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.2))
+RETRIEVAL_MAX_THREADS   = 500    # thread indexes kept in memory
+RETRIEVAL_EMBED_BATCH   = 256    # texts per embedding request
+
+# Overflow chunks waiting for "continue" (see src/continuation.py)
+CONTINUATION_MAX_BYTES             = int(os.getenv("CONTINUATION_MAX_BYTES", 16 * 1024 * 1024))
+CONTINUATION_MAX_CHUNKS_PER_THREAD = int(os.getenv("CONTINUATION_MAX_CHUNKS_PER_THREAD", 20))
+CONTINUATION_IDLE_SECONDS          = int(os.getenv("CONTINUATION_IDLE_SECONDS", 6 * 60 * 60))
+
+# Prometheus metrics endpoint (see src/metrics.py), off unless METRICS_PORT is set
+METRICS_PORT                      = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST                      = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+# Event-loop watchdog (see src/watchdog.py): log the loop's stack once it has
+# been blocked for WATCHDOG_STALL_SECONDS; 0 disables
+WATCHDOG_STALL_SECONDS    = float(os.getenv("WATCHDOG_STALL_SECONDS", 0.5))
+WATCHDOG_INTERVAL_SECONDS = 0.1
+
+# Prompt building / history conversion for threads of at least this many
+# messages runs on a worker pool instead of the event loop (see src/offload.py)
+OFFLOAD_MIN_MESSAGES = int(os.getenv("OFFLOAD_MIN_MESSAGES", 200))
+OFFLOAD_WORKERS      = 2
+
+# Exact-match reply cache (see src/response_cache.py), opt-in
+RESPONSE_CACHE_ENABLED         = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_MAX_TEMPERATURE = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", 0.2))
+RESPONSE_CACHE_MAX_ENTRIES     = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+RESPONSE_CACHE_DISK_BYTES      = int(os.getenv("RESPONSE_CACHE_DISK_BYTES", 0))  # 0: memory only
+RESPONSE_CACHE_TRIM_EVERY      = 64  # disk writes between size checks
+
+# Memoized token counts (see src/tokens.py)
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 65536))
+
 ACTIVATE_THREAD_PREFX   = "💬✅"
 INACTIVATE_THREAD_PREFIX = "💬❌"
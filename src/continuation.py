@@ -0,0 +1,132 @@
+# continuation.py  –  bounded store for reply chunks waiting on "continue"
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.constants import (
+    CONTINUATION_IDLE_SECONDS,
+    CONTINUATION_MAX_BYTES,
+    CONTINUATION_MAX_CHUNKS_PER_THREAD,
+)
+from src.store import store
+from src.utils import logger
+
+CONTINUE_KEYWORD = "continue"
+CONTINUE_HINT = "\n\n*(type `continue` for more)*"
+
+Key = Tuple[int, int]  # (guild_id, thread_id)
+
+
+def _chunk_size(chunk: str) -> int:
+    return len(chunk.encode())
+
+
+@dataclass
+class _Pending:
+    chunks: Deque[str]
+    size: int
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ContinuationStore:
+    """
+    Overflow chunks of long replies, served one per `continue`.
+
+    In memory the store is bounded by a total byte budget and a per-thread
+    chunk cap; entries idle for longer than `idle_seconds` expire, and the
+    least recently used thread is dropped first when over budget.  Every
+    change is written through to the SQLite store, so a thread dropped from
+    memory for space (or a restart) is reloaded lazily on its next
+    `continue`; expired entries are removed from disk as well.  Concurrent
+    `continue`s for a thread share one load, so each gets its own chunk.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = CONTINUATION_MAX_BYTES,
+        max_chunks_per_thread: int = CONTINUATION_MAX_CHUNKS_PER_THREAD,
+        idle_seconds: float = CONTINUATION_IDLE_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_chunks_per_thread = max_chunks_per_thread
+        self.idle_seconds = idle_seconds
+
+        self._entries: "OrderedDict[Key, _Pending]" = OrderedDict()
+        self._loads: Dict[Key, asyncio.Task] = {}
+        self._size = 0
+
+    def put(self, key: Key, chunks: List[str]):
+        """Replace the thread's pending chunks; an empty list clears them."""
+        self._drop(key)
+        if len(chunks) > self.max_chunks_per_thread:
+            logger.info(
+                f"Continuation for {key} truncated to "
+                f"{self.max_chunks_per_thread}/{len(chunks)} chunks"
+            )
+            chunks = chunks[: self.max_chunks_per_thread]
+        store.save_pending_replies(*key, chunks)
+        if chunks:
+            self._insert(key, chunks)
+
+    async def pop(self, key: Key) -> Optional[str]:
+        """Next chunk for the thread (with a hint if more remain), or None."""
+        self._expire()
+        if key not in self._entries:
+            load = self._loads.get(key)
+            if load is None:
+                load = self._loads[key] = asyncio.create_task(self._load(key))
+                load.add_done_callback(lambda _: self._loads.pop(key, None))
+            await asyncio.shield(load)
+        # from here on nothing awaits, so concurrent pops take turns
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        chunk = entry.chunks.popleft()
+        entry.size -= _chunk_size(chunk)
+        self._size -= _chunk_size(chunk)
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(key)
+        store.save_pending_replies(*key, list(entry.chunks))
+        if not entry.chunks:
+            self._drop(key)
+            return chunk
+        return chunk + CONTINUE_HINT
+
+    async def _load(self, key: Key):
+        chunks = await store.load_pending_replies(*key, max_age=self.idle_seconds)
+        if chunks and key not in self._entries:  # a put() meanwhile is newer
+            self._insert(key, chunks)
+
+    def _insert(self, key: Key, chunks: List[str]) -> _Pending:
+        entry = _Pending(deque(chunks), sum(_chunk_size(c) for c in chunks))
+        self._entries[key] = entry
+        self._size += entry.size
+        self._expire()
+        # over budget: forget the least recently used threads (they stay on disk)
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+        return entry
+
+    def _drop(self, key: Key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_used <= self.idle_seconds:
+                break
+            self._drop(key)
+            store.save_pending_replies(*key, [])
+
+    def stats(self) -> dict:
+        return {"threads": len(self._entries), "bytes": self._size}
+
+
+continuation_store = ContinuationStore()
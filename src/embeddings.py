@@ -0,0 +1,109 @@
+# embeddings.py  –  text → unit vectors for src/retrieval.py (needs numpy)
+import abc
+import hashlib
+import re
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from src.constants import (
+    OPENAI_REPLY_TIMEOUT_SECONDS,
+    RETRIEVAL_EMBED_BATCH,
+    RETRIEVAL_EMBED_MODEL,
+)
+from src.metrics import OPENAI_TOKENS
+from src.openai_client import get_client
+from src.ratelimit import Priority, openai_scheduler
+from src.tokens import count_text_tokens, encoding_name
+
+WORD = re.compile(r"\w+")
+
+
+class Embedder(abc.ABC):
+    """Turns texts into an (n, d) float32 array of L2-normalized rows."""
+
+    name = "embedder"
+
+    @abc.abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """One row per text, in order."""
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+@lru_cache(maxsize=65_536)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local and deterministic: words and word pairs are hashed into
+    `dimensions` signed buckets.  Only as good as word overlap, but free,
+    instant and the same on every run, which is what tests and the replay
+    benchmark need.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        words = WORD.findall(text.casefold())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = _feature_hash(feature)
+                vectors[row, h % self.dimensions] += 1.0 if h >> 63 else -1.0
+        return normalize(vectors)
+
+
+class OpenAIEmbedder(Embedder):
+    """The embeddings endpoint, through the shared request scheduler."""
+
+    name = "openai"
+
+    def __init__(self, model: str = RETRIEVAL_EMBED_MODEL, batch: int = RETRIEVAL_EMBED_BATCH):
+        self.model = model
+        self.batch = batch
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        batches = [
+            await self._embed_batch(texts[i : i + self.batch])
+            for i in range(0, len(texts), self.batch)
+        ]
+        return normalize(np.concatenate(batches)) if batches else np.zeros((0, 0), np.float32)
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        texts = [text or " " for text in texts]  # the API rejects empty strings
+        encoding = encoding_name(self.model)
+        tokens = sum(count_text_tokens(encoding, text) for text in texts)
+        response = await openai_scheduler.run(
+            self.model,
+            tokens,
+            Priority.INTERACTIVE,  # a reply may be waiting on it
+            lambda: get_client().embeddings.create(
+                model=self.model, input=texts, timeout=OPENAI_REPLY_TIMEOUT_SECONDS
+            ),
+        )
+        # counted, but not through record_usage: embeddings have no prompt cache
+        OPENAI_TOKENS.inc(
+            response.usage.prompt_tokens, guild="none", model=self.model, kind="prompt"
+        )
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+def make_embedder(name: str) -> Embedder:
+    if name == HashingEmbedder.name:
+        return HashingEmbedder()
+    if name == OpenAIEmbedder.name:
+        return OpenAIEmbedder()
+    raise ValueError(f"Unknown RETRIEVAL_EMBEDDER {name!r}")
@@ -0,0 +1,253 @@
+# history.py  –  per-thread conversation cache fed by gateway events
+import asyncio
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import discord
+from discord import Message as DiscordMessage
+
+from src.base import Message, MessageLog
+from src.constants import (
+    HISTORY_CACHE_IDLE_SECONDS,
+    HISTORY_CACHE_MAX_BYTES,
+    HISTORY_CACHE_MAX_THREADS,
+    MAX_THREAD_MESSAGES,
+)
+from src.offload import offload
+from src.utils import discord_message_to_message, logger
+
+# Rough per-message bookkeeping cost on top of the text itself: the slotted
+# Message and its discord id, its slot in the MessageLog and its entry in the
+# id array (python -m benchmarks.memory)
+MESSAGE_OVERHEAD_BYTES = 100
+
+
+def _message_size(message: Message) -> int:
+    return MESSAGE_OVERHEAD_BYTES + len(message.user) + len(message.text or "")
+
+
+@dataclass
+class _ThreadHistory:
+    # messages oldest first, and their discord ids (ascending) in step
+    messages: MessageLog = field(default_factory=MessageLog)
+    ids: "array[int]" = field(default_factory=lambda: array("Q"))
+    size: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    def _index(self, message_id: int) -> Optional[int]:
+        i = bisect_left(self.ids, message_id)
+        return i if i < len(self.ids) and self.ids[i] == message_id else None
+
+    def get(self, message_id: int) -> Optional[Message]:
+        i = self._index(message_id)
+        return None if i is None else self.messages[i]
+
+    def put(self, message_id: int, message: Message):
+        if not self.ids or message_id > self.ids[-1]:
+            self.ids.append(message_id)
+            self.messages.append(message)
+        else:
+            i = bisect_left(self.ids, message_id)
+            if i < len(self.ids) and self.ids[i] == message_id:
+                self.size -= _message_size(self.messages[i])
+                self.messages.replace(i, message)
+            else:
+                self.ids.insert(i, message_id)
+                self.messages.insert(i, message)
+        self.size += _message_size(message)
+
+    def remove(self, message_id: int):
+        i = self._index(message_id)
+        if i is not None:
+            self.size -= _message_size(self.messages[i])
+            del self.ids[i]
+            self.messages.remove_at(i)
+
+    def trim(self, max_messages: int):
+        excess = len(self.ids) - max_messages
+        if excess > 0:
+            for _ in range(excess):
+                self.size -= _message_size(self.messages.popleft())
+            del self.ids[:excess]
+
+
+# ───────────────────────────────────────────────────────────────
+def _convert(fetched: List[DiscordMessage]) -> _ThreadHistory:
+    """History entry for messages fetched newest first."""
+    entry = _ThreadHistory()
+    for m in reversed(fetched):
+        converted = discord_message_to_message(m)
+        if converted:
+            entry.put(m.id, converted)
+    return entry
+
+
+class ThreadHistoryCache:
+    """
+    Keeps the converted history of recently active threads in memory so a
+    reply doesn't need to page through `thread.history()` every time.
+
+    A thread is fetched once on first touch (or after eviction / restart);
+    afterwards it is kept current from gateway events.  Threads are evicted
+    in LRU order when idle for too long or when the byte / thread caps are hit.
+    """
+
+    def __init__(
+        self,
+        max_threads: int = HISTORY_CACHE_MAX_THREADS,
+        max_bytes: int = HISTORY_CACHE_MAX_BYTES,
+        idle_seconds: float = HISTORY_CACHE_IDLE_SECONDS,
+        max_messages: int = MAX_THREAD_MESSAGES,
+    ):
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+
+        self._threads: "OrderedDict[int, _ThreadHistory]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # events seen while a cold fetch for the thread is in progress
+        self._pending: Dict[int, List[Tuple[str, int, object]]] = {}
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ── reads ──────────────────────────────────────────────────
+    async def get(self, thread: discord.Thread) -> Sequence[Message]:
+        """
+        Return the thread history oldest → newest, fetching it if needed.
+        The result is a zero-copy snapshot: later updates don't change it.
+        """
+        entry = self._touch(thread.id)
+        if entry is not None:
+            self.hits += 1
+            return entry.messages.view()
+
+        lock = self._locks.setdefault(thread.id, asyncio.Lock())
+        try:
+            async with lock:
+                entry = self._touch(thread.id)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.messages.view()
+                self.misses += 1
+                entry = await self._cold_fetch(thread)
+        finally:
+            # also when the fetch failed, so the next reply tries again
+            if self._locks.get(thread.id) is lock:
+                del self._locks[thread.id]
+        return entry.messages.view()
+
+    def message(self, thread_id: int, message_id: int) -> Optional[Message]:
+        """A single message, if its thread is in memory."""
+        entry = self._threads.get(thread_id)
+        return None if entry is None else entry.get(message_id)
+
+    async def _cold_fetch(self, thread: discord.Thread) -> _ThreadHistory:
+        start = time.perf_counter()
+        # events keep queueing until the entry is installed, conversion included
+        self._pending[thread.id] = []
+        try:
+            fetched = [m async for m in thread.history(limit=self.max_messages)]
+            entry = await offload(len(fetched), _convert, fetched)
+        except BaseException:
+            self._pending.pop(thread.id, None)
+            raise
+        for kind, message_id, message in self._pending.pop(thread.id):
+            self._apply(entry, kind, message_id, message)
+        entry.trim(self.max_messages)
+
+        self._threads[thread.id] = entry
+        self._size += entry.size
+        self._evict()
+        logger.info(
+            f"History cache miss – {len(entry.messages)} messages for thread "
+            f"{thread.id} in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        return entry
+
+    def _touch(self, thread_id: int) -> Optional[_ThreadHistory]:
+        self._evict()
+        entry = self._threads.get(thread_id)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._threads.move_to_end(thread_id)
+        return entry
+
+    # ── gateway updates ────────────────────────────────────────
+    def observe(self, message: DiscordMessage):
+        """Record a newly created message (user or bot) in its thread."""
+        converted = discord_message_to_message(message)
+        if converted:
+            self._update(message.channel.id, "put", message.id, converted)
+
+    def edit(self, thread_id: int, message_id: int, content: Optional[str]):
+        """Apply an edit; an edit that empties the message drops it."""
+        self._update(thread_id, "edit", message_id, content)
+
+    def delete(self, thread_id: int, message_id: int):
+        self._update(thread_id, "remove", message_id, None)
+
+    def forget(self, thread_id: int):
+        entry = self._threads.pop(thread_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _update(self, thread_id: int, kind: str, message_id: int, message):
+        if thread_id in self._pending:
+            self._pending[thread_id].append((kind, message_id, message))
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            return
+        before = entry.size
+        self._apply(entry, kind, message_id, message)
+        entry.trim(self.max_messages)
+        self._size += entry.size - before
+        self._evict()
+
+    @staticmethod
+    def _apply(entry: _ThreadHistory, kind: str, message_id: int, message):
+        if kind == "put":
+            entry.put(message_id, message)
+        elif kind == "remove":
+            entry.remove(message_id)
+        elif kind == "edit":
+            old = entry.get(message_id)
+            if old is not None and message:
+                entry.put(message_id, Message(old.user, message, message_id))
+            elif old is not None:
+                entry.remove(message_id)
+
+    # ── eviction ───────────────────────────────────────────────
+    def _evict(self):
+        now = time.monotonic()
+        while self._threads:
+            thread_id, entry = next(iter(self._threads.items()))
+            if (
+                now - entry.last_used > self.idle_seconds
+                or len(self._threads) > self.max_threads
+                or self._size > self.max_bytes
+            ):
+                self._threads.popitem(last=False)
+                self._size -= entry.size
+                self.evictions += 1
+            else:
+                break
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._threads),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+history_cache = ThreadHistoryCache()
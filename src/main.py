@@ -1,69 +1,194 @@
 # ───────────────────────────────────────────────────────────────
-#  src/main.py  —  SkippyAI (restart‑safe, no‑moderation)
+#  src/main.py  —  SkippyAI (restart‑safe, optional moderation)
 # ───────────────────────────────────────────────────────────────
 from collections import defaultdict
-from typing import Optional
+from typing import Optional, Sequence
 
 import asyncio
 import logging
+import time
 import discord
 from discord import Message as DiscordMessage, app_commands
 
-from src.base import Message, Conversation, ThreadConfig
+from src import startup
+from src.base import Message, ThreadConfig
 from src.constants import (
     BOT_INVITE_URL,
     DISCORD_BOT_TOKEN,
-    EXAMPLE_CONVOS,
     ACTIVATE_THREAD_PREFX,
     MAX_THREAD_MESSAGES,
-    SECONDS_DELAY_RECEIVING_MSG,
     AVAILABLE_MODELS,
     DEFAULT_MODEL,
+    STREAM_REPLIES,
+    MODERATION_ENABLED,
+    RETRIEVAL_ENABLED,
+    CONTINUATION_IDLE_SECONDS,
+    CLUSTER_ID,
+    SHARD_COUNT,
+    SHARD_IDS,
+    SYNC_COMMANDS,
 )
 from src.utils import (
+    discord_message_to_message,
     logger,
     should_block,
-    close_thread,
-    is_last_message_stale,
-    discord_message_to_message,
 )
-from src.completion import generate_completion_response, process_response, generate_title
+from src.completion import (
+    CompletionData,
+    CompletionResult,
+    generate_completion_response,
+    stream_completion_response,
+    process_response,
+    generate_title,
+    maybe_continue,
+)
+from src.config_watch import watch_config
+from src.continuation import CONTINUE_KEYWORD
+from src.history import history_cache
+from src.outbound import outbox
+from src.thread_scheduler import ReplyTicket, reply_scheduler
+from src.store import store
+from src.metrics import STAGE_SECONDS, start_metrics
+from src.openai_client import warm_up
+from src.persona import activate
+from src.watchdog import watchdog
 
 logging.basicConfig(
-    format="[%(asctime)s] [%(filename)s:%(lineno)d] %(message)s",
+    format=(
+        f"[%(asctime)s] [cluster {CLUSTER_ID}] [%(filename)s:%(lineno)d] %(message)s"
+        if CLUSTER_ID
+        else "[%(asctime)s] [%(filename)s:%(lineno)d] %(message)s"
+    ),
     level=logging.INFO,
 )
+startup.mark("imports")
 
 # ───────────────────────────────────────────────────────────────
 intents = discord.Intents.default()
 intents.message_content = True
 
-client = discord.Client(intents=intents)
+# Threads belong to guilds and guilds to shards, so each cluster process only
+# ever sees (and keeps state for) the threads of its own shards.
+client = discord.AutoShardedClient(
+    intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS
+)
 tree = discord.app_commands.CommandTree(client)
 thread_data: dict[int, ThreadConfig] = defaultdict()
+background_tasks: set[asyncio.Task] = set()  # keep fire‑and‑forget tasks alive
+
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# ───────────────────────────────────────────────────────────────
+@client.event
+async def setup_hook():
+    await store.start()
+    await store.purge_pending_replies(CONTINUATION_IDLE_SECONDS)
+    await start_metrics()
+    watchdog.start()
+    spawn(watch_config())
+    startup.mark("setup_hook")
+
+
+async def get_thread_config(thread_id: int) -> ThreadConfig:
+    """Thread settings from memory, else the store, else the defaults."""
+    if thread_id not in thread_data:
+        stored = await store.load_thread_config(thread_id)
+        thread_data[thread_id] = stored or ThreadConfig(
+            model=DEFAULT_MODEL, max_tokens=512, temperature=1.0
+        )
+    return thread_data[thread_id]
 
 # ───────────────────────────────────────────────────────────────
 @client.event
 async def on_ready():
-    logger.info(f"Logged in as {client.user}. Invite URL: {BOT_INVITE_URL}")
-
-    # propagate bot name & examples to completion.py
-    from src import completion
-    completion.MY_BOT_NAME = client.user.name
-    completion.MY_BOT_EXAMPLE_CONVOS = [
-        Conversation(
-            messages=[
-                Message(
-                    user=(client.user.name if m.user == "Lenard" else m.user),
-                    text=m.text,
-                )
-                for m in convo.messages
-            ]
+    logger.info(
+        f"Logged in as {client.user} (shards {client.shard_ids} of "
+        f"{client.shard_count}). Invite URL: {BOT_INVITE_URL}"
+    )
+
+    # render the system prompt for our actual name once (keeps a reloaded config)
+    activate(client.user.name)
+    if startup.mark("ready"):
+        logger.info(f"Startup – {startup.summary()} after process start")
+
+    spawn(warm_up())
+    if SYNC_COMMANDS:
+        await tree.sync()
+
+# ───────────────────────────────────────────────────────────────
+async def complete_in_thread(
+    thread: discord.Thread,
+    messages: Sequence[Message],
+    thread_config: ThreadConfig,
+    ticket: ReplyTicket,
+    gate: Optional[asyncio.Task] = None,
+):
+    if STREAM_REPLIES:
+        return await stream_completion_response(
+            thread, messages, thread_config, ticket, gate
+        )
+    data = await generate_completion_response(
+        messages, thread_config, ticket, thread.guild.id, thread.id
+    )
+    if gate is not None and not await asyncio.shield(gate):
+        return CompletionData(CompletionResult.BLOCKED, None, None)
+    return data
+
+
+async def reply_in_thread(
+    thread: discord.Thread,
+    ticket: ReplyTicket,
+    messages: Optional[Sequence[Message]] = None,
+    started: Optional[float] = None,
+    gate: Optional[asyncio.Task] = None,
+):
+    """
+    Reply job run by reply_scheduler; cancelled when a newer message arrives.
+    `gate` is the moderation verdict, which runs concurrently with the request.
+    """
+    if messages is None:
+        with STAGE_SECONDS.time(stage="history_fetch"):
+            messages = await history_cache.get(thread)
+    async with thread.typing():
+        data = await complete_in_thread(
+            thread, messages, thread_data[thread.id], ticket, gate
         )
-        for convo in EXAMPLE_CONVOS
-    ]
+    await process_response(thread, data)
+    if started is not None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"/chat → first reply in {elapsed_ms:.0f} ms ({thread.jump_url})")
+
+
+async def rename_when_titled(
+    thread: discord.Thread,
+    title_task: asyncio.Task,
+    gate: Optional[asyncio.Future] = None,
+):
+    """Swap the placeholder thread name for the generated title."""
+    try:
+        title = await title_task
+        if gate is not None and not await asyncio.shield(gate):
+            return  # blocked by moderation, which deleted the thread
+    except Exception as exc:
+        logger.exception(exc)
+        return
+    name = f"{ACTIVATE_THREAD_PREFX} {title}"
+    # closed threads get renamed to INACTIVATE_THREAD_PREFIX; leave those alone
+    if title and thread.name != name and thread.name.startswith(ACTIVATE_THREAD_PREFX):
+        try:
+            await outbox.edit_thread(thread, name=name)
+        except discord.NotFound:
+            pass  # deleted meanwhile
+
 
-    await tree.sync()
+def placeholder_title(message: str) -> str:
+    flat = " ".join(message.split())
+    return flat[:39] + "…" if len(flat) > 40 else flat
 
 # ───────────────────────────────────────────────────────────────
 # /chat  slash command
@@ -95,9 +220,18 @@ async def chat_command(  # noqa: N802
             )
             return
 
+        started = time.perf_counter()
         user = int.user
         logger.info(f"/chat by {user} – {message[:60]}")
 
+        # Title generation and moderation run alongside everything below
+        title_task = spawn(generate_title(message, int.guild.id))
+        verdict = None
+        if MODERATION_ENABLED:
+            from src import moderation  # loaded on first use, only when enabled
+
+            verdict = spawn(moderation.moderate_message(message, user.name))
+
         # Send an immediate embed (Discord 3s rule)
         embed = (
             discord.Embed(
@@ -112,10 +246,11 @@ async def chat_command(  # noqa: N802
         await int.response.send_message(embed=embed)
         response_msg = await int.original_response()
 
-        # Generate a catchy thread title with GPT‑mini
-        title = await generate_title(message)  
-
-        # Create the thread
+        # Create the thread now; it gets renamed once the title arrives
+        if title_task.done() and not title_task.exception():
+            title = title_task.result()  # cached title
+        else:
+            title = placeholder_title(message)
         thread = await response_msg.create_thread(
             name=f"{ACTIVATE_THREAD_PREFX} {title}",
             slowmode_delay=0,
@@ -123,14 +258,23 @@ async def chat_command(  # noqa: N802
             reason="SkippyAI chat",
         )
         thread_data[thread.id] = ThreadConfig(model, max_tokens, temperature)
+        store.save_thread_config(thread.id, thread_data[thread.id])
 
         # First reply from Skippy
-        async with thread.typing():
-            data = await generate_completion_response(
-                [Message(user=user.name, text=message)],
-                thread_data[thread.id],
-            )
-            await process_response(thread, data)
+        gate = (
+            spawn(moderation.moderate_chat_command(int, thread, message, verdict))
+            if verdict
+            else None
+        )
+        first_message = [Message(user=user.name, text=message)]
+        reply_scheduler.submit(
+            thread.id,
+            lambda ticket: reply_in_thread(
+                thread, ticket, first_message, started, gate
+            ),
+            debounce=False,  # nothing to wait for in a new thread
+        )
+        spawn(rename_when_titled(thread, title_task, gate))
 
     except Exception as exc:  # noqa: BLE001
         logger.exception(exc)
@@ -143,6 +287,10 @@ async def chat_command(  # noqa: N802
 @client.event
 async def on_message(msg: DiscordMessage):
     try:
+        if isinstance(msg.channel, discord.Thread):
+            history_cache.observe(msg)
+            if RETRIEVAL_ENABLED and msg.channel.owner_id == client.user.id:
+                index_message(msg)
         if msg.author == client.user or not isinstance(msg.channel, discord.Thread):
             return
 
@@ -157,42 +305,111 @@ async def on_message(msg: DiscordMessage):
         if should_block(msg.guild):
             return
         if thread.message_count > MAX_THREAD_MESSAGES:
-            await close_thread(thread)
+            await outbox.close_thread(thread)
             return
 
-        # Re‑attach default config if bot restarted
-        if thread.id not in thread_data:
-            thread_data[thread.id] = ThreadConfig(
-                model=DEFAULT_MODEL, max_tokens=512, temperature=1.0
-            )
-
-        # Optional batching delay
-        if SECONDS_DELAY_RECEIVING_MSG:
-            await asyncio.sleep(SECONDS_DELAY_RECEIVING_MSG)
-            if is_last_message_stale(msg, thread.last_message, client.user.id):
-                return
+        # Re‑attach the stored (or default) config after a restart
+        await get_thread_config(thread.id)
 
         logger.info(
             f"Thread msg – {msg.author}: {msg.content[:60]} ({thread.jump_url})"
         )
 
-        history = [
-            discord_message_to_message(m)
-            async for m in thread.history(limit=MAX_THREAD_MESSAGES)
-        ]
-        history = [m for m in history if m]
-        history.reverse()
+        # "continue" drains the pending chunks of a long reply, no completion needed
+        if msg.content.strip().lower() == CONTINUE_KEYWORD:
+            if await maybe_continue(thread):
+                return
 
-        async with thread.typing():
-            data = await generate_completion_response(
-                history, thread_data[thread.id]
-            )
-        if is_last_message_stale(msg, thread.last_message, client.user.id):
-            return
-        await process_response(thread, data)
+        # Moderation runs concurrently with the completion and gates the reply
+        gate = None
+        if MODERATION_ENABLED:
+            from src import moderation
+
+            gate = spawn(moderation.moderate_thread_message(msg))
+
+        # Debounces bursts and cancels any reply still in flight for this thread
+        reply_scheduler.submit(
+            thread.id, lambda ticket: reply_in_thread(thread, ticket, gate=gate)
+        )
 
     except Exception as exc:
         logger.exception(exc)
 
 # ───────────────────────────────────────────────────────────────
-client.run(DISCORD_BOT_TOKEN)
+# Keep the history cache in sync with edits / deletes
+# ───────────────────────────────────────────────────────────────
+def index_message(msg: DiscordMessage):
+    """Embed a new thread message for retrieval, before a reply needs it."""
+    from src.retrieval import thread_index  # needs numpy, loaded only when enabled
+
+    converted = discord_message_to_message(msg)
+    if converted:
+        thread_index.observe(msg.channel.id, converted)
+
+
+def reindex_message(thread_id: int, message_id: int, content: Optional[str] = None):
+    """
+    Swap an edited message's retrieval vector, or drop a deleted one's.
+    Called before the history cache applies the change, for the author.
+    """
+    old = history_cache.message(thread_id, message_id)
+    if old is None:
+        return
+    from src.retrieval import thread_index
+
+    new = Message(old.user, content, message_id) if content else None
+    thread_index.replace(thread_id, message_id, new)
+
+
+@client.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    if "content" not in payload.data:
+        return
+    if RETRIEVAL_ENABLED:
+        reindex_message(payload.channel_id, payload.message_id, payload.data["content"])
+    history_cache.edit(payload.channel_id, payload.message_id, payload.data["content"])
+    if MODERATION_ENABLED:
+        try:
+            await moderate_edit(payload)
+        except Exception as exc:
+            logger.exception(exc)
+
+
+async def moderate_edit(payload: discord.RawMessageUpdateEvent):
+    """An edited user message in one of our threads is moderated again."""
+    author = payload.data.get("author") or {}
+    thread = client.get_channel(payload.channel_id)
+    if (
+        author.get("bot")
+        or str(author.get("id")) == str(client.user.id)
+        or not isinstance(thread, discord.Thread)
+        or thread.owner_id != client.user.id
+    ):
+        return
+    from src import moderation
+
+    try:
+        msg = await thread.fetch_message(payload.message_id)
+    except discord.HTTPException:
+        return  # deleted meanwhile
+    await moderation.moderate_thread_message(msg)
+
+
+@client.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if RETRIEVAL_ENABLED:
+        reindex_message(payload.channel_id, payload.message_id)
+    history_cache.delete(payload.channel_id, payload.message_id)
+
+
+@client.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    for message_id in payload.message_ids:
+        if RETRIEVAL_ENABLED:
+            reindex_message(payload.channel_id, message_id)
+        history_cache.delete(payload.channel_id, message_id)
+
+# ───────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    client.run(DISCORD_BOT_TOKEN)
+    store.flush_sync()
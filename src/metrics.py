@@ -0,0 +1,279 @@
+# metrics.py  –  in-process counters / gauges / histograms, Prometheus text endpoint
+import abc
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.constants import METRICS_HOST, METRICS_LOOP_LAG_INTERVAL_SECONDS, METRICS_PORT
+from src.utils import logger
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = [*zip(self.labelnames, key), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Exposition lines for every labelled value."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[LabelKey, float]:
+        """Current totals, by label values in `labelnames` order."""
+        return dict(self._values)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """A settable value, or with `fn` one that is read at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        fn: Optional[Callable[[], float]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.fn is not None:
+            yield f"{self.name} {_format_value(self.fn())}"
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{self._labels(key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        # observed from offload worker threads too (src/offload.py)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the `with` block (also across awaits)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [
+                (key, list(counts), total[0]) for key, (counts, total) in self._values.items()
+            ]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                yield f"{self.name}_bucket{self._labels(key, le)} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_format_value(total)}"
+            yield f"{self.name}_count{self._labels(key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} registered twice")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# ───────────────────────────────────────────────────────────────
+# What we measure
+# ───────────────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "skippy_stage_seconds",
+    "Time spent per reply stage: history_fetch, retrieval, prompt_render, "
+    "openai_queue, model (streamed: until the last token), thread_send and "
+    "thread_edit.",
+    ("stage",),
+)
+OPENAI_TOKENS = Counter(
+    "skippy_openai_tokens_total",
+    "Tokens reported in OpenAI usage, by guild, model and kind (prompt/completion, "
+    "and cached: the part of prompt served from OpenAI's prompt cache).",
+    ("guild", "model", "kind"),
+)
+LOOP_LAG = Gauge(
+    "skippy_event_loop_lag_seconds",
+    "How late the most recent event-loop lag probe woke up.",
+)
+LOOP_LAG_HISTOGRAM = Histogram(
+    "skippy_event_loop_lag_histogram_seconds",
+    "Distribution of event-loop lag probe delays.",
+    buckets=LAG_BUCKETS,
+)
+
+
+def record_usage(usage, guild_id: Optional[int], model: str):
+    """Count prompt / completion / cached tokens from an OpenAI `usage` object or dict."""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            # newer than this SDK's model, so it arrives as an extra field
+            "prompt_tokens_details": getattr(usage, "prompt_tokens_details", None),
+        }
+    details = usage.get("prompt_tokens_details") or {}
+    if not isinstance(details, dict):
+        details = {"cached_tokens": getattr(details, "cached_tokens", 0)}
+    tokens = {
+        "prompt": usage.get("prompt_tokens") or 0,
+        "completion": usage.get("completion_tokens") or 0,
+        "cached": details.get("cached_tokens") or 0,
+    }
+    guild = str(guild_id) if guild_id else "none"
+    for kind, count in tokens.items():
+        OPENAI_TOKENS.inc(count, guild=guild, model=model, kind=kind)
+    if tokens["prompt"]:
+        logger.info(
+            f"Prompt cache – {tokens['cached']}/{tokens['prompt']} prompt tokens "
+            f"cached ({model})"
+        )
+
+
+# ───────────────────────────────────────────────────────────────
+# Event-loop lag probe and HTTP endpoint
+# ───────────────────────────────────────────────────────────────
+async def _probe_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+            pass  # headers are irrelevant
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_tasks: set = set()
+
+
+async def start_metrics(
+    host: str = METRICS_HOST,
+    port: int = METRICS_PORT,
+    lag_interval: float = METRICS_LOOP_LAG_INTERVAL_SECONDS,
+):
+    """Serve /metrics and start the loop-lag probe; a no-op unless a port is set."""
+    if not port:
+        return
+    server = await asyncio.start_server(_serve, host, port)
+    _tasks.add(asyncio.create_task(server.serve_forever()))
+    _tasks.add(asyncio.create_task(_probe_loop_lag(lag_interval)))
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
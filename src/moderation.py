@@ -1,41 +1,229 @@
-from openai._compat import model_dump
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from discord import Message as DiscordMessage
 
 from src.constants import (
     SERVER_TO_MODERATION_CHANNEL,
     MODERATION_VALUES_FOR_BLOCKED,
     MODERATION_VALUES_FOR_FLAGGED,
+    MODERATION_BATCH_WINDOW_SECONDS,
+    MODERATION_BATCH_MAX,
+    MODERATION_CACHE_SIZE,
+    OPENAI_MODERATION_TIMEOUT_SECONDS,
 )
-from openai import OpenAI
-
-client = OpenAI()
-from typing import Optional, Tuple
-import discord
+from src.openai_client import get_client
+from src.outbound import outbox
 from src.utils import logger
 
+_client = None
 
-def moderate_message(
-    message: str, user: str
-) -> Tuple[str, str]:  # [flagged_str, blocked_str]
-    moderation_response = client.moderations.create(
-        input=message, model="text-moderation-latest"
-    )
-    category_scores = moderation_response.results[0].category_scores or {}
 
-    category_score_items = model_dump(category_scores)
+def _moderation_client():
+    # Same transport as completions; moderation isn't scheduled, so the SDK retries
+    global _client
+    if _client is None:
+        _client = get_client().with_options(
+            max_retries=2, timeout=OPENAI_MODERATION_TIMEOUT_SECONDS
+        )
+    return _client
+
+ModerationResult = Tuple[str, str]  # [flagged_str, blocked_str]
 
+
+def classify_scores(category_score_items: Dict[str, float]) -> ModerationResult:
     blocked_str = ""
     flagged_str = ""
     for category, score in category_score_items.items():
         if score > MODERATION_VALUES_FOR_BLOCKED.get(category, 1.0):
             blocked_str += f"({category}: {score})"
-            logger.info(f"blocked {user} {category} {score}")
             break
         if score > MODERATION_VALUES_FOR_FLAGGED.get(category, 1.0):
             flagged_str += f"({category}: {score})"
-            logger.info(f"flagged {user} {category} {score}")
     return (flagged_str, blocked_str)
 
 
+# ───────────────────────────────────────────────────────────────
+class ModerationBatcher:
+    """
+    Groups texts submitted within `window` seconds into a single moderation
+    call with a list input.  Results are cached by content hash, so edits
+    back to a known text and repeated messages cost nothing.
+    """
+
+    def __init__(
+        self,
+        window: float = MODERATION_BATCH_WINDOW_SECONDS,
+        max_batch: int = MODERATION_BATCH_MAX,
+        cache_size: int = MODERATION_CACHE_SIZE,
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, ModerationResult]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._batch: List[Tuple[str, str]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+        self.calls = 0
+        self.cache_hits = 0
+
+    async def check(self, text: str) -> ModerationResult:
+        key = hashlib.sha256(text.encode()).hexdigest()
+        if key in self._cache:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            self._batch.append((key, text))
+            if len(self._batch) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(
+                    self.window, self._flush
+                )
+        # one caller giving up must not fail the others sharing the result
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, str]]):
+        self.calls += 1
+        try:
+            response = await _moderation_client().moderations.create(
+                input=[text for _, text in batch], model="text-moderation-latest"
+            )
+            from openai._compat import model_dump  # loaded along with the client
+
+            if len(response.results) != len(batch):
+                # can't tell which verdict is whose: everyone fails open
+                raise ValueError(
+                    f"{len(response.results)} moderation results for {len(batch)} inputs"
+                )
+            for (key, _), result in zip(batch, response.results):
+                verdict = classify_scores(model_dump(result.category_scores))
+                self._cache[key] = verdict
+                self._in_flight.pop(key).set_result(verdict)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        except Exception as e:
+            for key, _ in batch:
+                future = self._in_flight.pop(key, None)
+                if future and not future.done():
+                    future.set_exception(e)
+
+
+moderation_batcher = ModerationBatcher()
+
+
+async def moderate_message(message: str, user: str) -> ModerationResult:
+    """Moderate one text; fails open (nothing flagged) if the API errors."""
+    if not message:
+        return ("", "")
+    try:
+        flagged_str, blocked_str = await moderation_batcher.check(message)
+    except Exception as e:
+        logger.exception(e)
+        return ("", "")
+    if blocked_str:
+        logger.info(f"blocked {user} {blocked_str}")
+    elif flagged_str:
+        logger.info(f"flagged {user} {flagged_str}")
+    return (flagged_str, blocked_str)
+
+
+# ───────────────────────────────────────────────────────────────
+async def moderate_thread_message(message: DiscordMessage) -> bool:
+    """
+    Moderate a user message in a bot thread and act on the verdict.
+    Returns False if the message was blocked, so its reply must be dropped.
+    """
+    flagged_str, blocked_str = await moderate_message(
+        message.content, message.author.name
+    )
+    if blocked_str:
+        try:
+            await outbox.delete(message)
+        except discord.HTTPException:
+            pass
+        await outbox.send(
+            message.channel,
+            embed=discord.Embed(
+                description=f"❌ **{message.author}'s message has been deleted by moderation.**",
+                color=discord.Color.red(),
+            )
+        )
+        await send_moderation_blocked_message(
+            guild=message.guild,
+            user=str(message.author),
+            blocked_str=blocked_str,
+            message=message.content,
+        )
+        return False
+    if flagged_str:
+        await send_moderation_flagged_message(
+            guild=message.guild,
+            user=str(message.author),
+            flagged_str=flagged_str,
+            message=message.content,
+            url=message.jump_url,
+        )
+    return True
+
+
+async def moderate_chat_command(
+    interaction: discord.Interaction,
+    thread: discord.Thread,
+    message: str,
+    verdict: "asyncio.Task[ModerationResult]",
+) -> bool:
+    """
+    Act on the moderation verdict for a /chat prompt, which was checked while
+    the thread was being set up.  A blocked prompt takes its thread with it.
+    """
+    flagged_str, blocked_str = await verdict
+    if blocked_str:
+        await outbox.delete_thread(thread)
+        await interaction.delete_original_response()
+        await interaction.followup.send(
+            f"❌ **{interaction.user}'s request has been blocked by moderation.**",
+            ephemeral=True,
+        )
+        await send_moderation_blocked_message(
+            guild=interaction.guild,
+            user=str(interaction.user),
+            blocked_str=blocked_str,
+            message=message,
+        )
+        return False
+    if flagged_str:
+        await send_moderation_flagged_message(
+            guild=interaction.guild,
+            user=str(interaction.user),
+            flagged_str=flagged_str,
+            message=message,
+            url=thread.jump_url,
+        )
+    return True
+
+
 async def fetch_moderation_channel(
     guild: Optional[discord.Guild],
 ) -> Optional[discord.abc.GuildChannel]:
@@ -59,8 +247,8 @@ async def send_moderation_flagged_message(
         moderation_channel = await fetch_moderation_channel(guild=guild)
         if moderation_channel:
             message = message[:100] if message else None
-            await moderation_channel.send(
-                f"⚠️ {user} - {flagged_str} - {message} - {url}"
+            await outbox.send(
+                moderation_channel, f"⚠️ {user} - {flagged_str} - {message} - {url}"
             )
 
 
@@ -74,4 +262,4 @@ async def send_moderation_blocked_message(
         moderation_channel = await fetch_moderation_channel(guild=guild)
         if moderation_channel:
             message = message[:500] if message else None
-            await moderation_channel.send(f"❌ {user} - {blocked_str} - {message}")
\ No newline at end of file
+            await outbox.send(moderation_channel, f"❌ {user} - {blocked_str} - {message}")
@@ -0,0 +1,42 @@
+# offload.py  –  run CPU-heavy reply work on a worker pool, off the event loop
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from src.constants import OFFLOAD_MIN_MESSAGES, OFFLOAD_WORKERS
+from src.metrics import Counter
+
+T = TypeVar("T")
+
+OFFLOADED = Counter(
+    "skippy_offloaded_calls_total",
+    "CPU-heavy calls run on the worker pool instead of the event loop, by function.",
+    ("fn",),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(OFFLOAD_WORKERS, thread_name_prefix="skippy-cpu")
+    return _executor
+
+
+async def offload(size: int, fn: Callable[..., T], *args) -> T:
+    """
+    `fn(*args)`, on the worker pool when `size` (messages involved) reaches
+    OFFLOAD_MIN_MESSAGES, else right here.  Threads rather than processes,
+    so this doesn't free up CPU: only tiktoken's encoding releases the GIL,
+    and the pure-Python rendering holds it.  What it buys is latency – the
+    interpreter switches threads every few milliseconds, so instead of one
+    long stall the loop keeps serving heartbeats and other threads' replies
+    while a big prompt is built.
+    """
+    if size < OFFLOAD_MIN_MESSAGES:
+        return fn(*args)
+    OFFLOADED.inc(fn=fn.__name__)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(), functools.partial(fn, *args))
@@ -0,0 +1,173 @@
+# openai_client.py  –  the one OpenAI client / HTTP transport, warm-up and hedging
+import asyncio
+import importlib.util
+from collections import deque
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from src.constants import (
+    OPENAI_BASE_URL,
+    OPENAI_CONNECT_TIMEOUT_SECONDS,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    OPENAI_HEDGE_PERCENTILE,
+    OPENAI_HTTP2,
+    OPENAI_KEEPALIVE_SECONDS,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE,
+    OPENAI_REPLY_TIMEOUT_SECONDS,
+    OPENAI_WARM_CONNECTIONS,
+)
+from src.metrics import Counter
+from src.utils import logger
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+HEDGED = Counter(
+    "skippy_openai_hedged_total",
+    "Thread-reply completions that got a hedge request, by which one answered.",
+    ("model", "winner"),
+)
+
+
+def _http2_available() -> bool:
+    if OPENAI_HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2=1 needs the h2 package (pip install httpx[http2])")
+        return False
+    return OPENAI_HTTP2
+
+
+_client: Optional["AsyncOpenAI"] = None
+_ssl_context = None
+
+
+def _load_ssl_context():
+    """httpx's default verifying context; loading the CA bundle blocks for a while."""
+    global _ssl_context
+    if _ssl_context is None:
+        import httpx
+
+        _ssl_context = httpx.create_ssl_context(http2=_http2_available())
+    return _ssl_context
+
+
+def get_client() -> "AsyncOpenAI":
+    """
+    The shared client, created on first use: importing the SDK (and httpx)
+    takes about half a second, which shouldn't delay connecting to Discord.
+    """
+    global _client
+    if _client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            verify=_load_ssl_context(),
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                OPENAI_REPLY_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS
+            ),
+        )
+        # Retries are owned by openai_scheduler, not the SDK
+        _client = AsyncOpenAI(
+            base_url=OPENAI_BASE_URL, max_retries=0, http_client=http_client
+        )
+    return _client
+
+
+def _import_sdk():
+    import httpx  # noqa: F401
+    import openai  # noqa: F401
+
+    _load_ssl_context()
+
+
+async def warm_up(connections: int = OPENAI_WARM_CONNECTIONS):
+    """Open (TLS handshake included) a few pooled connections before traffic arrives."""
+    # import the SDK in a worker thread so the event loop keeps serving events
+    await asyncio.to_thread(_import_sdk)
+    client = get_client()
+    results = await asyncio.gather(
+        *(client.models.list() for _ in range(connections)), return_exceptions=True
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logger.warning(f"OpenAI warm-up: {len(failed)}/{connections} failed – {failed[0]!r}")
+    else:
+        logger.info(f"OpenAI warm-up: {connections} connection(s) ready")
+
+
+# ───────────────────────────────────────────────────────────────
+class LatencyTracker:
+    """Recent completion latencies per model, for picking the hedge delay."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float):
+        if model not in self._samples:
+            self._samples[model] = deque(maxlen=self.window)
+        self._samples[model].append(seconds)
+
+    def percentile(self, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+reply_latency = LatencyTracker()
+
+
+def hedge_delay(model: str) -> Optional[float]:
+    """Seconds after which a reply gets a duplicate request, or None (no hedging)."""
+    if not OPENAI_HEDGE_PERCENTILE:
+        return None
+    return reply_latency.percentile(
+        model, OPENAI_HEDGE_PERCENTILE, min_samples=OPENAI_HEDGE_MIN_SAMPLES
+    )
+
+
+async def hedged(
+    model: str,
+    call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    allowed: Callable[[], bool] = lambda: True,
+) -> T:
+    """
+    Run `call`; if it hasn't finished after `delay` seconds (and `allowed()`
+    still says so), start a second one and return whichever succeeds first.
+    The loser is cancelled.  Fails only if every started call fails.
+    """
+    primary = asyncio.ensure_future(call())
+    if delay is None:
+        return await primary
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not allowed():
+            return await primary
+
+        tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGED.inc(model=model, winner="primary" if task is primary else "hedge")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
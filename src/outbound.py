@@ -0,0 +1,236 @@
+# outbound.py  –  one paced, coalescing queue per channel for what we send to Discord
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Optional, Set, Tuple
+
+import discord
+from discord import Message as DiscordMessage
+
+from src.constants import (
+    DISCORD_CHANNEL_LIMIT,
+    DISCORD_GLOBAL_LIMIT,
+    DISCORD_OUTBOX_MAX_CHANNELS,
+    DISCORD_RENAME_LIMIT,
+    INACTIVATE_THREAD_PREFIX,
+)
+from src.metrics import Counter, Gauge
+from src.ratelimit import TokenBucket
+
+REQUESTS = Counter(
+    "skippy_discord_requests_total",
+    "Discord REST calls made through the outbox, by op (send, edit, delete, edit_thread).",
+    ("op",),
+)
+COALESCED = Counter(
+    "skippy_discord_coalesced_total",
+    "Outbox ops merged into an already queued one instead of making a call, by op.",
+    ("op",),
+)
+
+
+def _bucket(limit: Tuple[float, float]) -> TokenBucket:
+    count, seconds = limit
+    return TokenBucket(count * 60.0 / seconds, capacity=count)
+
+
+@dataclass
+class _Op:
+    kind: str  # "send", "edit", "delete" or "edit_thread"
+    target: object  # the channel, or the message (or thread) for edit / delete
+    kwargs: dict
+    future: asyncio.Future
+
+
+class DiscordOutbox:
+    """
+    Everything the bot sends, edits or deletes in a channel goes through
+    that channel's queue, in order, one call at a time.  Calls are paced to
+    Discord's buckets (global, messages per channel, renames per thread)
+    before they are made, so discord.py's own rate-limit sleeps – which
+    hold up whatever else is waiting – rarely trigger.
+
+    Ready channels take turns, one call each, so a chatty thread can't
+    starve the others.  An edit queued right after an edit of the same
+    message is merged into it, as is a thread edit right after another one.
+    """
+
+    def __init__(
+        self,
+        global_limit: Tuple[float, float] = DISCORD_GLOBAL_LIMIT,
+        channel_limit: Tuple[float, float] = DISCORD_CHANNEL_LIMIT,
+        rename_limit: Tuple[float, float] = DISCORD_RENAME_LIMIT,
+        max_channels: int = DISCORD_OUTBOX_MAX_CHANNELS,
+    ):
+        self.channel_limit = channel_limit
+        self.rename_limit = rename_limit
+        self.max_channels = max_channels
+
+        self._global = _bucket(global_limit)
+        self._channels: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._renames: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # channels with queued ops, in turn order
+        self._queues: "OrderedDict[int, Deque[_Op]]" = OrderedDict()
+        self._busy: Set[int] = set()
+        self._calls: Set[asyncio.Task] = set()
+        self._closing: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    # ── ops ────────────────────────────────────────────────────
+    async def send(self, channel, content: Optional[str] = None, **kwargs) -> DiscordMessage:
+        return await self._submit(channel.id, "send", channel, dict(kwargs, content=content))
+
+    async def edit(self, message: DiscordMessage, **kwargs) -> Optional[DiscordMessage]:
+        return await self._submit(message.channel.id, "edit", message, kwargs)
+
+    async def delete(self, message: DiscordMessage):
+        await self._submit(message.channel.id, "delete", message, {})
+
+    async def delete_thread(self, thread: discord.Thread):
+        await self._submit(thread.id, "delete", thread, {})
+
+    async def edit_thread(self, thread: discord.Thread, **kwargs):
+        return await self._submit(thread.id, "edit_thread", thread, kwargs)
+
+    async def close_thread(self, thread: discord.Thread):
+        """Announce, rename, archive and lock: two calls, once per thread."""
+        if thread.id in self._closing:
+            return
+        self._closing.add(thread.id)
+        try:
+            await self.send(
+                thread,
+                embed=discord.Embed(
+                    description="**Thread closed** - Context limit reached, closing...",
+                    color=discord.Color.blue(),
+                ),
+            )
+            await self.edit_thread(
+                thread, name=INACTIVATE_THREAD_PREFIX, archived=True, locked=True
+            )
+        finally:
+            self._closing.discard(thread.id)
+
+    def _submit(self, channel_id: int, kind: str, target, kwargs: dict) -> asyncio.Future:
+        queue = self._queues.get(channel_id)
+        if queue:
+            # only into the op queued last, so nothing moves past a later op
+            last = queue[-1]
+            mergeable = last.kind == kind and (
+                kind == "edit_thread" or (kind == "edit" and last.target.id == target.id)
+            )
+            if mergeable and not last.future.done():
+                last.kwargs.update(kwargs)
+                COALESCED.inc(op=kind)
+                return asyncio.shield(last.future)
+
+        op = _Op(kind, target, kwargs, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(channel_id, deque()).append(op)
+        self._wake()
+        return op.future
+
+    # ── scheduling ─────────────────────────────────────────────
+    def _wake(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch()
+            if not self._queues and not self._busy:
+                self._worker = None
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> Optional[float]:
+        """Start one op per ready channel; seconds until the next one may start."""
+        soonest: Optional[float] = None
+        for channel_id in list(self._queues):
+            if channel_id in self._busy:
+                continue
+            queue = self._queues[channel_id]
+            while queue and queue[0].future.cancelled():
+                queue.popleft()  # its caller gave up before it was sent
+            if not queue:
+                del self._queues[channel_id]
+                continue
+
+            op = queue[0]
+            buckets = [self._global, self._limit(self._channels, channel_id, self.channel_limit)]
+            if op.kind == "edit_thread" and "name" in op.kwargs:
+                buckets.append(self._limit(self._renames, channel_id, self.rename_limit))
+            wait = max(bucket.wait_time(1) for bucket in buckets)
+            if wait > 0:
+                soonest = wait if soonest is None else min(soonest, wait)
+                continue
+            for bucket in buckets:
+                bucket.consume(1)
+
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(channel_id)  # back of the line
+            else:
+                del self._queues[channel_id]
+            self._busy.add(channel_id)
+            call = asyncio.create_task(self._execute(channel_id, op))
+            self._calls.add(call)
+            call.add_done_callback(self._calls.discard)
+        return soonest
+
+    def _limit(
+        self, buckets: "OrderedDict[int, TokenBucket]", channel_id: int, limit
+    ) -> TokenBucket:
+        bucket = buckets.get(channel_id)
+        if bucket is None:
+            bucket = buckets[channel_id] = _bucket(limit)
+            while len(buckets) > self.max_channels:
+                buckets.popitem(last=False)
+        buckets.move_to_end(channel_id)
+        return bucket
+
+    async def _execute(self, channel_id: int, op: _Op):
+        REQUESTS.inc(op=op.kind)
+        try:
+            if op.kind == "send":
+                result = await op.target.send(**op.kwargs)
+            elif op.kind == "delete":
+                result = await op.target.delete()
+            else:  # edit, edit_thread
+                result = await op.target.edit(**op.kwargs)
+        except Exception as e:  # noqa: BLE001 – handed to whoever awaits the op
+            if not op.future.done():
+                op.future.set_exception(e)
+        else:
+            if not op.future.done():
+                op.future.set_result(result)
+        finally:
+            self._busy.discard(channel_id)
+            self._wake()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue_depth,
+            "requests": {key[0]: count for key, count in REQUESTS.values().items()},
+            "coalesced": {key[0]: count for key, count in COALESCED.values().items()},
+        }
+
+
+outbox = DiscordOutbox()
+
+Gauge(
+    "skippy_discord_outbox_depth",
+    "Discord calls queued in the outbox.",
+    fn=lambda: outbox.queue_depth,
+)
@@ -0,0 +1,83 @@
+# persona.py  –  the static prompt prefix (instructions + examples), rendered once
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from src.base import Config, Conversation, Message, Prompt
+from src.constants import CONFIG, CONFIG_VERSION
+
+# Author of the bot's lines in the example conversations; shown as the bot's own name
+EXAMPLE_BOT_NAME = "Lenard"
+
+
+@dataclass(frozen=True)
+class Persona:
+    """
+    Everything in the system message, for one bot name and config version.
+    `system_prompt` is rendered once and shared by every request, so the
+    start of every payload is byte-identical across threads and OpenAI's
+    automatic prompt caching can reuse it.
+    """
+
+    bot_name: str
+    version: str
+    instructions: str
+    header: Message
+    examples: Tuple[Conversation, ...]
+    system_prompt: str
+
+
+def build_persona(bot_name: str, config: Config, version: str) -> Persona:
+    header = Message("system", f"Instructions for {bot_name}: {config.instructions}")
+    examples = tuple(
+        Conversation(
+            tuple(
+                Message(bot_name if m.user == EXAMPLE_BOT_NAME else m.user, m.text)
+                for m in convo.messages
+            )
+        )
+        for convo in config.example_conversations
+    )
+    system_prompt = Prompt(header, list(examples), Conversation(())).render_system_prompt()
+    return Persona(bot_name, version, config.instructions, header, examples, system_prompt)
+
+
+_personas: Dict[Tuple[str, str], Persona] = {}
+
+
+def persona_for(bot_name: str, config: Config = CONFIG, version: str = CONFIG_VERSION) -> Persona:
+    key = (bot_name, version)
+    if key not in _personas:
+        _personas[key] = build_persona(bot_name, config, version)
+    return _personas[key]
+
+
+_config: Tuple[Config, str] = (CONFIG, CONFIG_VERSION)
+_active = persona_for(CONFIG.name)
+
+
+def active_persona() -> Persona:
+    """The persona new requests use; a request keeps the one it started with."""
+    return _active
+
+
+def active_version() -> str:
+    return _config[1]
+
+
+def activate(
+    bot_name: Optional[str] = None,
+    config: Optional[Config] = None,
+    version: Optional[str] = None,
+) -> Persona:
+    """
+    Switch new requests to another bot name and/or config; whatever isn't
+    given stays as it is.  Only the config in use is kept cached – requests
+    already running hold on to their own Persona.
+    """
+    global _active, _config
+    if config is not None:
+        _config = (config, version)
+    _active = persona_for(bot_name or _active.bot_name, *_config)
+    for key in [key for key in _personas if key[1] != _config[1]]:
+        del _personas[key]
+    return _active
@@ -0,0 +1,327 @@
+# ratelimit.py  –  shared admission control in front of the OpenAI client
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from src.constants import (
+    DEFAULT_MODEL_RATE_LIMIT,
+    MODEL_RATE_LIMITS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_MAX_RETRIES,
+)
+from src.metrics import Gauge, STAGE_SECONDS
+from src.utils import logger
+
+T = TypeVar("T")
+
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 20.0
+SLOW_ADMISSION_SECONDS = 1.0
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # thread replies
+    BACKGROUND = 1  # titles and other housekeeping
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per
+    second, holding at most `capacity` (default: a minute's worth).
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.capacity = float(per_minute if capacity is None else capacity)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Give back (or, negative, take) tokens once the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    model: str = field(compare=False)
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued: float = field(compare=False, default_factory=time.monotonic)
+
+
+def is_server_error(e: Exception) -> bool:
+    """A 5xx, or no answer at all (connection error / timeout)."""
+    import openai  # loaded by now: the failed call came from the SDK
+
+    if isinstance(e, openai.APIConnectionError):
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+def _is_retryable(e: Exception) -> bool:
+    import openai
+
+    return isinstance(e, openai.RateLimitError) or is_server_error(e)
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        if "retry-after-ms" in response.headers:
+            return float(response.headers["retry-after-ms"]) / 1000
+        if "retry-after" in response.headers:
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+# ───────────────────────────────────────────────────────────────
+class _HeldStream:
+    """
+    A streamed response that keeps its request's concurrency slot until it
+    is read to the end, fails, or is dropped unread.
+    """
+
+    def __init__(self, scheduler: "OpenAIRequestScheduler", stream, model: str, tokens: int):
+        self._scheduler = scheduler
+        self._stream = stream.__aiter__()
+        self._model = model
+        self._tokens = tokens
+        self._held = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = await self._stream.__anext__()
+        except BaseException:
+            self._done()
+            raise
+        # with stream_options.include_usage the last chunk carries the usage
+        self._scheduler._settle(self._model, self._tokens, getattr(chunk, "usage", None))
+        return chunk
+
+    def _done(self):
+        if self._held:
+            self._held = False
+            self._scheduler._release()
+
+    def __del__(self):
+        try:
+            self._done()
+        except RuntimeError:
+            pass  # collected after the event loop closed
+
+
+class OpenAIRequestScheduler:
+    """
+    Every OpenAI call goes through `run`.  Requests wait in a priority queue
+    until their model's request-per-minute and token-per-minute buckets and
+    the global concurrency limit admit them; 429 / 5xx / connection errors
+    are retried with jittered exponential backoff that honours Retry-After.
+
+    A request is charged its estimated tokens up front; once the response
+    reports its usage the token bucket is corrected to the real total.  A
+    streamed response holds its concurrency slot until it has been read.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[int, int]] = MODEL_RATE_LIMITS,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        max_retries: int = OPENAI_MAX_RETRIES,
+    ):
+        self.limits = limits
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._waiting: List[_Waiter] = []
+        self._seq = 0
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.waits: deque = deque(maxlen=1000)  # recent admission waits (s)
+        self.retries = 0
+        self.admitted = 0
+
+    async def run(
+        self,
+        model: str,
+        tokens: int,
+        priority: Priority,
+        call: Callable[[], Awaitable[T]],
+        retry_server_errors: bool = True,
+    ) -> T:
+        """
+        With `retry_server_errors` off, 5xx / connection errors are raised
+        at once (the caller has a fallback); 429s are still retried.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(model, tokens, priority)
+            held = False
+            try:
+                result = await call()
+                if hasattr(result, "__aiter__"):
+                    held = True  # released by the stream
+                    return _HeldStream(self, result, model, tokens)
+                self._settle(model, tokens, getattr(result, "usage", None))
+                return result
+            except Exception as e:
+                if (
+                    not _is_retryable(e)
+                    or attempt >= self.max_retries
+                    or (not retry_server_errors and is_server_error(e))
+                ):
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = random.uniform(
+                    0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempt)
+                )
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                logger.info(
+                    f"OpenAI {model} {type(e).__name__} – retry {attempt}/"
+                    f"{self.max_retries} in {delay:.1f}s"
+                )
+            finally:
+                if not held:
+                    self._release()
+            await asyncio.sleep(delay)
+
+    def _settle(self, model: str, tokens: int, usage):
+        total = getattr(usage, "total_tokens", None)
+        if total is not None:
+            self._bucket_pair(model)[1].adjust(tokens - total)
+
+    # ── admission ──────────────────────────────────────────────
+    def _bucket_pair(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        if model not in self._buckets:
+            rpm, tpm = self.limits.get(model, DEFAULT_MODEL_RATE_LIMIT)
+            self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self._buckets[model]
+
+    async def _acquire(self, model: str, tokens: int, priority: Priority):
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        waiter = _Waiter(priority, self._seq, model, tokens, future)
+        self._waiting.append(waiter)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # admitted just before we were cancelled
+            raise
+
+        waited = time.monotonic() - waiter.enqueued
+        self.waits.append(waited)
+        STAGE_SECONDS.observe(waited, stage="openai_queue")
+        if waited > SLOW_ADMISSION_SECONDS:
+            logger.info(
+                f"OpenAI {model} request waited {waited:.1f}s "
+                f"(queue depth {self.queue_depth}, in flight {self._in_flight})"
+            )
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        blocked = set()
+        delay: Optional[float] = None
+        remaining = []
+        for waiter in sorted(self._waiting):
+            if waiter.future.done():
+                continue  # caller gave up
+            if self._in_flight >= self.max_concurrency or waiter.model in blocked:
+                remaining.append(waiter)
+                continue
+            rpm, tpm = self._bucket_pair(waiter.model)
+            wait = max(rpm.wait_time(1), tpm.wait_time(waiter.tokens))
+            if wait > 0:
+                # keep lower priority work of the same model behind this one
+                blocked.add(waiter.model)
+                delay = wait if delay is None else min(delay, wait)
+                remaining.append(waiter)
+                continue
+            rpm.consume(1)
+            tpm.consume(waiter.tokens)
+            self._in_flight += 1
+            self.admitted += 1
+            waiter.future.set_result(None)
+        self._waiting = remaining
+
+        if delay is not None:
+            loop = asyncio.get_running_loop()
+            # one timer, for whichever blocked waiter can go first
+            if self._timer is not None and loop.time() + delay < self._timer.when():
+                self._timer.cancel()
+                self._timer = None
+            if self._timer is None:
+                self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    # ── reporting ──────────────────────────────────────────────
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._waiting if not w.future.done())
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self._in_flight,
+            "admitted": self.admitted,
+            "retries": self.retries,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+openai_scheduler = OpenAIRequestScheduler()
+
+Gauge(
+    "skippy_openai_in_flight",
+    "OpenAI requests currently admitted.",
+    fn=lambda: openai_scheduler._in_flight,
+)
+Gauge(
+    "skippy_openai_queue_depth",
+    "OpenAI requests waiting for admission.",
+    fn=lambda: openai_scheduler.queue_depth,
+)
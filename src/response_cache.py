@@ -0,0 +1,132 @@
+# response_cache.py  –  exact-match cache of thread replies (opt-in)
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import List, Optional
+
+from src.base import ThreadConfig
+from src.constants import (
+    RESPONSE_CACHE_DISK_BYTES,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_TEMPERATURE,
+    RESPONSE_CACHE_TRIM_EVERY,
+)
+from src.metrics import Counter
+from src.store import store
+from src.utils import logger
+
+LOOKUPS = Counter(
+    "skippy_response_cache_lookups_total",
+    "Response cache lookups, by result (memory / disk / miss).",
+    ("result",),
+)
+
+
+class ResponseCache:
+    """
+    Replies keyed by the payload sent to OpenAI: the rendered messages,
+    speakers' names included (a reply may address them), plus model,
+    temperature and max_tokens.  Only requests at or below `max_temperature`
+    are cached – above that a repeat is expected to differ.  Callers only
+    store replies from the model the key was made for.
+
+    The in-memory tier is an LRU of `max_entries` replies.  With `disk_bytes`
+    set, replies are also kept in the SQLite store and trimmed to that many
+    bytes, least recently used first, so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        max_temperature: float = RESPONSE_CACHE_MAX_TEMPERATURE,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        disk_bytes: int = RESPONSE_CACHE_DISK_BYTES,
+    ):
+        self.enabled = enabled
+        self.max_temperature = max_temperature
+        self.max_entries = max_entries
+        self.disk_bytes = disk_bytes
+
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._disk_writes = 0
+        self._tasks: set = set()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key_for(self, rendered: List[dict], thread_config: ThreadConfig) -> Optional[str]:
+        """The cache key for this request, or None when it isn't cacheable."""
+        if not self.enabled or thread_config.temperature > self.max_temperature:
+            return None
+        payload = json.dumps(
+            [
+                rendered,
+                thread_config.model,
+                thread_config.temperature,
+                thread_config.max_tokens,
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        reply = self._entries.get(key)
+        if reply is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            self._record("memory")
+            return reply
+        if self.disk_bytes:
+            reply = await store.load_cached_reply(key)
+            if reply is not None:
+                self._remember(key, reply)
+                store.save_cached_reply(key, reply)  # refresh its LRU position
+                self.disk_hits += 1
+                self._record("disk")
+                return reply
+        self.misses += 1
+        self._record("miss")
+        return None
+
+    def put(self, key: str, reply: str):
+        self._remember(key, reply)
+        if not self.disk_bytes:
+            return
+        store.save_cached_reply(key, reply)
+        self._disk_writes += 1
+        if self._disk_writes % RESPONSE_CACHE_TRIM_EVERY == 0:
+            task = asyncio.create_task(store.trim_cached_replies(self.disk_bytes))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _remember(self, key: str, reply: str):
+        self._entries[key] = reply
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _record(self, result: str):
+        LOOKUPS.inc(result=result)
+        if result != "miss":
+            stats = self.stats()
+            logger.info(
+                f"Response cache hit ({result}) – hit rate {stats['hit_rate']:.0%} "
+                f"of {stats['lookups']} lookups"
+            )
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,251 @@
+# retrieval.py  –  per-thread vector index: bring back older messages that matter now
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.base import Message
+from src.constants import (
+    RETRIEVAL_EMBEDDER,
+    RETRIEVAL_MAX_THREADS,
+    RETRIEVAL_MIN_SCORE,
+    RETRIEVAL_TAIL_TOKENS,
+    RETRIEVAL_TOP_K,
+)
+from src.embeddings import Embedder, make_embedder
+from src.metrics import STAGE_SECONDS
+from src.summaries import is_summary
+from src.tokens import message_tokens
+from src.utils import logger
+
+INITIAL_ROWS = 64
+
+
+class _ThreadIndex:
+    """Unit vectors of a thread's messages, one row per Discord message id."""
+
+    __slots__ = (
+        "vectors", "count", "rows", "stale", "pending", "embedding", "queries", "last_query_ms"
+    )
+
+    def __init__(self):
+        self.vectors: Optional[np.ndarray] = None  # (capacity, d) float32
+        self.count = 0
+        self.rows: Dict[int, int] = {}  # message id → row
+        self.stale = 0  # rows of edited / deleted messages
+        self.pending: Dict[int, Message] = {}  # waiting to be embedded
+        self.embedding: Dict[int, Message] = {}  # being embedded right now
+        self.queries = 0
+        self.last_query_ms = 0.0
+
+    def add(self, messages: List[Message], vectors: np.ndarray):
+        needed = self.count + len(messages)
+        if self.vectors is None:
+            self.vectors = np.empty((max(INITIAL_ROWS, needed), vectors.shape[1]), np.float32)
+        elif needed > len(self.vectors):
+            grown = np.empty((max(2 * len(self.vectors), needed), self.vectors.shape[1]), np.float32)
+            grown[: self.count] = self.vectors[: self.count]
+            self.vectors = grown
+        self.vectors[self.count : needed] = vectors
+        for row, message in enumerate(messages, self.count):
+            if message.id in self.rows:
+                self.stale += 1  # embedded twice (by a reply and in the background)
+            self.rows[message.id] = row
+        self.count = needed
+
+    def remove(self, message_id: int):
+        self.pending.pop(message_id, None)
+        self.embedding.pop(message_id, None)  # its vector is dropped when it arrives
+        if self.rows.pop(message_id, None) is None:
+            return
+        self.stale += 1
+        if self.stale * 2 > self.count:  # mostly dead rows: compact
+            live = sorted(self.rows.items(), key=lambda item: item[1])
+            rows = np.fromiter((row for _, row in live), np.intp, len(live))
+            self.vectors = self.vectors[rows]
+            self.rows = {message_id: row for row, (message_id, _) in enumerate(live)}
+            self.count, self.stale = len(live), 0
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.vectors is None else self.vectors.nbytes
+
+
+class ThreadIndex:
+    """
+    Each thread's messages are embedded once, into one contiguous array per
+    thread, in the background: new messages as they arrive (`observe`,
+    while the reply is still being debounced), edits and deletes as they
+    happen (`replace`), and the rest of a thread's history after the first
+    reply that finds it unindexed.  A reply only waits for its own latest
+    message, embedding it right away if it isn't indexed yet.
+
+    A reply keeps the newest `tail_tokens` of the conversation as is; from
+    the messages before that, the `top_k` whose vectors are most similar
+    (cosine, at least `min_score`) to the latest message's are added back,
+    in their original order.  A thread summary (see src/summaries.py), and
+    anything else that isn't a Discord message, is always kept.  While most older messages are still unindexed, the reply
+    sends the whole history instead.
+
+    Indexes of `max_threads` threads are kept, least recently used dropped
+    first; a dropped thread is simply re-embedded when it's next replied in.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        tail_tokens: int = RETRIEVAL_TAIL_TOKENS,
+        top_k: int = RETRIEVAL_TOP_K,
+        min_score: float = RETRIEVAL_MIN_SCORE,
+        max_threads: int = RETRIEVAL_MAX_THREADS,
+    ):
+        self.embedder = embedder or make_embedder(RETRIEVAL_EMBEDDER)
+        self.tail_tokens = tail_tokens
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_threads = max_threads
+
+        self._threads: "OrderedDict[int, _ThreadIndex]" = OrderedDict()
+        self._jobs: Dict[int, asyncio.Task] = {}
+
+    def _entry(self, thread_id: int) -> _ThreadIndex:
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            entry = self._threads[thread_id] = _ThreadIndex()
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return entry
+
+    # ── background indexing ────────────────────────────────────
+    def observe(self, thread_id: int, message: Message):
+        """Embed a new message of the thread ahead of the reply that needs it."""
+        self._queue(thread_id, self._entry(thread_id), [message])
+
+    def replace(self, thread_id: int, message_id: int, new: Optional[Message]):
+        """An edit (`new`) or delete (no `new`) of a message already seen."""
+        entry = self._threads.get(thread_id)
+        if entry is None:
+            return
+        entry.remove(message_id)
+        if new is not None:
+            self._queue(thread_id, entry, [new])
+
+    def _queue(self, thread_id: int, entry: _ThreadIndex, messages: Sequence[Message]):
+        for m in messages:
+            if m.id not in entry.rows and m.id not in entry.embedding:
+                entry.pending[m.id] = m
+        task = self._jobs.get(thread_id)
+        if entry.pending and (task is None or task.done()):
+            task = asyncio.create_task(self._embed_pending(thread_id, entry))
+            task.add_done_callback(lambda _: self._job_done(thread_id, task))
+            self._jobs[thread_id] = task
+
+    def _job_done(self, thread_id: int, task: asyncio.Task):
+        if self._jobs.get(thread_id) is task:
+            del self._jobs[thread_id]
+
+    async def _embed_pending(self, thread_id: int, entry: _ThreadIndex):
+        while entry.pending:
+            entry.embedding, entry.pending = entry.pending, {}
+            batch = list(entry.embedding.values())
+            try:
+                vectors = await self.embedder.embed([m.text or "" for m in batch])
+            except Exception as e:  # noqa: BLE001 – retried when a reply needs them
+                logger.warning(f"Retrieval – embedding failed for thread {thread_id}: {e!r}")
+                return
+            finally:
+                current, entry.embedding = entry.embedding, {}
+            # edited or deleted while in flight: that text's vector is stale
+            keep = [i for i, m in enumerate(batch) if current.get(m.id) is m]
+            entry.add([batch[i] for i in keep], vectors[keep])
+
+    async def _embed_now(self, entry: _ThreadIndex, message: Message) -> bool:
+        entry.pending.pop(message.id, None)
+        try:
+            entry.add([message], await self.embedder.embed([message.text or ""]))
+        except Exception as e:  # noqa: BLE001 – the reply goes ahead without retrieval
+            logger.warning(f"Retrieval – embedding the latest message failed: {e!r}")
+            return False
+        return True
+
+    # ── replies ────────────────────────────────────────────────
+
+    async def select(
+        self, thread_id: int, messages: Sequence[Message], model: str
+    ) -> Sequence[Message]:
+        """The recent tail of `messages`, plus the older messages relevant to it."""
+        if not messages:
+            return messages
+        # the latest message is always in the tail
+        tail_start, tokens = len(messages) - 1, message_tokens(messages[-1], model)
+        while tail_start > 0:
+            tokens += message_tokens(messages[tail_start - 1], model)
+            if tokens > self.tail_tokens:
+                break
+            tail_start -= 1
+        head = messages[:tail_start]
+        positions = [i for i, m in enumerate(head) if m.id is not None and not is_summary(m)]
+        query = messages[-1]
+        if not positions or query.id is None:
+            return messages
+        older = [head[i] for i in positions]
+
+        entry = self._entry(thread_id)
+        # usually embedded on arrival already; if not, only this one is waited for
+        if query.id not in entry.rows and not await self._embed_now(entry, query):
+            return messages
+        missing = [m for m in older if m.id not in entry.rows]
+        if missing:
+            self._queue(thread_id, entry, missing)
+            if len(missing) * 2 > len(older):
+                logger.info(
+                    f"Retrieval – indexing {len(missing)} messages of thread {thread_id} "
+                    "in the background; this reply gets the whole history"
+                )
+                return messages
+            # the few not indexed yet can't be picked this time
+            positions = [i for i in positions if head[i].id in entry.rows]
+            older = [head[i] for i in positions]
+
+        with STAGE_SECONDS.time(stage="retrieval"):
+            start = time.perf_counter()
+            rows = np.fromiter((entry.rows[m.id] for m in older), np.intp, len(older))
+            scores = entry.vectors[rows] @ entry.vectors[entry.rows[query.id]]
+            k = min(self.top_k, len(older))
+            best = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, np.intp)
+            picked = best[scores[best] >= self.min_score].tolist()
+            entry.queries += 1
+            entry.last_query_ms = (time.perf_counter() - start) * 1000
+
+        keep = {positions[j] for j in picked}
+        result = [
+            m for i, m in enumerate(head) if i in keep or m.id is None or is_summary(m)
+        ]
+        result.extend(messages[tail_start:])
+        logger.info(
+            f"Retrieval – thread {thread_id}: {len(picked)}/{len(older)} older messages "
+            f"in {entry.last_query_ms:.2f} ms, index {entry.count} rows / "
+            f"{entry.nbytes / 1024:.0f} KiB"
+        )
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._threads),
+            "bytes": sum(entry.nbytes for entry in self._threads.values()),
+            "per_thread": {
+                thread_id: {
+                    "rows": entry.count,
+                    "bytes": entry.nbytes,
+                    "queries": entry.queries,
+                    "last_query_ms": round(entry.last_query_ms, 3),
+                }
+                for thread_id, entry in self._threads.items()
+            },
+        }
+
+
+thread_index = ThreadIndex()
@@ -0,0 +1,187 @@
+# router.py  –  pick the model for a thread reply, and fall back when it's slow or down
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from src.base import Message, ThreadConfig
+from src.constants import (
+    ALLOWED_MODELS,
+    MODEL_ROUTING,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    ROUTER_DEADLINE_SECONDS,
+    ROUTER_FALLBACKS,
+    ROUTER_FAST_MODELS,
+    ROUTER_MIN_DEADLINE_SECONDS,
+    ROUTER_SHORT_PROMPT_TOKENS,
+    ROUTER_SIMPLE_TURN_CHARS,
+)
+from src.metrics import Counter
+from src.openai_client import LatencyTracker, reply_latency
+from src.ratelimit import is_server_error
+from src.tokens import rendered_prompt_tokens
+from src.utils import logger
+
+T = TypeVar("T")
+
+# a reply may take this many times its model's recent p95 before falling back
+DEADLINE_P95_FACTOR = 2.0
+
+ROUTED = Counter(
+    "skippy_router_replies_total",
+    "Routed thread replies by the thread's model, the model that answered and "
+    "the route (direct, fast, fallback_deadline, fallback_error).",
+    ("requested", "answered", "route"),
+)
+
+
+@dataclass(frozen=True)
+class Route:
+    primary: ThreadConfig
+    route: str  # "direct" or "fast"
+    fallback: Optional[ThreadConfig] = None
+    deadline: Optional[float] = None  # seconds before the fallback starts
+
+
+class ModelRouter:
+    """
+    Sends short, simple turns (little conversation, a plain latest message)
+    to whichever of `fast_models` currently answers fastest, if that beats
+    the thread's own model; longer contexts stay on the thread's model.
+    Every route gets a fallback model and a deadline derived from the
+    primary's recent latency: a reply that misses it, or fails with a 5xx,
+    is raced against / retried on the fallback.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = MODEL_ROUTING,
+        fast_models: Sequence[str] = ROUTER_FAST_MODELS,
+        fallbacks: dict = ROUTER_FALLBACKS,
+        short_prompt_tokens: int = ROUTER_SHORT_PROMPT_TOKENS,
+        simple_turn_chars: int = ROUTER_SIMPLE_TURN_CHARS,
+        max_deadline: float = ROUTER_DEADLINE_SECONDS,
+        latency: LatencyTracker = reply_latency,
+    ):
+        self.enabled = enabled
+        self.fast_models = list(fast_models)
+        self.fallbacks = fallbacks
+        self.short_prompt_tokens = short_prompt_tokens
+        self.simple_turn_chars = simple_turn_chars
+        self.max_deadline = max_deadline
+        self.latency = latency
+
+    def _median(self, model: str) -> Optional[float]:
+        return self.latency.percentile(model, 0.5, min_samples=OPENAI_HEDGE_MIN_SAMPLES)
+
+    def deadline(self, model: str) -> float:
+        p95 = self.latency.percentile(model, 0.95, min_samples=OPENAI_HEDGE_MIN_SAMPLES)
+        if p95 is None:
+            return self.max_deadline
+        return min(
+            self.max_deadline, max(ROUTER_MIN_DEADLINE_SECONDS, DEADLINE_P95_FACTOR * p95)
+        )
+
+    def _is_simple(self, messages: Sequence[Message], conversation_tokens: int) -> bool:
+        if conversation_tokens > self.short_prompt_tokens or not messages:
+            return False
+        latest = messages[-1].text or ""
+        return len(latest) <= self.simple_turn_chars and "```" not in latest
+
+    def _fastest(self, thread_model: str) -> Optional[str]:
+        """The fast model to use instead of `thread_model`, if any is faster now."""
+        candidates: List[Tuple[float, int, str]] = []
+        for rank, model in enumerate(self.fast_models):
+            if model == thread_model:
+                return None  # already on a fast model
+            # unmeasured models count as instant, so each gets tried
+            candidates.append((self._median(model) or 0.0, rank, model))
+        if not candidates:
+            return None
+        median, _, model = min(candidates)
+        own = self._median(thread_model)
+        if own is not None and median >= own:
+            return None  # the provider is slow on the fast models right now
+        return model
+
+    def plan(
+        self,
+        messages: Sequence[Message],
+        thread_config: ThreadConfig,
+        rendered: List[dict],
+    ) -> Route:
+        """Route a reply whose payload for the thread's model is `rendered`."""
+        if not self.enabled:
+            return Route(thread_config, "direct")
+        primary, route = thread_config, "direct"
+        # everything after the system prompt, which is the same for all threads
+        conversation_tokens = rendered_prompt_tokens(rendered[1:], thread_config.model)
+        if self._is_simple(messages, conversation_tokens):
+            fast = self._fastest(thread_config.model)
+            if fast is not None:
+                primary, route = _with_model(thread_config, fast), "fast"
+        fallback_model = (
+            thread_config.model if route == "fast" else self.fallbacks.get(primary.model)
+        )
+        fallback = (
+            _with_model(thread_config, fallback_model)
+            if fallback_model in ALLOWED_MODELS and fallback_model != primary.model
+            else None
+        )
+        return Route(primary, route, fallback, self.deadline(primary.model))
+
+    def record(self, requested: str, answered: str, route: str):
+        """Count (and log, unless it's the thread's own model) who answered."""
+        ROUTED.inc(requested=requested, answered=answered, route=route)
+        if answered != requested:
+            logger.info(f"Routed reply – {answered} answered for {requested} ({route})")
+
+
+def _with_model(config: ThreadConfig, model: str) -> ThreadConfig:
+    return ThreadConfig(model, config.max_tokens, config.temperature)
+
+
+async def run_with_fallback(
+    primary: Callable[[], Awaitable[T]],
+    fallback: Optional[Callable[[], Awaitable[T]]],
+    deadline: Optional[float],
+) -> Tuple[T, str]:
+    """
+    Run `primary`.  If it fails with a server error, run `fallback`; if it
+    is still going after `deadline` seconds, start `fallback` next to it and
+    take whichever succeeds first (the other is cancelled).  Returns the
+    result and "primary", "fallback_error" or "fallback_deadline".
+    """
+    first = asyncio.ensure_future(primary())
+    if fallback is None:
+        return await first, "primary"
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=deadline)
+        if done:
+            error = first.exception()
+            if error is None:
+                return first.result(), "primary"
+            if not is_server_error(error):
+                raise error
+            reason = "fallback_error"
+        else:
+            reason = "fallback_deadline"
+
+        second = asyncio.ensure_future(fallback())
+        tasks.append(second)
+        pending = {t for t in tasks if not t.done()}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), ("primary" if task is first else reason)
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+model_router = ModelRouter()
@@ -0,0 +1,95 @@
+# startup.py  –  where the time from process start to on_ready goes
+#
+#     python -m src.startup            # import-time breakdown of src.main
+#     python -m src.startup --top 30
+#
+# At runtime main.py marks its stages (imports done, setup_hook done, ready)
+# and logs them once, measured from when the process was started.
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+_imported_at = time.perf_counter()
+_marks: Dict[str, float] = {}
+
+
+def _process_started_ago() -> Optional[float]:
+    """Seconds since this process was created (Linux), or None if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            # field 22, counted after the parenthesised command name
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# perf_counter value at process start; falls back to when this module loaded
+_started = _imported_at - (_process_started_ago() or 0.0)
+
+
+def mark(stage: str) -> bool:
+    """Record `stage` as reached now; False if it was already recorded."""
+    if stage in _marks:
+        return False
+    _marks[stage] = time.perf_counter() - _started
+    return True
+
+
+def summary() -> str:
+    return ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in _marks.items())
+
+
+# ───────────────────────────────────────────────────────────────
+# Import-time breakdown
+# ───────────────────────────────────────────────────────────────
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) per import, from `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def _group(name: str) -> str:
+    # our own modules one by one, everything else by top-level package
+    return name if name.startswith("src.") else name.split(".")[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time breakdown of the bot")
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total = next(cumulative for name, _, cumulative in rows if name == args.module)
+    groups: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        groups[_group(name)] += self_us
+
+    print(f"import {args.module}: {total / 1000:.0f} ms")
+    for name, us in sorted(groups.items(), key=lambda g: -g[1])[: args.top]:
+        print(f"  {name:<28} {us / 1000:>7.1f} ms  {us / total:>4.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
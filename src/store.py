@@ -0,0 +1,250 @@
+# store.py  –  durable thread state in SQLite (WAL) with batched async writes
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.base import ThreadConfig, ThreadSummary
+from src.constants import STORE_FLUSH_SECONDS, STORE_PATH
+from src.utils import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_configs (
+    thread_id   INTEGER PRIMARY KEY,
+    model       TEXT    NOT NULL,
+    max_tokens  INTEGER NOT NULL,
+    temperature REAL    NOT NULL,
+    updated_at  REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_replies (
+    guild_id   INTEGER NOT NULL,
+    thread_id  INTEGER NOT NULL,
+    chunks     TEXT    NOT NULL,
+    updated_at REAL    NOT NULL,
+    PRIMARY KEY (guild_id, thread_id)
+);
+CREATE TABLE IF NOT EXISTS thread_summaries (
+    thread_id  INTEGER PRIMARY KEY,
+    summary    TEXT    NOT NULL,
+    last_id    INTEGER NOT NULL,
+    updated_at REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS response_cache (
+    key     TEXT    PRIMARY KEY,
+    reply   TEXT    NOT NULL,
+    size    INTEGER NOT NULL,
+    used_at REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS response_cache_used_at ON response_cache (used_at);
+"""
+
+# (table, key) -> value; None deletes the row
+_WriteKey = Tuple[str, tuple]
+
+
+class Store:
+    """
+    Persists ThreadConfig, thread summaries, pending "continue" chunks and
+    the on-disk tier of the response cache across restarts.
+
+    Rows are read lazily the first time a thread is touched, so startup cost
+    doesn't depend on how many threads exist.  Writes are queued in memory,
+    coalesced per key and flushed in one transaction every
+    `flush_seconds` on a worker thread, so the event loop never waits on fsync.
+    """
+
+    def __init__(self, path: str = STORE_PATH, flush_seconds: float = STORE_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._dirty: Dict[_WriteKey, object] = {}
+        self._flushing: Dict[_WriteKey, object] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    # ── lifecycle ──────────────────────────────────────────────
+    async def start(self):
+        await asyncio.to_thread(self._connect)
+        self._wakeup = asyncio.Event()
+        if self._dirty:
+            self._wakeup.set()  # queued before there was a loop to signal
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(SCHEMA)
+                self._conn = conn
+            return self._conn
+
+    def flush_sync(self):
+        """Write out anything still queued; used once the event loop is gone."""
+        if self._dirty:
+            batch, self._dirty = self._dirty, {}
+            self._write_batch(batch)
+
+    # ── thread configs ─────────────────────────────────────────
+    async def load_thread_config(self, thread_id: int) -> Optional[ThreadConfig]:
+        key = ("thread_configs", (thread_id,))
+        if key in self._dirty or key in self._flushing:
+            return self._dirty.get(key, self._flushing.get(key))
+        row = await asyncio.to_thread(
+            self._fetchone,
+            "SELECT model, max_tokens, temperature FROM thread_configs "
+            "WHERE thread_id = ?",
+            (thread_id,),
+        )
+        return ThreadConfig(*row) if row else None
+
+    def save_thread_config(self, thread_id: int, config: ThreadConfig):
+        self._queue(("thread_configs", (thread_id,)), config)
+
+    # ── thread summaries ───────────────────────────────────────
+    async def load_thread_summary(self, thread_id: int) -> Optional[ThreadSummary]:
+        key = ("thread_summaries", (thread_id,))
+        if key in self._dirty or key in self._flushing:
+            return self._dirty.get(key, self._flushing.get(key))
+        row = await asyncio.to_thread(
+            self._fetchone,
+            "SELECT summary, last_id FROM thread_summaries WHERE thread_id = ?",
+            (thread_id,),
+        )
+        return ThreadSummary(*row) if row else None
+
+    def save_thread_summary(self, thread_id: int, summary: ThreadSummary):
+        self._queue(("thread_summaries", (thread_id,)), summary)
+
+    # ── pending continuation chunks ────────────────────────────
+    async def load_pending_replies(
+        self, guild_id: int, thread_id: int, max_age: Optional[float] = None
+    ) -> List[str]:
+        key = ("pending_replies", (guild_id, thread_id))
+        if key in self._dirty or key in self._flushing:
+            return list(self._dirty.get(key, self._flushing.get(key)) or [])
+        row = await asyncio.to_thread(
+            self._fetchone,
+            "SELECT chunks, updated_at FROM pending_replies "
+            "WHERE guild_id = ? AND thread_id = ?",
+            (guild_id, thread_id),
+        )
+        if not row:
+            return []
+        if max_age is not None and time.time() - row[1] > max_age:
+            self.save_pending_replies(guild_id, thread_id, [])
+            return []
+        return json.loads(row[0])
+
+    async def purge_pending_replies(self, max_age: float):
+        """Drop continuation chunks nobody asked for within `max_age` seconds."""
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM pending_replies WHERE updated_at < ?",
+            (time.time() - max_age,),
+        )
+
+    def save_pending_replies(self, guild_id: int, thread_id: int, chunks: List[str]):
+        self._queue(("pending_replies", (guild_id, thread_id)), list(chunks) or None)
+
+    # ── cached completion replies ──────────────────────────────
+    async def load_cached_reply(self, key: str) -> Optional[str]:
+        write_key = ("response_cache", (key,))
+        if write_key in self._dirty or write_key in self._flushing:
+            return self._dirty.get(write_key, self._flushing.get(write_key))
+        row = await asyncio.to_thread(
+            self._fetchone, "SELECT reply FROM response_cache WHERE key = ?", (key,)
+        )
+        return row[0] if row else None
+
+    def save_cached_reply(self, key: str, reply: str):
+        """Insert or refresh a reply; rewriting it marks it recently used."""
+        self._queue(("response_cache", (key,)), reply)
+
+    async def trim_cached_replies(self, max_bytes: int):
+        """Drop the least recently used replies beyond `max_bytes` of text."""
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM response_cache WHERE key IN ("
+            "  SELECT key FROM ("
+            "    SELECT key, SUM(size) OVER (ORDER BY used_at DESC) AS kept"
+            "    FROM response_cache"
+            "  ) WHERE kept > ?"
+            ")",
+            (max_bytes,),
+        )
+
+    # ── internals ──────────────────────────────────────────────
+    def _fetchone(self, sql: str, params: tuple):
+        conn = self._connect()
+        with self._lock:
+            return conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params: tuple):
+        conn = self._connect()
+        with self._lock, conn:
+            conn.execute(sql, params)
+
+    def _queue(self, key: _WriteKey, value):
+        self._dirty[key] = value
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _write_loop(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_seconds)  # let writes pile up
+            self._wakeup.clear()
+            self._flushing, self._dirty = self._dirty, {}
+            try:
+                await asyncio.to_thread(self._write_batch, self._flushing)
+            except Exception as e:
+                logger.exception(e)
+                # keep the batch unless newer writes replaced it, and retry
+                self._dirty = {**self._flushing, **self._dirty}
+                self._wakeup.set()
+            finally:
+                self._flushing = {}
+
+    def _write_batch(self, batch: Dict[_WriteKey, object]):
+        now = time.time()
+        conn = self._connect()
+        with self._lock, conn:
+            for (table, key), value in batch.items():
+                if table == "thread_configs":
+                    conn.execute(
+                        "INSERT OR REPLACE INTO thread_configs "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (*key, value.model, value.max_tokens, value.temperature, now),
+                    )
+                elif table == "thread_summaries":
+                    conn.execute(
+                        "INSERT OR REPLACE INTO thread_summaries VALUES (?, ?, ?, ?)",
+                        (*key, value.text, value.last_id, now),
+                    )
+                elif table == "response_cache":
+                    conn.execute(
+                        "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                        (*key, value, len(value.encode()), now),
+                    )
+                elif value is None:
+                    conn.execute(
+                        "DELETE FROM pending_replies "
+                        "WHERE guild_id = ? AND thread_id = ?",
+                        key,
+                    )
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO pending_replies VALUES (?, ?, ?, ?)",
+                        (*key, json.dumps(value), now),
+                    )
+
+
+store = Store()
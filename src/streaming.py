@@ -0,0 +1,106 @@
+# streaming.py  –  progressively render a streamed completion into Discord
+import asyncio
+import time
+from typing import List, Optional
+
+import discord
+from discord import Message as DiscordMessage
+
+from src.constants import STREAM_EDIT_INTERVAL_SECONDS, STREAM_FIRST_CHUNK_CHARS
+from src.history import history_cache
+from src.metrics import STAGE_SECONDS
+from src.outbound import outbox
+from src.utils import split_into_shorter_messages
+
+
+class ReplyBlocked(Exception):
+    """Raised when the reply's gate (moderation) rejects it before it's shown."""
+
+
+class StreamingReply:
+    """
+    Posts a reply as soon as the first tokens arrive and edits it as more
+    come in.  Edits are coalesced to at most one per `min_edit_interval`
+    seconds to stay under Discord's per-channel edit rate limit; once the
+    text passes MAX_CHARS_PER_REPLY_MSG it continues in a new message.
+
+    If a `gate` future is given, nothing is posted until it resolves true.
+    """
+
+    def __init__(
+        self,
+        thread: discord.Thread,
+        min_edit_interval: float = STREAM_EDIT_INTERVAL_SECONDS,
+        min_first_chars: int = STREAM_FIRST_CHUNK_CHARS,
+        gate: Optional[asyncio.Future] = None,
+    ):
+        self.thread = thread
+        self.gate = gate
+        self.min_edit_interval = min_edit_interval
+        self.min_first_chars = min_first_chars
+
+        self.sent: List[DiscordMessage] = []
+        self.first_visible_at: Optional[float] = None
+        self._parts: List[str] = []  # everything received so far
+        self._current: Optional[DiscordMessage] = None
+        self._text = ""  # text belonging to the message being written
+        self._shown = ""  # text currently visible in that message
+        self._last_edit = 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts).strip()
+
+    async def feed(self, delta: str):
+        self._parts.append(delta)
+        if self._current is None and not self.sent:
+            self._text = (self._text + delta).lstrip()
+            if len(self._text) < self.min_first_chars:
+                return
+        else:
+            self._text += delta
+        if time.monotonic() - self._last_edit >= self.min_edit_interval:
+            await self._flush()
+
+    async def finish(self):
+        """Push whatever is still buffered and record the final messages."""
+        self._text = self._text.rstrip()
+        await self._flush()
+        for message in self.sent:
+            history_cache.observe(message)
+
+    async def abort(self):
+        """Remove a partially streamed reply that got superseded."""
+        for message in self.sent:
+            try:
+                await outbox.delete(message)
+            except discord.HTTPException:
+                pass
+        self.sent.clear()
+
+    async def _flush(self):
+        chunks = split_into_shorter_messages(self._text)
+        for chunk in chunks[:-1]:
+            await self._show(chunk)
+            self._current, self._shown = None, ""
+        self._text = chunks[-1] if chunks else ""
+        if self._text.strip():
+            await self._show(self._text)
+
+    async def _show(self, text: str):
+        if self._current is None:
+            if self.gate is not None:
+                if not await asyncio.shield(self.gate):
+                    raise ReplyBlocked()
+                self.gate = None
+            with STAGE_SECONDS.time(stage="thread_send"):
+                self._current = await outbox.send(self.thread, text)
+            self.sent.append(self._current)
+            if self.first_visible_at is None:
+                self.first_visible_at = time.perf_counter()
+        elif text != self._shown:
+            with STAGE_SECONDS.time(stage="thread_edit"):
+                edited = await outbox.edit(self._current, content=text)
+            self.sent[-1] = self._current = edited or self._current
+        self._shown = text
+        self._last_edit = time.monotonic()
@@ -0,0 +1,241 @@
+# summaries.py  –  rolling per-thread summaries that stand in for old messages
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from src.base import Message, ThreadConfig, ThreadSummary
+from src.constants import (
+    OPENAI_REPLY_TIMEOUT_SECONDS,
+    SUMMARY_CACHE_SIZE,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_KEEP_RECENT_TOKENS,
+    SUMMARY_MAX_TOKENS,
+    SUMMARY_MODEL,
+    SUMMARY_RETRY_SECONDS,
+    SUMMARY_TRIGGER_TOKENS,
+)
+from src.metrics import Counter, record_usage
+from src.openai_client import get_client
+from src.ratelimit import Priority, openai_scheduler
+from src.store import store
+from src.tokens import message_tokens, rendered_prompt_tokens
+from src.utils import logger
+
+SUMMARY_AUTHOR = "System"
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+SUMMARY_INSTRUCTIONS = (
+    "You keep a running summary of a Discord conversation so that it can be "
+    "continued without the full transcript.  Update the current summary with "
+    "the new messages.  Keep who said what, facts, decisions, open questions, "
+    "and any names, numbers or code identifiers that may come up again.  "
+    "Drop small talk.  Answer with the updated summary only, in plain prose."
+)
+
+SUMMARIES = Counter(
+    "skippy_thread_summaries_total",
+    "Background thread summarizations, by result (ok / error).",
+    ("result",),
+)
+
+
+def _covered(summary: Optional[ThreadSummary], messages: Sequence[Message]) -> int:
+    """
+    How many leading `messages` the summary covers: those up to its last
+    message id (ids grow over time), so a message deleted or missing since
+    doesn't move the boundary.  The latest message is never covered.
+    """
+    if summary is None:
+        return 0
+    covered = 0
+    while covered < len(messages) - 1:
+        message_id = messages[covered].id
+        if message_id is not None and message_id > summary.last_id:
+            break
+        covered += 1
+    return covered
+
+
+def is_summary(message: Message) -> bool:
+    return message.user == SUMMARY_AUTHOR and (message.text or "").startswith(SUMMARY_PREFIX)
+
+
+def _transcript(messages: Sequence[Message]) -> str:
+    return "\n".join(f"{m.user}: {m.text or ''}" for m in messages)
+
+
+class ThreadSummaries:
+    """
+    Once the part of a thread that isn't summarized yet grows past
+    `trigger_tokens`, everything in it but the newest `keep_recent_tokens`
+    is folded into the thread's summary by `model`, in the background and
+    at background priority, so no reply waits on it.  Each run only sends
+    the previous summary plus the messages it hasn't seen yet.
+
+    Replies use the summary (as one System message) in place of the
+    messages it covers.  Summaries are written through to the SQLite store
+    and loaded lazily; `max_entries` threads are kept in memory.
+    """
+
+    def __init__(
+        self,
+        trigger_tokens: int = SUMMARY_TRIGGER_TOKENS,
+        keep_recent_tokens: int = SUMMARY_KEEP_RECENT_TOKENS,
+        chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+        model: str = SUMMARY_MODEL,
+        max_entries: int = SUMMARY_CACHE_SIZE,
+    ):
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self.chunk_tokens = chunk_tokens
+        self.model = model
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, Optional[ThreadSummary]]" = OrderedDict()
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._failed_at: Dict[int, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.trigger_tokens > 0
+
+    async def get(self, thread_id: int) -> Optional[ThreadSummary]:
+        if thread_id in self._entries:
+            self._entries.move_to_end(thread_id)
+            return self._entries[thread_id]
+        summary = await store.load_thread_summary(thread_id)
+        self._remember(thread_id, summary)
+        return summary
+
+    async def compact(
+        self,
+        thread_id: Optional[int],
+        messages: Sequence[Message],
+        thread_config: ThreadConfig,
+        guild_id: Optional[int] = None,
+    ) -> Sequence[Message]:
+        """
+        `messages` with the summarized ones replaced by the summary.  Starts
+        a summarization if the rest has grown too long; it applies from the
+        next reply on.
+        """
+        if not self.enabled or thread_id is None:
+            return messages
+        summary = await self.get(thread_id)
+        covered = _covered(summary, messages)
+        if self._should_summarize(thread_id, messages[covered:], thread_config.model):
+            task = asyncio.create_task(
+                self._summarize(thread_id, messages, summary, covered, guild_id)
+            )
+            self._jobs[thread_id] = task
+            task.add_done_callback(lambda _: self._jobs.pop(thread_id, None))
+        if not covered:
+            return messages
+        return [Message(SUMMARY_AUTHOR, SUMMARY_PREFIX + summary.text), *messages[covered:]]
+
+    def _should_summarize(self, thread_id: int, rest: Sequence[Message], model: str) -> bool:
+        if thread_id in self._jobs:
+            return False
+        failed_at = self._failed_at.get(thread_id)
+        if failed_at is not None and time.monotonic() - failed_at < SUMMARY_RETRY_SECONDS:
+            return False
+        tokens = 0
+        for message in rest:
+            tokens += message_tokens(message, model)
+            if tokens > self.trigger_tokens:
+                return True
+        return False
+
+    async def _summarize(
+        self,
+        thread_id: int,
+        messages: Sequence[Message],
+        summary: Optional[ThreadSummary],
+        covered: int,
+        guild_id: Optional[int],
+    ):
+        # the newest keep_recent_tokens stay verbatim (less if the trigger is lower)
+        keep = min(self.keep_recent_tokens, self.trigger_tokens // 2)
+        end, recent = len(messages), 0
+        while end > covered:
+            recent += message_tokens(messages[end - 1], self.model)
+            if recent > keep:
+                break
+            end -= 1
+        end = min(end, len(messages) - 1)  # the latest message always stays
+        if end <= covered:
+            return
+        previous = summary.text if summary else ""
+        start = covered
+        try:
+            while start < end:
+                chunk: List[Message] = []
+                tokens = 0
+                for message in messages[start:end]:
+                    tokens += message_tokens(message, self.model)
+                    if chunk and tokens > self.chunk_tokens:
+                        break
+                    chunk.append(message)
+                last_id = next((m.id for m in reversed(chunk) if m.id is not None), None)
+                if last_id is None:
+                    raise ValueError("no message ids to track the summary by")
+                previous = await self._request(previous, chunk, guild_id)
+                start += len(chunk)
+                # keep each step, so a failure later on loses only the rest
+                self._save(thread_id, ThreadSummary(previous, last_id))
+        except Exception as e:  # noqa: BLE001 – replies go on with what's there
+            SUMMARIES.inc(result="error")
+            self._failed_at[thread_id] = time.monotonic()
+            logger.warning(f"Summarizing thread {thread_id} failed: {e!r}")
+            return
+        self._failed_at.pop(thread_id, None)
+        SUMMARIES.inc(result="ok")
+        logger.info(
+            f"Summarized thread {thread_id} – {start - covered} more messages, "
+            f"{start} in total"
+        )
+
+    async def _request(
+        self, previous: str, messages: Sequence[Message], guild_id: Optional[int]
+    ) -> str:
+        payload = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous or '(none)'}\n\n"
+                f"New messages:\n{_transcript(messages)}",
+            },
+        ]
+        response = await openai_scheduler.run(
+            self.model,
+            rendered_prompt_tokens(payload, self.model) + SUMMARY_MAX_TOKENS,
+            Priority.BACKGROUND,
+            lambda: get_client().chat.completions.create(
+                model=self.model,
+                messages=payload,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0.2,
+                timeout=OPENAI_REPLY_TIMEOUT_SECONDS,
+            ),
+        )
+        record_usage(response.usage, guild_id, self.model)
+        text = (response.choices[0].message.content or "").strip()
+        if not text:
+            raise ValueError("empty summary")
+        return text
+
+    def _save(self, thread_id: int, summary: ThreadSummary):
+        self._remember(thread_id, summary)
+        store.save_thread_summary(thread_id, summary)
+
+    def _remember(self, thread_id: int, summary: Optional[ThreadSummary]):
+        self._entries[thread_id] = summary
+        self._entries.move_to_end(thread_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"threads": len(self._entries), "running": len(self._jobs)}
+
+
+thread_summaries = ThreadSummaries()
@@ -0,0 +1,106 @@
+# thread_scheduler.py  –  at most one completion per thread, newest wins
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict
+
+from src.constants import SECONDS_DELAY_RECEIVING_MSG
+from src.metrics import Gauge
+from src.utils import logger
+
+
+@dataclass
+class ReplyTicket:
+    """Handed to a reply job so the scheduler knows what a cancel costs."""
+
+    thread_id: int
+    replaces: int = 0  # superseded jobs that never reached OpenAI
+    prompt_tokens: int = 0
+    sent: bool = False  # request went out to OpenAI
+
+    def mark_sent(self, prompt_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.sent = True
+
+
+ReplyJob = Callable[[ReplyTicket], Awaitable[None]]
+
+
+class ThreadReplyScheduler:
+    """
+    Owns the reply task of every thread.  A new message debounces for
+    `debounce_seconds` and cancels whatever reply the thread still has in
+    flight, including an outstanding OpenAI request, so only the latest
+    context gets completed.  `debounce=False` starts the job right away,
+    for a thread's first reply.
+    """
+
+    def __init__(self, debounce_seconds: float = SECONDS_DELAY_RECEIVING_MSG):
+        self.debounce_seconds = debounce_seconds
+        self._running: Dict[int, tuple[asyncio.Task, ReplyTicket]] = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.debounced = 0  # dropped before any request was made
+        self.aborted = 0  # cancelled while the request was in flight
+        self.prompt_tokens_saved = 0
+
+    def submit(self, thread_id: int, job: ReplyJob, debounce: bool = True) -> asyncio.Task:
+        self.submitted += 1
+        ticket = ReplyTicket(thread_id)
+
+        previous = self._running.get(thread_id)
+        if previous and not previous[0].done():
+            task, old = previous
+            task.cancel()
+            if old.sent:
+                self.aborted += 1
+                ticket.replaces = old.replaces
+            else:
+                self.debounced += 1
+                ticket.replaces = old.replaces + 1
+
+        delay = self.debounce_seconds if debounce else 0
+        task = asyncio.create_task(self._run(ticket, job, delay))
+        self._running[thread_id] = (task, ticket)
+        return task
+
+    async def _run(self, ticket: ReplyTicket, job: ReplyJob, delay: float):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            await job(ticket)
+            self.completed += 1
+            # every skipped request would have sent roughly this prompt
+            self.prompt_tokens_saved += ticket.prompt_tokens * ticket.replaces
+        except asyncio.CancelledError:
+            logger.info(
+                f"Reply superseded in thread {ticket.thread_id} "
+                f"({'in flight' if ticket.sent else 'debounced'}) – "
+                f"{self.debounced} requests saved, {self.aborted} aborted, "
+                f"~{self.prompt_tokens_saved} prompt tokens saved"
+            )
+        except Exception as exc:
+            logger.exception(exc)
+        finally:
+            current = self._running.get(ticket.thread_id)
+            if current and current[1] is ticket:
+                del self._running[ticket.thread_id]
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "requests_saved": self.debounced,
+            "requests_aborted": self.aborted,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "in_flight": len(self._running),
+        }
+
+
+reply_scheduler = ThreadReplyScheduler()
+
+Gauge(
+    "skippy_replies_in_flight",
+    "Threads with a reply being debounced, generated or sent.",
+    fn=lambda: len(reply_scheduler._running),
+)
@@ -0,0 +1,123 @@
+# tokens.py  –  local token counting and context-window budgeting
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import tiktoken
+
+from src.base import Message
+from src.constants import TOKEN_COUNT_CACHE_SIZE
+from src.utils import logger
+
+# ───────────────────────────────────────────────────────────────
+# Model limits for everything in ALLOWED_MODELS
+# ───────────────────────────────────────────────────────────────
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+}
+MODEL_ENCODINGS = {
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    "gpt-4": "cl100k_base",
+    "gpt-3.5-turbo": "cl100k_base",
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+DEFAULT_ENCODING = "cl100k_base"
+
+# Chat format overhead, see the OpenAI cookbook "How to count tokens"
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
+
+# Without an encoding (tiktoken downloads them on first use) counts are
+# estimated at this many characters per token, about right for English
+CHARS_PER_TOKEN = 4
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str) -> Optional[tiktoken.Encoding]:
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # noqa: BLE001 – e.g. offline, with no cached copy
+        logger.warning(f"No {name} encoding ({e!r}), estimating token counts")
+        return None
+
+
+def encoding_name(model: str) -> str:
+    return MODEL_ENCODINGS.get(model, DEFAULT_ENCODING)
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def count_text_tokens(encoding: str, text: str) -> int:
+    enc = _encoding(encoding)
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def _message_tokens(encoding: str, message: Message) -> int:
+    return (
+        TOKENS_PER_MESSAGE
+        + TOKENS_PER_NAME
+        + count_text_tokens(encoding, message.user)
+        + count_text_tokens(encoding, message.text or "")
+    )
+
+
+def message_tokens(message: Message, model: str) -> int:
+    """Tokens one chat message costs; memoized per Message so it's computed once."""
+    return _message_tokens(encoding_name(model), message)
+
+
+def system_prompt_tokens(system_prompt: str, model: str) -> int:
+    return TOKENS_PER_MESSAGE + count_text_tokens(encoding_name(model), system_prompt)
+
+
+# ───────────────────────────────────────────────────────────────
+def fit_to_context(
+    messages: Sequence[Message],
+    system_prompt: str,
+    model: str,
+    max_tokens: int,
+) -> Sequence[Message]:
+    """
+    Return the newest suffix of `messages` that fits in the model context
+    next to the system prompt and the `max_tokens` reserved for the reply.
+    An empty result means not even the latest message fits.  For a
+    MessageView the suffix is a view too, so nothing is copied.
+    """
+    budget = (
+        context_window(model)
+        - max_tokens
+        - system_prompt_tokens(system_prompt, model)
+        - REPLY_PRIMING_TOKENS
+    )
+    encoding = encoding_name(model)
+    start = len(messages)
+    while start > 0:
+        cost = _message_tokens(encoding, messages[start - 1])
+        if cost > budget:
+            break
+        budget -= cost
+        start -= 1
+    return messages[start:]
+
+
+def rendered_prompt_tokens(rendered: List[dict], model: str) -> int:
+    """Token estimate for a payload produced by Prompt.full_render."""
+    encoding = encoding_name(model)
+    total = REPLY_PRIMING_TOKENS
+    for message in rendered:
+        total += TOKENS_PER_MESSAGE + count_text_tokens(
+            encoding, message["content"] or ""
+        )
+        if "name" in message:
+            total += TOKENS_PER_NAME + count_text_tokens(encoding, message["name"])
+    return total
@@ -6,10 +6,12 @@ import logging
 logger = logging.getLogger(__name__)
 from src.base import Message
 from discord import Message as DiscordMessage
-from typing import Optional, List
+from typing import Optional, List, Tuple
+import re
+import unicodedata
 import discord
 
-from src.constants import MAX_CHARS_PER_REPLY_MSG, INACTIVATE_THREAD_PREFIX
+from src.constants import MAX_CHARS_PER_REPLY_MSG
 
 
 def discord_message_to_message(message: DiscordMessage) -> Optional[Message]:
@@ -21,18 +23,154 @@ def discord_message_to_message(message: DiscordMessage) -> Optional[Message]:
     ):
         field = message.reference.cached_message.embeds[0].fields[0]
         if field.value:
-            return Message(user=field.name, text=field.value)
+            return Message(user=field.name, text=field.value, id=message.id)
     else:
         if message.content:
-            return Message(user=message.author.name, text=message.content)
+            return Message(user=message.author.name, text=message.content, id=message.id)
     return None
 
 
-def split_into_shorter_messages(message: str) -> List[str]:
-    return [
-        message[i : i + MAX_CHARS_PER_REPLY_MSG]
-        for i in range(0, len(message), MAX_CHARS_PER_REPLY_MSG)
-    ]
+# ───────────────────────────────────────────────────────────────
+# Reply splitting
+# ───────────────────────────────────────────────────────────────
+FENCE_RE = re.compile(r"^[ \t]*(`{3,}|~{3,})([^\n]*)")
+SENTENCE_ENDS = (". ", "! ", "? ", "; ")
+MAX_FENCE_INFO = 32  # longest language tag we carry over to a reopened fence
+MAX_FENCE_MARKER = 16  # longer runs of ``` / ~~~ are treated as plain text
+
+
+def _is_extender(ch: str) -> bool:
+    """Code points that belong to the grapheme before them."""
+    cp = ord(ch)
+    return (
+        cp in (0x200D, 0xFE0E, 0xFE0F, 0x20E3)
+        or 0x1F3FB <= cp <= 0x1F3FF  # skin tones
+        or 0xE0020 <= cp <= 0xE007F  # emoji tag sequences
+        or unicodedata.combining(ch) != 0
+    )
+
+
+def _safe_cut(text: str, end: int) -> int:
+    """Move a hard cut left so it doesn't land inside an emoji / grapheme."""
+    cut = end
+    while cut > 1 and (_is_extender(text[cut]) or text[cut - 1] == "\u200d"):
+        cut -= 1
+    # regional indicator flags come in pairs
+    run = 0
+    while cut - run > 0 and 0x1F1E6 <= ord(text[cut - run - 1]) <= 0x1F1FF:
+        run += 1
+    if run % 2 and cut > 1:
+        cut -= 1
+    return cut
+
+
+def _break_long_line(line: str, room: int) -> int:
+    """Where to cut a line longer than `room`: sentence, then word, then hard."""
+    window = line[:room]
+    cut = max(window.rfind(end) for end in SENTENCE_ENDS)
+    if cut >= room // 2:
+        return cut + 2
+    cut = max(window.rfind(" "), window.rfind("\t"))
+    if cut > 0:
+        return cut + 1
+    return _safe_cut(line, room)
+
+
+def split_into_shorter_messages(
+    message: str, limit: int = MAX_CHARS_PER_REPLY_MSG
+) -> List[str]:
+    """
+    Split a reply into chunks of at most `limit` characters in one pass.
+
+    Cuts prefer paragraph breaks, then line ends, then sentence ends and
+    word boundaries inside overlong lines.  A chunk that ends inside a
+    ``` block closes the fence, and the next chunk reopens it with the
+    same language tag.
+    """
+    chunks: List[str] = []
+    parts: List[str] = []  # pieces of the chunk being built
+    base = 0  # leading pieces that only reopen a fence
+    size = 0
+    fence: Optional[Tuple[str, str]] = None  # (marker, reopen line) while in code
+    # last paragraph break in the chunk: (index into parts, size, fence there)
+    para: Optional[Tuple[int, int, Optional[Tuple[str, str]]]] = None
+
+    def close_cost(f) -> int:
+        return len(f[0]) + 1 if f else 0
+
+    def emit(pieces: List[str], f):
+        text = "".join(pieces)
+        if f:
+            text += ("" if text.endswith("\n") else "\n") + f[0]
+        if text.strip():
+            chunks.append(text)
+
+    def reopen(f) -> List[str]:
+        return [f[1]] if f else []
+
+    def opened(marker: str, info: str) -> Optional[Tuple[str, str]]:
+        # reopening and closing must leave a chunk at least half its room,
+        # so drop the language tag if need be, and the fence if even that fails
+        for reopen_line in (f"{marker}{info[:MAX_FENCE_INFO]}\n", f"{marker}\n"):
+            if len(reopen_line) + len(marker) + 1 <= limit // 2:
+                return marker, reopen_line
+        return None
+
+    for line in message.splitlines(keepends=True):
+        match = FENCE_RE.match(line) if ("```" in line or "~~~" in line) else None
+        if match is not None and len(match.group(1)) > MAX_FENCE_MARKER:
+            match = None
+        if match is None:
+            after = fence
+        elif fence is None:
+            after = opened(match.group(1), match.group(2).strip())
+        elif (
+            match.group(1)[0] == fence[0][0]
+            and len(match.group(1)) >= len(fence[0])
+            and not match.group(2).strip()
+        ):
+            after = None
+        else:
+            after = fence
+
+        while True:
+            if size + len(line) + close_cost(after) <= limit:
+                parts.append(line)
+                size += len(line)
+                fence = after
+                if not line.strip():
+                    para = (len(parts), size, fence)
+                break
+
+            if len(parts) > base:
+                # the line doesn't fit: finish this chunk, preferring the last
+                # paragraph break if it leaves the chunk at least half full
+                if para and para[1] >= limit // 2 and para[0] < len(parts):
+                    idx, _, para_fence = para
+                    emit(parts[:idx], para_fence)
+                    base = len(reopen(para_fence))
+                    parts = reopen(para_fence) + parts[idx:]
+                else:
+                    emit(parts, fence)
+                    base = len(reopen(fence))
+                    parts = reopen(fence)
+                size = sum(len(p) for p in parts)
+                para = None
+                continue
+
+            # a single line longer than a whole chunk; `room` is at least half
+            # the limit and shorter than the line, so every pass makes progress
+            room = limit - size - max(close_cost(fence), close_cost(after))
+            cut = min(len(line), max(1, _break_long_line(line, room)))
+            emit(parts + [line[:cut]], fence)
+            base = len(reopen(fence))
+            parts = reopen(fence)
+            size = sum(len(p) for p in parts)
+            line = line[cut:]
+
+    if len(parts) > base:
+        emit(parts, None)
+    return chunks
 
 
 def is_last_message_stale(
@@ -46,17 +184,6 @@ def is_last_message_stale(
     )
 
 
-async def close_thread(thread: discord.Thread):
-    await thread.edit(name=INACTIVATE_THREAD_PREFIX)
-    await thread.send(
-        embed=discord.Embed(
-            description="**Thread closed** - Context limit reached, closing...",
-            color=discord.Color.blue(),
-        )
-    )
-    await thread.edit(archived=True, locked=True)
-
-
 def should_block(guild: Optional[discord.Guild]) -> bool:
     if guild is None:
         # dm's not supported
@@ -0,0 +1,95 @@
+# watchdog.py  –  notice when the event loop is blocked, and show what's blocking it
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from src.constants import WATCHDOG_INTERVAL_SECONDS, WATCHDOG_STALL_SECONDS
+from src.metrics import Counter, Histogram, LAG_BUCKETS
+from src.utils import logger
+
+STACK_LIMIT = 20  # innermost frames logged
+
+STALLS = Counter(
+    "skippy_event_loop_stalls_total",
+    "Times the event loop was blocked for at least WATCHDOG_STALL_SECONDS.",
+)
+STALL_SECONDS = Histogram(
+    "skippy_event_loop_stall_seconds",
+    "How long each detected event-loop stall lasted.",
+    buckets=LAG_BUCKETS,
+)
+
+
+class LoopWatchdog:
+    """
+    A heartbeat task on the loop stamps the time every `interval` seconds;
+    a watcher thread checks the stamp.  Once it is `stall_seconds` old the
+    loop is stuck in some synchronous code, and the watcher logs the loop
+    thread's current stack – the code doing the blocking.  When the loop
+    gets going again the stall's total length is logged and recorded.
+    """
+
+    def __init__(
+        self,
+        stall_seconds: float = WATCHDOG_STALL_SECONDS,
+        interval: float = WATCHDOG_INTERVAL_SECONDS,
+    ):
+        self.stall_seconds = stall_seconds
+        self.interval = interval
+
+        self._beat = time.monotonic()
+        self._stalled_since: Optional[float] = None  # set by the watcher thread
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start watching the running loop; a no-op when disabled or already running."""
+        if self.stall_seconds <= 0 or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = self._beat = time.monotonic()
+            stalled_since = self._stalled_since
+            if stalled_since is not None:
+                self._stalled_since = None
+                STALL_SECONDS.observe(now - stalled_since)
+                logger.warning(
+                    f"Event loop unblocked after {(now - stalled_since) * 1000:.0f} ms"
+                )
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            behind = time.monotonic() - beat - self.interval
+            if behind < self.stall_seconds or self._stalled_since is not None:
+                continue
+            self._stalled_since = beat + self.interval  # when the beat was due
+            STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = (
+                "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+                if frame is not None
+                else "  (stack unavailable)\n"
+            )
+            logger.warning(
+                f"Event loop blocked for {behind * 1000:.0f} ms so far, at:\n{stack.rstrip()}"
+            )
+
+
+watchdog = LoopWatchdog()
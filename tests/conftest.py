@@ -0,0 +1,15 @@
+# conftest.py  –  the environment src/constants.py expects, kept away from ./data
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="skippy-tests-")
+
+for _name, _value in {
+    "OPENAI_API_KEY": "test",
+    "DISCORD_BOT_TOKEN": "test",
+    "DISCORD_CLIENT_ID": "1",
+    "ALLOWED_SERVER_IDS": "1",
+}.items():
+    os.environ.setdefault(_name, _value)
+os.environ["STORE_PATH"] = os.path.join(_DATA_DIR, "skippy.sqlite3")
+os.environ["CONFIG_SNAPSHOT_PATH"] = ""
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from src import persona
+from src.config_watch import RELOADS, reload_config
+from src.constants import CONFIG_PATH
+from src.persona import active_persona, active_version
+
+
+@pytest.fixture(autouse=True)
+def keep_active_config():
+    saved = persona._config
+    yield
+    persona.activate(config=saved[0], version=saved[1])
+
+
+def reloads(result: str) -> float:
+    return RELOADS.values().get((result,), 0)
+
+
+def write_config(tmp_path, replace=("", "")):
+    with open(CONFIG_PATH, encoding="utf-8") as f:
+        text = f.read().replace(*replace)
+    path = tmp_path / "config.yaml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "name: [SkippyAI\n",  # not YAML
+        "name: SkippyAI\n",  # no instructions
+        "name: ' '\ninstructions: Be brief.\nexample_conversations: []\n",  # blank name
+    ],
+)
+def test_a_bad_config_is_rejected_and_the_current_one_stays(tmp_path, text):
+    path = tmp_path / "config.yaml"
+    path.write_text(text, encoding="utf-8")
+    version, name, rejected = active_version(), active_persona().bot_name, reloads("rejected")
+
+    assert asyncio.run(reload_config(str(path), snapshot_path=None)) is False
+    assert active_version() == version
+    assert active_persona().bot_name == name
+    assert reloads("rejected") == rejected + 1
+
+
+def test_the_same_config_is_left_alone(tmp_path):
+    version, unchanged = active_version(), reloads("unchanged")
+
+    assert asyncio.run(reload_config(write_config(tmp_path), snapshot_path=None)) is False
+    assert active_version() == version
+    assert reloads("unchanged") == unchanged + 1
+
+
+def test_a_changed_config_is_applied(tmp_path):
+    path = write_config(tmp_path, ("name: SkippyAI", "name: SkippyTest"))
+    version, applied = active_version(), reloads("applied")
+
+    assert asyncio.run(reload_config(path, snapshot_path=None)) is True
+    assert active_version() != version
+    assert persona._config[0].name == "SkippyTest"
+    assert reloads("applied") == applied + 1
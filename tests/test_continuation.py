@@ -0,0 +1,72 @@
+import asyncio
+
+from src.continuation import CONTINUE_HINT, ContinuationStore
+from src.store import store
+
+
+def drain(continuations: ContinuationStore, key):
+    async def pop_all():
+        served = []
+        while (chunk := await continuations.pop(key)) is not None:
+            served.append(chunk)
+        return served
+
+    return asyncio.run(pop_all())
+
+
+def test_chunks_are_served_in_order_with_a_hint_until_the_last():
+    continuations = ContinuationStore()
+    continuations.put((1, 101), ["b", "c", "d"])
+    assert drain(continuations, (1, 101)) == ["b" + CONTINUE_HINT, "c" + CONTINUE_HINT, "d"]
+    assert continuations.stats() == {"threads": 0, "bytes": 0}
+
+
+def test_new_reply_replaces_leftovers_and_empty_clears():
+    continuations = ContinuationStore()
+    continuations.put((1, 102), ["old 1", "old 2"])
+    continuations.put((1, 102), ["new"])
+    assert drain(continuations, (1, 102)) == ["new"]
+    continuations.put((1, 102), ["x"])
+    continuations.put((1, 102), [])
+    assert drain(continuations, (1, 102)) == []
+
+
+def test_chunks_per_thread_are_capped():
+    continuations = ContinuationStore(max_chunks_per_thread=2)
+    continuations.put((1, 103), ["a", "b", "c", "d"])
+    assert drain(continuations, (1, 103)) == ["a" + CONTINUE_HINT, "b"]
+
+
+def test_over_budget_threads_leave_memory_but_not_the_store():
+    continuations = ContinuationStore(max_bytes=10)
+    continuations.put((1, 104), ["12345678"])
+    continuations.put((1, 105), ["abcdefgh"])
+    assert continuations.stats()["threads"] == 1  # the older thread was dropped
+    assert drain(continuations, (1, 104)) == ["12345678"]
+    assert drain(continuations, (1, 105)) == ["abcdefgh"]
+
+
+def test_pending_chunks_survive_a_restart():
+    ContinuationStore().put((1, 106), ["after", "restart"])
+    store.flush_sync()
+    assert drain(ContinuationStore(), (1, 106)) == ["after" + CONTINUE_HINT, "restart"]
+
+
+def test_idle_threads_expire():
+    continuations = ContinuationStore(idle_seconds=60)
+    continuations.put((1, 107), ["stale"])
+    continuations._entries[(1, 107)].last_used -= 61
+    assert drain(continuations, (1, 107)) == []
+
+
+def test_concurrent_continues_after_a_restart_get_different_chunks():
+    ContinuationStore().put((1, 108), ["one", "two"])
+    store.flush_sync()
+    continuations = ContinuationStore()
+
+    async def both():
+        key = (1, 108)
+        return await asyncio.gather(continuations.pop(key), continuations.pop(key))
+
+    assert asyncio.run(both()) == ["one" + CONTINUE_HINT, "two"]
+    assert drain(continuations, (1, 108)) == []
@@ -0,0 +1,155 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+import src.history
+from src.base import Message
+from src.history import ThreadHistoryCache, _ThreadHistory
+
+
+def discord_message(message_id: int, text: str, thread_id: int = 1):
+    return SimpleNamespace(
+        id=message_id,
+        type=discord.MessageType.default,
+        content=text,
+        author=SimpleNamespace(name="alice"),
+        channel=SimpleNamespace(id=thread_id),
+    )
+
+
+class FakeThread:
+    def __init__(self, thread_id: int, texts):
+        self.id = thread_id
+        self.fetches = 0
+        # history() yields newest first, like discord.py
+        self._messages = [discord_message(i, t, thread_id) for i, t in enumerate(texts, 1)]
+
+    async def history(self, limit: int):
+        self.fetches += 1
+        for message in reversed(self._messages[-limit:]):
+            await asyncio.sleep(0)
+            yield message
+
+
+def texts(messages):
+    return [m.text for m in messages]
+
+
+def test_second_get_is_served_from_memory():
+    async def scenario():
+        cache, thread = ThreadHistoryCache(), FakeThread(1, ["a", "b"])
+        first = await cache.get(thread)
+        second = await cache.get(thread)
+        return cache, thread, first, second
+
+    cache, thread, first, second = asyncio.run(scenario())
+    assert texts(first) == texts(second) == ["a", "b"]
+    assert thread.fetches == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_events_during_a_cold_fetch_are_applied():
+    async def scenario():
+        cache, thread = ThreadHistoryCache(), FakeThread(1, ["a", "b", "c"])
+        fetch = asyncio.create_task(cache.get(thread))
+        await asyncio.sleep(0)
+        cache.edit(1, 1, "A")
+        cache.delete(1, 2)
+        cache.observe(discord_message(4, "d"))
+        return await fetch
+
+    assert texts(asyncio.run(scenario())) == ["A", "c", "d"]
+
+
+def test_events_during_conversion_are_applied(monkeypatch):
+    converting = release = None
+
+    async def slow_offload(size, fn, *args):
+        converting.set()
+        await release.wait()
+        return fn(*args)
+
+    monkeypatch.setattr(src.history, "offload", slow_offload)
+
+    async def scenario():
+        nonlocal converting, release
+        converting, release = asyncio.Event(), asyncio.Event()
+        cache, thread = ThreadHistoryCache(), FakeThread(1, ["a", "b", "c"])
+        fetch = asyncio.create_task(cache.get(thread))
+        await converting.wait()  # fetched, not yet installed
+        cache.edit(1, 3, "C")
+        cache.delete(1, 1)
+        release.set()
+        history = await fetch
+        return cache, history
+
+    cache, history = asyncio.run(scenario())
+    assert texts(history) == ["b", "C"]
+    assert cache._pending == {}
+
+
+def test_failed_fetch_leaves_nothing_behind():
+    class BrokenThread(FakeThread):
+        async def history(self, limit: int):
+            raise discord.HTTPException(SimpleNamespace(status=500, reason="boom"), "boom")
+            yield
+
+    async def scenario():
+        cache = ThreadHistoryCache()
+        try:
+            await cache.get(BrokenThread(1, []))
+        except discord.HTTPException:
+            pass
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache._pending == {} and cache._locks == {} and cache._threads == {}
+
+
+def test_least_recently_used_thread_is_evicted():
+    async def scenario():
+        cache = ThreadHistoryCache(max_threads=2)
+        threads = [FakeThread(i, ["x"]) for i in (1, 2, 3)]
+        await cache.get(threads[0])
+        await cache.get(threads[1])
+        await cache.get(threads[0])  # 2 is now the oldest
+        await cache.get(threads[2])
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert list(cache._threads) == [1, 3]
+    assert cache.evictions == 1
+
+
+def test_byte_cap_evicts_and_sizes_stay_in_step():
+    async def scenario():
+        cache = ThreadHistoryCache(max_bytes=1000)
+        await cache.get(FakeThread(1, ["x" * 600]))
+        await cache.get(FakeThread(2, ["y" * 600]))
+        cache.edit(2, 1, "short")
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert list(cache._threads) == [2]
+    assert cache.stats()["bytes"] == cache._threads[2].size
+
+
+def test_trim_keeps_the_newest_messages():
+    entry = _ThreadHistory()
+    for i in range(1, 6):
+        entry.put(i, Message("alice", str(i)))
+    entry.trim(3)
+    assert texts(entry.messages) == ["3", "4", "5"]
+    assert list(entry.ids) == [3, 4, 5]
+    assert entry.size == sum(src.history._message_size(m) for m in entry.messages)
+
+
+def test_new_messages_are_trimmed_to_the_cap():
+    async def scenario():
+        cache = ThreadHistoryCache(max_messages=2)
+        await cache.get(FakeThread(1, ["a", "b"]))
+        cache.observe(discord_message(3, "c"))
+        return await cache.get(FakeThread(1, []))
+
+    assert texts(asyncio.run(scenario())) == ["b", "c"]
@@ -0,0 +1,65 @@
+import dataclasses
+
+import pytest
+
+from src.base import Message, MessageLog
+
+
+def texts(messages):
+    return [m.text for m in messages]
+
+
+def log_of(*names) -> MessageLog:
+    return MessageLog(Message("u", name) for name in names)
+
+
+def test_message_is_frozen_and_compares_by_value():
+    a, b = Message("alice", "hi"), Message("".join(["ali", "ce"]), "hi")
+    assert a == b and hash(a) == hash(b)
+    assert a.user is b.user  # author names are interned
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        a.text = "changed"
+
+
+def test_append_prepend_and_popleft():
+    log = log_of("b", "c")
+    log.append(Message("u", "d"))
+    log.prepend(Message("u", "a"))
+    assert texts(log) == ["a", "b", "c", "d"]
+    assert log.popleft().text == "a"
+    assert texts(log) == ["b", "c", "d"]
+    assert log[0].text == "b" and log[-1].text == "d"
+    with pytest.raises(IndexError):
+        MessageLog().popleft()
+
+
+def test_view_is_a_stable_snapshot():
+    log = log_of("a", "b", "c")
+    view = log.view()
+    log.append(Message("u", "d"))
+    log.replace(0, Message("u", "A"))
+    log.insert(1, Message("u", "x"))
+    log.remove_at(2)
+    log.popleft()
+    log.prepend(Message("u", "new"))
+    assert texts(view) == ["a", "b", "c"]
+    assert texts(log) == ["new", "x", "c", "d"]
+
+
+def test_view_slices_without_copying():
+    log = log_of(*"abcdef")
+    view = log.view()
+    tail = view[2:]
+    assert type(tail) is type(view)
+    assert texts(tail) == ["c", "d", "e", "f"]
+    assert texts(tail[1:3]) == ["d", "e"]
+    assert texts(view[::2]) == ["a", "c", "e"]
+    assert len(view[10:]) == 0
+
+
+def test_many_poplefts_keep_the_storage_compact():
+    log = log_of(*map(str, range(1000)))
+    for _ in range(990):
+        log.popleft()
+    assert texts(log) == [str(i) for i in range(990, 1000)]
+    assert len(log._items) < 1000
@@ -0,0 +1,22 @@
+import threading
+
+from src.metrics import Histogram
+
+
+def test_histogram_counts_every_observation_from_many_threads():
+    histogram = Histogram("test_threaded_seconds", "Test.", buckets=(0.5,))
+
+    def observe():
+        for _ in range(20_000):
+            histogram.observe(0.1)
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = dict(line.rsplit(" ", 1) for line in histogram.samples())
+    assert lines["test_threaded_seconds_count"] == "80000"
+    assert lines['test_threaded_seconds_bucket{le="0.5"}'] == "80000"
+
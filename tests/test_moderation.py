@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pydantic
+import pytest
+
+import src.moderation
+from src.moderation import ModerationBatcher, moderate_message
+
+
+class Scores(pydantic.BaseModel):
+    harassment: float = 0.0
+    violence: float = 0.0
+
+
+class FakeModerations:
+    def __init__(self, respond):
+        self.respond = respond
+        self.inputs = []
+
+    async def create(self, input, model):
+        self.inputs.append(list(input))
+        return self.respond(input)
+
+
+@pytest.fixture
+def moderations(monkeypatch):
+    """Route the module's batcher to a fake endpoint; returns a setter for its behaviour."""
+
+    def use(respond) -> FakeModerations:
+        fake = FakeModerations(respond)
+        client = SimpleNamespace(moderations=fake)
+        monkeypatch.setattr(src.moderation, "_moderation_client", lambda: client)
+        monkeypatch.setattr(src.moderation, "moderation_batcher", ModerationBatcher(window=0.01))
+        return fake
+
+    return use
+
+
+def results(*scores):
+    return SimpleNamespace(results=[SimpleNamespace(category_scores=s) for s in scores])
+
+
+def check_all(*texts):
+    async def scenario():
+        return await asyncio.gather(*(moderate_message(text, "alice") for text in texts))
+
+    return asyncio.run(scenario())
+
+
+def test_texts_in_one_window_share_a_call(moderations):
+    def respond(texts):
+        return results(*(Scores(harassment=0.9 if "mean" in t else 0.0) for t in texts))
+
+    fake = moderations(respond)
+    verdicts = check_all("hello", "you are mean", "hello")
+    assert fake.inputs == [["hello", "you are mean"]]
+    assert verdicts[0] == verdicts[2] == ("", "")
+    assert verdicts[1][1] == "(harassment: 0.9)"
+
+
+def test_api_error_fails_open(moderations):
+    def broken(texts):
+        raise RuntimeError("moderation is down")
+
+    moderations(broken)
+    assert check_all("one", "two") == [("", ""), ("", "")]
+
+
+def test_result_count_mismatch_fails_open(moderations):
+    moderations(lambda texts: results(Scores(harassment=0.9)))
+    assert check_all("one", "two") == [("", ""), ("", "")]
@@ -0,0 +1,115 @@
+import asyncio
+
+from src.outbound import COALESCED, DiscordOutbox
+
+UNLIMITED = (1_000_000, 1.0)
+
+
+class FakeChannel:
+    """Records every call; `gate` holds calls until it is set."""
+
+    def __init__(self, channel_id: int, log: list, gate: asyncio.Event):
+        self.id = channel_id
+        self.log = log
+        self.gate = gate
+
+    async def send(self, **kwargs):
+        self.log.append(("send", kwargs.get("content")))
+        await self.gate.wait()
+        return FakeMessage(len(self.log), self)
+
+    async def edit(self, **kwargs):  # as a thread
+        self.log.append(("edit_thread", kwargs))
+        await self.gate.wait()
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, channel: FakeChannel):
+        self.id = message_id
+        self.channel = channel
+
+    async def edit(self, **kwargs):
+        self.channel.log.append(("edit", self.id, kwargs.get("content")))
+        await self.channel.gate.wait()
+        return self
+
+
+def outbox() -> DiscordOutbox:
+    return DiscordOutbox(UNLIMITED, UNLIMITED, UNLIMITED)
+
+
+def run(scenario):
+    """Run `scenario(box, channel, message)` with the channel held busy by a first send."""
+
+    async def main():
+        log, gate = [], asyncio.Event()
+        channel = FakeChannel(1, log, gate)
+        message = FakeMessage(100, channel)
+        box = outbox()
+        first = asyncio.ensure_future(box.send(channel, "first"))
+        await asyncio.sleep(0)  # in flight; later ops queue behind it
+        ops = scenario(box, channel, message)
+        gate.set()
+        await asyncio.gather(first, *ops)
+        return log
+
+    return asyncio.run(main())
+
+
+def test_back_to_back_edits_of_a_message_are_merged():
+    merged = COALESCED.values().get(("edit",), 0)
+    log = run(
+        lambda box, channel, message: [
+            asyncio.ensure_future(box.edit(message, content="a")),
+            asyncio.ensure_future(box.edit(message, content="b")),
+        ]
+    )
+    assert log == [("send", "first"), ("edit", 100, "b")]
+    assert COALESCED.values()[("edit",)] == merged + 1
+
+
+def test_an_edit_does_not_jump_over_a_send_queued_before_it():
+    log = run(
+        lambda box, channel, message: [
+            asyncio.ensure_future(box.edit(message, content="a")),
+            asyncio.ensure_future(box.send(channel, "second")),
+            asyncio.ensure_future(box.edit(message, content="b")),
+        ]
+    )
+    assert log == [("send", "first"), ("edit", 100, "a"), ("send", "second"), ("edit", 100, "b")]
+
+
+def test_edits_of_different_messages_are_not_merged():
+    def scenario(box, channel, message):
+        other = FakeMessage(200, channel)
+        return [
+            asyncio.ensure_future(box.edit(message, content="a")),
+            asyncio.ensure_future(box.edit(other, content="b")),
+        ]
+
+    assert run(scenario)[1:] == [("edit", 100, "a"), ("edit", 200, "b")]
+
+
+def test_back_to_back_thread_edits_are_merged():
+    log = run(
+        lambda box, channel, message: [
+            asyncio.ensure_future(box.edit_thread(channel, name="title")),
+            asyncio.ensure_future(box.edit_thread(channel, archived=True)),
+        ]
+    )
+    assert log[1:] == [("edit_thread", {"name": "title", "archived": True})]
+
+
+def test_channels_take_turns():
+    async def main():
+        log, gate = [], asyncio.Event()
+        gate.set()
+        busy, quiet = FakeChannel(1, log, gate), FakeChannel(2, log, gate)
+        box = outbox()
+        sends = [box.send(busy, f"busy {i}") for i in range(3)]
+        sends.append(box.send(quiet, "quiet"))
+        await asyncio.gather(*sends)
+        return log
+
+    log = asyncio.run(main())
+    assert log.index(("send", "quiet")) < log.index(("send", "busy 2"))
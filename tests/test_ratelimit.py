@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.ratelimit import OpenAIRequestScheduler, Priority, TokenBucket
+
+
+def test_bucket_starts_full_and_drains():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.01)
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(60)
+    bucket.updated -= 30  # as if half a minute passed
+    assert bucket.wait_time(30) == 0
+    assert bucket.wait_time(31) > 0
+
+
+def test_bucket_never_holds_more_than_its_capacity():
+    bucket = TokenBucket(per_minute=600, capacity=5)
+    bucket.updated -= 3600
+    bucket.consume(5)
+    assert bucket.wait_time(1) > 0
+    # requests larger than the bucket wait for a full bucket, not forever
+    assert bucket.wait_time(1000) == pytest.approx(5 / 10, abs=0.01)
+
+
+def test_bucket_adjust_gives_back_up_to_capacity():
+    bucket = TokenBucket(per_minute=100)
+    bucket.consume(80)
+    bucket.adjust(50)
+    assert bucket.tokens == pytest.approx(70, abs=0.1)
+    bucket.adjust(50)
+    assert bucket.tokens == pytest.approx(100, abs=0.1)
+    bucket.adjust(-150)
+    assert bucket.wait_time(1) > 0
+
+
+def test_scheduler_settles_tpm_with_reported_usage():
+    async def scenario():
+        scheduler = OpenAIRequestScheduler(limits={"m": (100, 10_000)})
+
+        async def call():
+            return SimpleNamespace(usage=SimpleNamespace(total_tokens=1_000))
+
+        await scheduler.run("m", 4_000, Priority.INTERACTIVE, call)
+        return scheduler._bucket_pair("m")[1].tokens
+
+    # charged 4000 up front, 3000 given back once the real cost was known
+    assert asyncio.run(scenario()) == pytest.approx(9_000, abs=5)
+
+
+def test_scheduler_holds_the_slot_until_a_stream_is_read():
+    async def scenario():
+        scheduler = OpenAIRequestScheduler(limits={"m": (100, 10_000)}, max_concurrency=1)
+
+        async def chunks():
+            yield "a"
+            yield SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+        async def call():
+            return chunks()
+
+        stream = await scheduler.run("m", 100, Priority.INTERACTIVE, call)
+        held = scheduler.stats()["in_flight"]
+        items = [item async for item in stream]
+        return held, len(items), scheduler.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == (1, 2, 0)
+
+
+def test_scheduler_admits_interactive_before_background():
+    async def scenario():
+        scheduler = OpenAIRequestScheduler(limits={"m": (100, 10_000)}, max_concurrency=1)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name, wait=False):
+            async def call():
+                order.append(name)
+                if wait:
+                    await gate.wait()
+
+            return call
+
+        def start(priority, call):
+            return asyncio.ensure_future(scheduler.run("m", 1, priority, call))
+
+        first = start(Priority.INTERACTIVE, job("first", wait=True))
+        await asyncio.sleep(0)
+        background = start(Priority.BACKGROUND, job("bg"))
+        interactive = start(Priority.INTERACTIVE, job("reply"))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, background, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "reply", "bg"]
+
+
+def test_a_sooner_refill_is_not_stuck_behind_a_later_timer():
+    async def scenario():
+        scheduler = OpenAIRequestScheduler(limits={"slow": (1, 10_000), "fast": (600, 10_000)})
+
+        async def call():
+            return None
+
+        await scheduler.run("slow", 1, Priority.INTERACTIVE, call)  # empty for a minute
+        slow = asyncio.ensure_future(scheduler.run("slow", 1, Priority.INTERACTIVE, call))
+        await asyncio.sleep(0)  # arms a ~60 s timer
+        fast_rpm = scheduler._bucket_pair("fast")[0]
+        fast_rpm.consume(fast_rpm.tokens)  # empty, refills one request in 0.1 s
+        await asyncio.wait_for(scheduler.run("fast", 1, Priority.INTERACTIVE, call), 2)
+        slow.cancel()
+
+    asyncio.run(scenario())
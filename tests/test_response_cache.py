@@ -0,0 +1,55 @@
+import asyncio
+
+from src.base import ThreadConfig
+from src.response_cache import ResponseCache
+
+CONFIG = ThreadConfig("gpt-4o-mini", 512, 0.0)
+
+
+def rendered(user: str = "alice"):
+    return [
+        {"role": "system", "content": "You are a bot."},
+        {"role": "user", "name": user, "content": "What is 2 + 2?"},
+    ]
+
+
+def cache(**kwargs) -> ResponseCache:
+    return ResponseCache(**{"enabled": True, "max_temperature": 0.2, "disk_bytes": 0, **kwargs})
+
+
+def test_only_enabled_low_temperature_requests_get_a_key():
+    assert cache().key_for(rendered(), CONFIG)
+    assert cache(enabled=False).key_for(rendered(), CONFIG) is None
+    assert cache().key_for(rendered(), ThreadConfig("gpt-4o-mini", 512, 0.7)) is None
+
+
+def test_key_depends_on_who_asked():
+    assert cache().key_for(rendered("alice"), CONFIG) == cache().key_for(rendered("alice"), CONFIG)
+    assert cache().key_for(rendered("alice"), CONFIG) != cache().key_for(rendered("bob"), CONFIG)
+
+
+def test_key_changes_with_content_and_request_settings():
+    key = cache().key_for(rendered(), CONFIG)
+    other = rendered()
+    other[1]["content"] = "What is 2 + 3?"
+    assert cache().key_for(other, CONFIG) != key
+    for config in (
+        ThreadConfig("gpt-4o", 512, 0.0),
+        ThreadConfig("gpt-4o-mini", 256, 0.0),
+        ThreadConfig("gpt-4o-mini", 512, 0.1),
+    ):
+        assert cache().key_for(rendered(), config) != key
+
+
+def test_memory_tier_is_an_lru():
+    replies = cache(max_entries=2)
+
+    async def scenario():
+        replies.put("a", "A")
+        replies.put("b", "B")
+        assert await replies.get("a") == "A"  # a is now the most recent
+        replies.put("c", "C")
+        return [await replies.get(key) for key in "abc"]
+
+    assert asyncio.run(scenario()) == ["A", None, "C"]
+    assert replies.memory_hits == 3 and replies.misses == 1
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.base import Message  # noqa: E402
+from src.embeddings import HashingEmbedder  # noqa: E402
+from src.retrieval import ThreadIndex  # noqa: E402
+
+
+class GatedEmbedder(HashingEmbedder):
+    """Embeds single texts at once; bigger (background) batches wait for `release`."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.batches = []
+
+    async def embed(self, texts):
+        self.batches.append(len(texts))
+        if len(texts) > 1:
+            await self.release.wait()
+        return await super().embed(texts)
+
+
+def history(count: int):
+    return [Message("alice", f"message number {i} about topic {i % 5}", id=i) for i in range(count)]
+
+
+async def settle(index: ThreadIndex):
+    while index._jobs:
+        await asyncio.gather(*index._jobs.values())
+
+
+def test_reply_only_waits_for_its_latest_message():
+    async def scenario():
+        embedder = GatedEmbedder()
+        index = ThreadIndex(embedder, tail_tokens=1, top_k=3, min_score=-1.0)
+        messages = history(30) + [Message("bob", "anything about topic 3?", id=99)]
+        # the backlog is stuck, yet the reply goes ahead with the whole history
+        first = await asyncio.wait_for(index.select(1, messages, "gpt-4o-mini"), 1)
+        embedder.release.set()
+        await settle(index)
+        second = await index.select(1, messages, "gpt-4o-mini")
+        return messages, first, second
+
+    messages, first, second = asyncio.run(scenario())
+    assert list(first) == messages
+    assert len(second) == 4 and second[-1].id == 99
+
+
+def test_identical_messages_get_their_own_rows():
+    async def scenario():
+        index = ThreadIndex(HashingEmbedder())
+        for message_id in (1, 2):
+            index.observe(1, Message("alice", "same words", id=message_id))
+        await settle(index)
+        return index._threads[1]
+
+    entry = asyncio.run(scenario())
+    assert sorted(entry.rows) == [1, 2]
+    assert entry.count == 2
+
+
+def test_edit_while_embedding_keeps_the_new_text():
+    async def scenario():
+        embedder = GatedEmbedder()
+        index = ThreadIndex(embedder)
+        for message in history(3):
+            index.observe(1, message)
+        await asyncio.sleep(0)  # the batch of three is in flight
+        edited = Message("alice", "completely different words", id=1)
+        index.replace(1, 1, edited)
+        index.replace(1, 2, None)
+        embedder.release.set()
+        await settle(index)
+        entry = index._threads[1]
+        expected = (await HashingEmbedder().embed([edited.text]))[0]
+        return entry, entry.vectors[entry.rows[1]], expected
+
+    entry, vector, expected = asyncio.run(scenario())
+    assert sorted(entry.rows) == [0, 1]
+    np.testing.assert_allclose(vector, expected)
+
+
+def test_deletes_compact_the_index():
+    async def scenario():
+        index = ThreadIndex(HashingEmbedder())
+        for message in history(10):
+            index.observe(1, message)
+        await settle(index)
+        for message_id in range(6):
+            index.replace(1, message_id, None)
+        return index._threads[1]
+
+    entry = asyncio.run(scenario())
+    assert sorted(entry.rows) == [6, 7, 8, 9]
+    assert entry.count == 4 and entry.stale == 0
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from src.base import Message, ThreadConfig
+from src.openai_client import LatencyTracker
+from src.router import ModelRouter, run_with_fallback
+
+GPT4O = ThreadConfig("gpt-4o", 512, 0.5)
+
+
+def router(latency=None, **kwargs) -> ModelRouter:
+    options = {
+        "enabled": True,
+        "fast_models": ["gpt-4o-mini"],
+        "fallbacks": {"gpt-4o": "gpt-4o-mini", "gpt-4o-mini": "gpt-4o"},
+        "short_prompt_tokens": 1_500,
+        "simple_turn_chars": 400,
+        "max_deadline": 30.0,
+        "latency": latency or LatencyTracker(),
+    }
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def plan(model_router: ModelRouter, text: str, config: ThreadConfig = GPT4O):
+    messages = [Message("alice", text)]
+    rendered = [
+        {"role": "system", "content": "You are a bot."},
+        {"role": "user", "name": "alice", "content": text},
+    ]
+    return model_router.plan(messages, config, rendered)
+
+
+def measured(**medians) -> LatencyTracker:
+    latency = LatencyTracker()
+    for model, seconds in medians.items():
+        for _ in range(50):
+            latency.record(model.replace("_", "-"), seconds)
+    return latency
+
+
+def test_disabled_router_keeps_the_thread_model():
+    route = plan(router(enabled=False), "hi")
+    assert (route.primary, route.route, route.fallback) == (GPT4O, "direct", None)
+
+
+def test_simple_turn_goes_to_the_fast_model_with_the_thread_model_as_fallback():
+    route = plan(router(), "what's the capital of France?")
+    assert route.route == "fast"
+    assert route.primary == ThreadConfig("gpt-4o-mini", 512, 0.5)
+    assert route.fallback == GPT4O
+    assert route.deadline == 30.0  # nothing measured yet
+
+
+@pytest.mark.parametrize("text", ["x" * 401, "fix this:\n```py\nprint(1)\n```"])
+def test_long_or_code_turns_stay_on_the_thread_model(text):
+    route = plan(router(), text)
+    assert route.route == "direct"
+    assert route.primary == GPT4O
+    assert route.fallback == ThreadConfig("gpt-4o-mini", 512, 0.5)
+
+
+def test_fast_model_is_skipped_while_it_is_slower():
+    route = plan(router(measured(gpt_4o=1.0, gpt_4o_mini=3.0)), "hi")
+    assert route.route == "direct" and route.primary == GPT4O
+
+
+def test_a_thread_already_on_a_fast_model_stays_there():
+    mini = ThreadConfig("gpt-4o-mini", 512, 0.5)
+    route = plan(router(), "hi", mini)
+    assert (route.primary, route.route, route.fallback) == (mini, "direct", GPT4O)
+
+
+def test_deadline_follows_the_primary_p95_within_bounds():
+    assert router(measured(gpt_4o_mini=4.0)).deadline("gpt-4o-mini") == 8.0
+    assert router(measured(gpt_4o_mini=0.1)).deadline("gpt-4o-mini") == 5.0
+    assert router(measured(gpt_4o_mini=60.0)).deadline("gpt-4o-mini") == 30.0
+
+
+def test_slow_primary_is_raced_against_the_fallback():
+    async def call(result, delay):
+        await asyncio.sleep(delay)
+        return result
+
+    async def scenario():
+        return await run_with_fallback(
+            lambda: call("primary", 1.0), lambda: call("fallback", 0.0), deadline=0.01
+        )
+
+    assert asyncio.run(scenario()) == ("fallback", "fallback_deadline")
+
+
+def test_client_errors_do_not_fall_back():
+    async def fails():
+        raise ValueError("bad request")
+
+    async def scenario():
+        return await run_with_fallback(fails, lambda: asyncio.sleep(0, "fallback"), 1.0)
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
@@ -0,0 +1,65 @@
+from src.utils import split_into_shorter_messages
+
+
+def test_short_reply_is_one_chunk():
+    assert split_into_shorter_messages("hello there") == ["hello there"]
+
+
+def test_empty_reply_has_no_chunks():
+    assert split_into_shorter_messages("") == []
+
+
+def test_chunks_respect_the_limit_and_keep_all_text():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 40 for i in range(30))
+    chunks = split_into_shorter_messages(text, limit=500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert "".join(chunks).split() == text.split()
+
+
+def test_cuts_prefer_paragraph_breaks():
+    first, second = "a " * 150, "b " * 150
+    chunks = split_into_shorter_messages(f"{first}\n\n{second}", limit=400)
+    assert chunks[0].strip() == first.strip()
+    assert chunks[1].strip() == second.strip()
+
+
+def test_long_line_is_cut_at_a_word_boundary():
+    chunks = split_into_shorter_messages("lorem ipsum " * 100, limit=100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(not chunk.endswith("lor") for chunk in chunks)
+    assert "".join(chunks).split() == ("lorem ipsum " * 100).split()
+
+
+def test_code_fence_is_closed_and_reopened_with_its_language():
+    code = "\n".join(f"print({i})" for i in range(100))
+    chunks = split_into_shorter_messages(f"Here:\n```python\n{code}\n```\nDone.", limit=300)
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert len(chunk) <= 300
+        assert chunk.count("```") % 2 == 0  # every chunk renders on its own
+    for chunk in chunks[1:-1]:
+        assert chunk.startswith("```python\n")
+
+
+def test_hard_cut_does_not_split_an_emoji():
+    thumbs = "\U0001F44D\U0001F3FD"  # thumbs up + skin tone: two code points
+    chunks = split_into_shorter_messages(thumbs * 100, limit=51)
+    assert all(len(chunk) <= 51 for chunk in chunks)
+    assert all(len(chunk) % 2 == 0 for chunk in chunks)
+    assert "".join(chunks) == thumbs * 100
+
+
+def test_long_fence_marker_lines_are_split_like_text():
+    for text in ["~" * 2000, "`" * 1897 + "\n", "Here:\n" + "~" * 950 + "\nabc\n" * 300]:
+        chunks = split_into_shorter_messages(text, limit=1900)
+        assert all(len(chunk) <= 1900 for chunk in chunks)
+        assert "".join(chunks) == text
+
+
+def test_fence_too_costly_to_reopen_still_terminates():
+    text = "~~~~~é. ́```py\nxxxxxxxxx"
+    for limit in range(1, 30):
+        chunks = split_into_shorter_messages(text, limit=limit)
+        assert all(len(chunk) <= limit for chunk in chunks)
+        assert "".join(chunks).count("x") == 9
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from src.base import ThreadConfig, ThreadSummary
+from src.store import Store
+
+CONFIG = ThreadConfig("gpt-4o-mini", 512, 0.5)
+
+
+def store_at(tmp_path, **kwargs) -> Store:
+    return Store(str(tmp_path / "store.sqlite3"), **{"flush_seconds": 0.01, **kwargs})
+
+
+async def flushed(store: Store):
+    """Wait until the writer has nothing queued or in flight."""
+    for _ in range(200):
+        if not store._dirty and not store._flushing:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("store never flushed")
+
+
+def test_writes_queued_before_start_are_flushed(tmp_path):
+    async def scenario():
+        store = store_at(tmp_path)
+        store.save_thread_config(1, CONFIG)
+        await store.start()
+        await flushed(store)
+        return await store_at(tmp_path).load_thread_config(1)
+
+    assert asyncio.run(scenario()) == CONFIG
+
+
+def test_rows_survive_a_restart(tmp_path):
+    async def scenario():
+        store = store_at(tmp_path)
+        await store.start()
+        store.save_thread_config(1, ThreadConfig("gpt-4o", 100, 0.0))
+        store.save_thread_config(1, CONFIG)  # coalesced: only the last is written
+        store.save_thread_summary(1, ThreadSummary("so far", 7))
+        store.save_pending_replies(1, 1, ["next", "last"])
+        store.save_cached_reply("key", "reply")
+        await flushed(store)
+
+        reopened = store_at(tmp_path)
+        return (
+            await reopened.load_thread_config(1),
+            await reopened.load_thread_summary(1),
+            await reopened.load_pending_replies(1, 1),
+            await reopened.load_cached_reply("key"),
+        )
+
+    config, summary, pending, reply = asyncio.run(scenario())
+    assert config == CONFIG
+    assert summary == ThreadSummary("so far", 7)
+    assert pending == ["next", "last"]
+    assert reply == "reply"
+
+
+def test_reads_see_writes_not_yet_flushed(tmp_path):
+    async def scenario():
+        store = store_at(tmp_path, flush_seconds=60)
+        await store.start()
+        store.save_thread_config(1, CONFIG)
+        store.save_pending_replies(1, 1, ["chunk"])
+        return await store.load_thread_config(1), await store.load_pending_replies(1, 1)
+
+    assert asyncio.run(scenario()) == (CONFIG, ["chunk"])
+
+
+def test_empty_or_expired_pending_replies_are_dropped(tmp_path):
+    async def scenario():
+        store = store_at(tmp_path)
+        await store.start()
+        store.save_pending_replies(1, 1, ["chunk"])
+        store.save_pending_replies(1, 2, ["old"])
+        await flushed(store)
+        store.save_pending_replies(1, 1, [])
+        await flushed(store)
+        await asyncio.to_thread(
+            store._execute, "UPDATE pending_replies SET updated_at = ?", (time.time() - 100,)
+        )
+        return (
+            await store.load_pending_replies(1, 1),
+            await store.load_pending_replies(1, 2, max_age=10),
+            await store.load_pending_replies(1, 2),  # expiry deleted it
+        )
+
+    assert asyncio.run(scenario()) == ([], [], [])
+
+
+def test_trim_keeps_the_most_recently_used_replies(tmp_path):
+    async def scenario():
+        store = store_at(tmp_path)
+        await store.start()
+        for key in ("old", "middle", "new"):
+            store.save_cached_reply(key, "x" * 10)
+            await flushed(store)
+        await store.trim_cached_replies(25)
+        return [await store.load_cached_reply(key) for key in ("old", "middle", "new")]
+
+    assert asyncio.run(scenario()) == [None, "x" * 10, "x" * 10]
@@ -0,0 +1,70 @@
+import asyncio
+
+from src.base import Message, ThreadConfig, ThreadSummary
+from src.summaries import SUMMARY_PREFIX, ThreadSummaries, _covered, is_summary
+
+CONFIG = ThreadConfig("gpt-4o-mini", 512, 0.5)
+
+
+def thread(ids):
+    return [Message("alice", f"message {i} " + "word " * 30, id=i) for i in ids]
+
+
+def test_nothing_is_covered_without_a_summary():
+    assert _covered(None, thread(range(1, 6))) == 0
+
+
+def test_coverage_follows_message_ids():
+    messages = thread(range(1, 11))
+    assert _covered(ThreadSummary("s", 4), messages) == 4
+    # after a restart the unconvertible thread starter (id 1) is missing
+    assert _covered(ThreadSummary("s", 4), messages[1:]) == 3
+    # and a message deleted after it was summarized doesn't shift the rest
+    assert _covered(ThreadSummary("s", 4), messages[:2] + messages[3:]) == 3
+
+
+def test_the_latest_message_is_never_covered():
+    messages = thread(range(1, 4))
+    assert _covered(ThreadSummary("s", 99), messages) == 2
+
+
+class FakeSummaries(ThreadSummaries):
+    def __init__(self, **kwargs):
+        super().__init__(**{"trigger_tokens": 100, "keep_recent_tokens": 50, **kwargs})
+        self.requests = []
+        self.saved = []
+
+    async def get(self, thread_id):
+        return self._entries.get(thread_id)
+
+    async def _request(self, previous, messages, guild_id):
+        self.requests.append([m.id for m in messages])
+        return f"summary through {messages[-1].id}"
+
+    def _save(self, thread_id, summary):
+        self._remember(thread_id, summary)
+        self.saved.append(summary)
+
+
+def test_long_thread_is_summarized_in_the_background_and_used_next_time():
+    async def scenario():
+        summaries = FakeSummaries()
+        messages = thread(range(1, 11))
+        first = await summaries.compact(1, messages, CONFIG)
+        await asyncio.gather(*summaries._jobs.values())
+        second = await summaries.compact(1, messages[1:], CONFIG)  # starter gone
+        return summaries, messages, first, second
+
+    summaries, messages, first, second = asyncio.run(scenario())
+    assert first == messages  # the first reply doesn't wait
+    last_id = summaries.saved[-1].last_id
+    assert summaries.requests == [list(range(1, last_id + 1))]
+    assert is_summary(second[0])
+    assert second[0].text == SUMMARY_PREFIX + f"summary through {last_id}"
+    assert [m.id for m in second[1:]] == list(range(last_id + 1, 11))
+
+
+def test_disabled_summaries_leave_messages_alone():
+    messages = thread(range(1, 50))
+    result = asyncio.run(FakeSummaries(trigger_tokens=0).compact(1, messages, CONFIG))
+    assert result is messages
@@ -0,0 +1,80 @@
+import asyncio
+
+from src.thread_scheduler import ThreadReplyScheduler
+
+
+def test_newer_message_debounces_the_pending_reply():
+    async def scenario():
+        scheduler = ThreadReplyScheduler(debounce_seconds=0.05)
+        ran = []
+
+        async def job(ticket):
+            ran.append(ticket)
+
+        scheduler.submit(1, job)
+        await asyncio.sleep(0.01)
+        last = scheduler.submit(1, job)
+        await last
+        return scheduler, ran
+
+    scheduler, ran = asyncio.run(scenario())
+    assert len(ran) == 1
+    assert ran[0].replaces == 1
+    assert scheduler.stats()["requests_saved"] == 1
+    assert scheduler.stats()["requests_aborted"] == 0
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_newer_message_aborts_a_reply_in_flight():
+    async def scenario():
+        scheduler = ThreadReplyScheduler(debounce_seconds=0)
+        cancelled = asyncio.Event()
+
+        async def slow(ticket):
+            ticket.mark_sent(100)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def fast(ticket):
+            pass
+
+        scheduler.submit(1, slow)
+        await asyncio.sleep(0.01)
+        await scheduler.submit(1, fast)
+        return scheduler, cancelled.is_set()
+
+    scheduler, cancelled = asyncio.run(scenario())
+    assert cancelled
+    assert scheduler.stats()["requests_aborted"] == 1
+    assert scheduler.stats()["completed"] == 1
+
+
+def test_threads_do_not_cancel_each_other():
+    async def scenario():
+        scheduler = ThreadReplyScheduler(debounce_seconds=0.01)
+        ran = []
+
+        async def job(ticket):
+            ran.append(ticket.thread_id)
+
+        await asyncio.gather(scheduler.submit(1, job), scheduler.submit(2, job))
+        return ran
+
+    assert sorted(asyncio.run(scenario())) == [1, 2]
+
+
+def test_first_reply_skips_the_debounce():
+    async def scenario():
+        scheduler = ThreadReplyScheduler(debounce_seconds=10)
+        ran = []
+
+        async def job(ticket):
+            ran.append(ticket)
+
+        await asyncio.wait_for(scheduler.submit(1, job, debounce=False), 1)
+        return ran
+
+    assert len(asyncio.run(scenario())) == 1
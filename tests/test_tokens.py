@@ -0,0 +1,56 @@
+from src.base import Message, MessageLog, MessageView
+from src.tokens import (
+    REPLY_PRIMING_TOKENS,
+    context_window,
+    fit_to_context,
+    message_tokens,
+    system_prompt_tokens,
+)
+
+MODEL = "gpt-4"
+SYSTEM = "You are a bot."
+
+
+def room_for(messages) -> int:
+    """max_tokens that leaves exactly enough context for `messages`."""
+    return (
+        context_window(MODEL)
+        - system_prompt_tokens(SYSTEM, MODEL)
+        - REPLY_PRIMING_TOKENS
+        - sum(message_tokens(m, MODEL) for m in messages)
+    )
+
+
+def thread(count: int):
+    return [Message("alice", f"message {i} " + "word " * 20) for i in range(count)]
+
+
+def test_messages_that_fit_exactly_are_all_kept():
+    messages = thread(5)
+    assert list(fit_to_context(messages, SYSTEM, MODEL, room_for(messages))) == messages
+
+
+def test_one_token_over_drops_the_oldest_message():
+    messages = thread(5)
+    fitted = fit_to_context(messages, SYSTEM, MODEL, room_for(messages) + 1)
+    assert list(fitted) == messages[1:]
+
+
+def test_a_latest_message_too_big_on_its_own_leaves_nothing():
+    messages = thread(3)
+    max_tokens = room_for(messages[-1:]) + 1
+    assert len(fit_to_context(messages, SYSTEM, MODEL, max_tokens)) == 0
+
+
+def test_an_oversized_older_message_stops_the_suffix():
+    huge = Message("bob", "word " * 10_000)
+    messages = [Message("alice", "first"), huge] + thread(2)
+    assert list(fit_to_context(messages, SYSTEM, MODEL, 100)) == messages[2:]
+
+
+def test_a_view_is_fitted_without_copying():
+    messages = thread(5)
+    view = MessageLog(messages).view()
+    fitted = fit_to_context(view, SYSTEM, MODEL, room_for(messages[2:]))
+    assert isinstance(fitted, MessageView)
+    assert list(fitted) == messages[2:]